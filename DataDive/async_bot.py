@@ -0,0 +1,167 @@
+"""
+asyncio mode for the Telegram bot
+
+Same commands and replies as main.py, but built on AsyncTeleBot with aiohttp
+for the PyDolarVe sources, so one slow /tasas no longer blocks other chats.
+Start it with BOT_MODE=async (see run.py).
+"""
+
+import os
+import asyncio
+import logging
+import aiohttp
+from telebot import types
+from telebot.async_telebot import AsyncTeleBot
+from main import (
+    TOKEN, SOURCE_TIMEOUT, FETCH_DEADLINE, FORCE_REFRESH_INTERVAL,
+    WELCOME_MSG, HELP_MSG, STOP_MSG, UNKNOWN_MSG, dollar_bot, subscribers, create_main_keyboard,
+    SOURCE_NAMES, HANDLER_SECONDS, SEND_SECONDS, resume_broadcasts, subscribe_chat, chat_language
+)
+from rate_fetcher import AsyncRateFetcher
+from metrics import timed
+from tracing import trace, span
+
+logger = logging.getLogger(__name__)
+
+MAX_CONCURRENT_HANDLERS = int(os.getenv("MAX_CONCURRENT_HANDLERS", "32"))
+
+class ChatSerializer:
+    """Per-chat FIFO locks so replies to one chat keep their order"""
+
+    def __init__(self):
+        self.locks = {}
+        self.users = {}
+
+    async def run(self, chat_id, coro_func):
+        lock = self.locks.get(chat_id)
+        if lock is None:
+            lock = self.locks[chat_id] = asyncio.Lock()
+        self.users[chat_id] = self.users.get(chat_id, 0) + 1
+        try:
+            async with lock:
+                return await coro_func()
+        finally:
+            self.users[chat_id] -= 1
+            if not self.users[chat_id]:
+                # Nobody else queued for this chat, drop its lock
+                del self.users[chat_id]
+                del self.locks[chat_id]
+
+class InstrumentedAsyncTeleBot(AsyncTeleBot):
+    """AsyncTeleBot timing every send_message, reply_to included"""
+
+    async def send_message(self, *args, **kwargs):
+        with SEND_SECONDS.time():
+            return await super().send_message(*args, **kwargs)
+
+class AsyncDollarBot:
+    """Async handlers and sources on top of the shared DollarBot state"""
+
+    def __init__(self, token=TOKEN, max_concurrent=MAX_CONCURRENT_HANDLERS):
+        self.bot = InstrumentedAsyncTeleBot(token)
+        self.session = None
+        self.semaphore = asyncio.Semaphore(max_concurrent)
+        self.chats = ChatSerializer()
+        self.fetcher = AsyncRateFetcher(deadline=FETCH_DEADLINE, cache=dollar_bot.cache)
+        # Same adapters and health as the threaded bot; PyDolarVe goes through aiohttp
+        for feed in SOURCE_NAMES:
+            self.fetcher.register(feed, dollar_bot.sources.async_loader(feed, self._get_json), timeout=SOURCE_TIMEOUT)
+        self._register_handlers()
+
+    # ==========================
+    # Fuentes de datos
+    # ==========================
+    async def _get_json(self, url, timeout):
+        async with self.session.get(url, timeout=aiohttp.ClientTimeout(total=timeout)) as response:
+            response.raise_for_status()
+            return await response.json(content_type=None)
+
+    async def obtener_tasas(self, force=False, lang="es", fmt="Markdown"):
+        with trace("obtener_tasas", force=force, lang=lang, mode="async") as root:
+            try:
+                if force and not dollar_bot.cache.force_refresh():
+                    logger.info("Actualización forzada ignorada: se hizo una hace menos de "
+                                f"{FORCE_REFRESH_INTERVAL:.0f}s")
+                with span("fetch"):
+                    report = await self.fetcher.fetch_all()
+                root.set(failed=sorted(report.failed))
+                # Saving changed rates is blocking I/O; keep it off the event loop
+                return await asyncio.to_thread(dollar_bot.formatear_tasas, report, lang, fmt)
+            except Exception as e:
+                root.set(error=str(e))
+                return f"❌ Error: {str(e)}"
+
+    # ==========================
+    # Comandos del bot
+    # ==========================
+    async def _handle(self, message, coro_func):
+        # Chat lock first: updates queued behind one chat's slow reply must not
+        # hold handler slots that other chats could use
+        await self.chats.run(message.chat.id, lambda: self._limited(coro_func))
+
+    async def _limited(self, coro_func):
+        async with self.semaphore:
+            return await coro_func()
+
+    def _register_handlers(self):
+        bot = self.bot
+
+        @bot.message_handler(commands=['start'])
+        @timed(HANDLER_SECONDS, 'start')
+        async def send_welcome(message):
+            async def welcome():
+                # SQLite write, off the event loop and in order with the chat's other updates
+                await asyncio.to_thread(subscribe_chat, message)
+                await bot.reply_to(message, WELCOME_MSG, reply_markup=create_main_keyboard())
+            await self._handle(message, welcome)
+
+        @bot.message_handler(commands=['stop'])
+        @timed(HANDLER_SECONDS, 'stop')
+        async def send_stop(message):
+            async def stop():
+                await asyncio.to_thread(subscribers.unsubscribe, message.chat.id)
+                await bot.reply_to(message, STOP_MSG, reply_markup=types.ReplyKeyboardRemove())
+            await self._handle(message, stop)
+
+        @bot.message_handler(commands=['help'])
+        @timed(HANDLER_SECONDS, 'help')
+        async def send_help(message):
+            await self._handle(message, lambda: bot.reply_to(message, HELP_MSG, reply_markup=create_main_keyboard()))
+
+        async def reply_rates(message, force=False):
+            mensaje = await self.obtener_tasas(force=force, lang=chat_language(message))
+            await bot.reply_to(message, mensaje, parse_mode="Markdown", reply_markup=create_main_keyboard())
+
+        @bot.message_handler(commands=['tasas'])
+        @timed(HANDLER_SECONDS, 'tasas')
+        async def consulta_manual(message):
+            await self._handle(message, lambda: reply_rates(message))
+
+        @bot.message_handler(func=lambda message: message.text in ['💰 Tasas', '🔄 Actualizar', '❓ Ayuda'])
+        @timed(HANDLER_SECONDS, 'buttons')
+        async def handle_buttons(message):
+            if message.text in ['💰 Tasas', '🔄 Actualizar']:
+                await self._handle(message, lambda: reply_rates(message, force=message.text == '🔄 Actualizar'))
+            elif message.text == '❓ Ayuda':
+                await send_help(message)
+
+        @bot.message_handler(func=lambda message: True)
+        @timed(HANDLER_SECONDS, 'unknown')
+        async def handle_unknown(message):
+            await self._handle(message, lambda: bot.reply_to(message, UNKNOWN_MSG, reply_markup=create_main_keyboard()))
+
+    async def run(self):
+        self.session = aiohttp.ClientSession(headers={"User-Agent": "DollarBot/1.0"})
+        try:
+            await self.bot.infinity_polling(timeout=10, request_timeout=15)
+        finally:
+            await self.session.close()
+            await self.bot.close_session()
+
+def start_async_bot():
+    dollar_bot.start_scheduler()
+    resume_broadcasts()
+    asyncio.run(AsyncDollarBot().run())
+
+if __name__ == "__main__":
+    start_async_bot()
@@ -0,0 +1,108 @@
+"""
+Load test: asyncio bot mode against a fake Telegram Bot API
+
+Checks that a slow /tasas in one chat does not delay replies in other chats,
+that replies within a chat keep their order, and reports reply latency under
+a burst of /tasas from many chats.
+
+Run from the DataDive directory:
+    python -m bench.bench_async_bot [chats]
+"""
+
+import sys
+import json
+import time
+import asyncio
+import threading
+from bench.env import prepare, percentile
+from bench.stubs import PyDolarVeStub, CLPTodayStub, FakeTelegram
+
+def reply_latencies(telegram, pushed):
+    """Pair each chat's pushes with its replies in order"""
+    sent_by_chat = {}
+    for message in telegram.sent:
+        sent_by_chat.setdefault(message["chat_id"], []).append(message["at"])
+    latencies = []
+    for chat_id, times in pushed.items():
+        for sent_at, pushed_at in zip(sent_by_chat.get(chat_id, []), times):
+            latencies.append(sent_at - pushed_at)
+    return latencies
+
+def run(chats=50, slow_latency=2.0):
+    pydolarve = PyDolarVeStub(latency=0.05).start()
+    clptoday = CLPTodayStub(latency=0.05).start()
+    telegram = FakeTelegram().start()
+    prepare(PYDOLARVE_URL=pydolarve.url, CLPTODAY_URL=clptoday.url)
+
+    from telebot import asyncio_helper, apihelper
+    asyncio_helper.API_URL = telegram.api_url()
+    apihelper.API_URL = telegram.api_url()
+    import async_bot
+
+    ready = threading.Event()
+
+    def serve():
+        async def main():
+            bot = async_bot.AsyncDollarBot()
+            ready.set()
+            await bot.run()
+        asyncio.run(main())
+
+    threading.Thread(target=serve, daemon=True).start()
+    ready.wait()
+    results = {}
+
+    # 1. Isolation: one cold, slow /tasas while other chats ask for /help
+    pydolarve.latency = slow_latency
+    pushed = {}
+    telegram.push_message(1, "/tasas")
+    pushed[1] = [time.monotonic()]
+    time.sleep(0.05)
+    for chat_id in range(2, chats + 2):
+        telegram.push_message(chat_id, "/help")
+        pushed[chat_id] = [time.monotonic()]
+    telegram.wait_for_sent(chats + 1, timeout=slow_latency * 5)
+    help_latencies = [lat for lat in reply_latencies(telegram, {c: t for c, t in pushed.items() if c != 1})]
+    results["isolation"] = {
+        "slow_tasas_s": reply_latencies(telegram, {1: pushed[1]})[0],
+        "help_p50_s": percentile(help_latencies, 50),
+        "help_p99_s": percentile(help_latencies, 99)
+    }
+
+    # 2. Ordering: /tasas then /help in the same chat must be answered in that order
+    pydolarve.latency = 0.3
+    async_bot.dollar_bot.cache.last_forced = None
+    async_bot.dollar_bot.cache.force_refresh()
+    start = len(telegram.sent)
+    telegram.push_message(9999, "/tasas")
+    telegram.push_message(9999, "/help")
+    telegram.wait_for_sent(start + 2, timeout=10)
+    replies = [m["text"] for m in telegram.sent[start:] if m["chat_id"] == 9999]
+    results["ordering_ok"] = len(replies) == 2 and replies[0].startswith("💱")
+
+    # 3. Burst: every chat asks for /tasas at once, sources at 50 ms
+    pydolarve.latency = 0.05
+    start = len(telegram.sent)
+    upstream_before = pydolarve.requests
+    pushed = {}
+    burst_start = time.monotonic()
+    for chat_id in range(10000, 10000 + chats):
+        telegram.push_message(chat_id, "/tasas")
+        pushed[chat_id] = [time.monotonic()]
+    telegram.wait_for_sent(start + chats, timeout=60)
+    burst = reply_latencies(telegram, pushed)
+    results["burst"] = {
+        "chats": chats,
+        "p50_s": percentile(burst, 50),
+        "p99_s": percentile(burst, 99),
+        "replies_per_s": len(burst) / (time.monotonic() - burst_start),
+        "upstream_requests": pydolarve.requests - upstream_before
+    }
+
+    for stub in (pydolarve, clptoday, telegram):
+        stub.stop()
+    return results
+
+if __name__ == "__main__":
+    chats = int(sys.argv[1]) if len(sys.argv) > 1 else 50
+    print(json.dumps(run(chats), indent=2))
@@ -0,0 +1,100 @@
+"""
+Benchmark: single-pass CLP extractor vs. the old per-label regex loop
+
+Checks the extractor against the saved fixtures first, then measures
+throughput on a normal page, a large page and a hostile page (many labels
+with no number on the line, which makes lazy `.*?` patterns quadratic).
+
+Run from the DataDive directory:
+    python -m bench.bench_extractor
+"""
+
+import os
+import re
+import json
+import time
+import trafilatura
+from clp_extractor import extract_rates
+
+FIXTURES = os.path.join(os.path.dirname(__file__), "fixtures")
+
+LEGACY_PATTERNS = {
+    'usd_zelle': r'zelle.*?(\d+[,.]?\d*)',
+    'usd_paypal': r'paypal.*?(\d+[,.]?\d*)',
+    'usd_usd': r'dólar.*?(\d+[,.]?\d*)',
+    'usd_dollar': r'dollar.*?(\d+[,.]?\d*)',
+    'eur_euro': r'euro.*?(\d+[,.]?\d*)',
+    'eur_eur': r'eur.*?(\d+[,.]?\d*)',
+    'eur_€': r'€.*?(\d+[,.]?\d*)'
+}
+
+def legacy_extract(text):
+    """The pre-extractor loop from CLPTodayScraper.get_rates"""
+    rates = {}
+    text_lower = text.lower()
+    for key, pattern in LEGACY_PATTERNS.items():
+        matches = re.findall(pattern, text_lower, re.IGNORECASE)
+        if matches:
+            try:
+                rate = float(matches[0].replace(',', '.'))
+                if rate > 0:
+                    rates[key] = rate
+            except (ValueError, IndexError):
+                continue
+    return rates
+
+def load_fixtures():
+    """(name, extracted text, expected rates) for every saved page"""
+    cases = []
+    for name in sorted(os.listdir(FIXTURES)):
+        if not name.endswith(".html"):
+            continue
+        base = name[:-len(".html")]
+        with open(os.path.join(FIXTURES, name), encoding="utf-8") as f:
+            text = trafilatura.extract(f.read())
+        with open(os.path.join(FIXTURES, base + ".expected.json"), encoding="utf-8") as f:
+            expected = json.load(f)
+        cases.append((base, text, expected))
+    return cases
+
+def check_fixtures():
+    for name, text, expected in load_fixtures():
+        found = extract_rates(text)
+        if found != expected:
+            raise AssertionError(f"{name}: expected {expected}, got {found}")
+    return True
+
+def timed(func, text, repeat):
+    worst = 0.0
+    start = time.perf_counter()
+    for _ in range(repeat):
+        t = time.perf_counter()
+        func(text)
+        worst = max(worst, time.perf_counter() - t)
+    total = time.perf_counter() - start
+    return {
+        "mb_per_s": len(text.encode("utf-8")) * repeat / total / 1e6,
+        "worst_ms": worst * 1000
+    }
+
+def run(repeat=20):
+    check_fixtures()
+    _, page, _ = load_fixtures()[0]
+    pages = {
+        "normal": page,
+        "large": (page + "\n") * 2000,
+        # One long line full of labels and no numbers
+        "hostile": "zelle paypal euro dólar " * 1000
+    }
+    results = {"fixtures_ok": True}
+    for name, text in pages.items():
+        n = repeat if name == "normal" else max(1, repeat // 10)
+        results[name] = {
+            "bytes": len(text.encode("utf-8")),
+            "extractor": timed(extract_rates, text, n),
+            "legacy": timed(legacy_extract, text, n)
+        }
+    return results
+
+if __name__ == "__main__":
+    print(json.dumps(run(), indent=2))
@@ -0,0 +1,71 @@
+"""
+Benchmark: /api/history range queries over several years of history
+
+Loads `years` of 15-minute samples for `sources` sources, then times the
+history endpoint through Flask's test client: the whole range from the
+daily and weekly rollups, a downsampled hourly chart, and a streamed
+NDJSON export of one source's raw rows.
+
+Run from the DataDive directory:
+    python -m bench.bench_history [years] [sources]
+"""
+
+import sys
+import json
+import time
+import random
+from bench.env import prepare
+
+def load(backend, years, sources, step=900, chunk=50000):
+    start = time.time() - years * 365 * 86400
+    rates = {f"src{i}": 100.0 for i in range(sources)}
+    rows = []
+    loaded = 0
+    for k in range(int(years * 365 * 86400 / step)):
+        for source in rates:
+            rates[source] *= 1 + random.gauss(0, 0.001)
+            rows.append((source, rates[source], start + k * step))
+        if len(rows) >= chunk:
+            backend.append_many(rows)
+            loaded += len(rows)
+            rows = []
+    backend.append_many(rows)
+    return loaded + len(rows), start
+
+def timed(client, url, repeat):
+    best = None
+    for _ in range(repeat):
+        began = time.perf_counter()
+        response = client.get(url)
+        size = sum(len(chunk) for chunk in response.response)
+        elapsed = time.perf_counter() - began
+        best = elapsed if best is None else min(best, elapsed)
+    return best, size
+
+def run(years=3, sources=10, repeat=5):
+    prepare(RATE_POLLER="0")
+    import web_interface
+
+    began = time.perf_counter()
+    rows, start = load(web_interface.storage.backend, years, sources)
+    load_s = time.perf_counter() - began
+
+    client = web_interface.app.test_client()
+    queries = {
+        "all_daily": f"/api/history?source=all&from={start}&resolution=day",
+        "all_weekly": f"/api/history?source=all&from={start}&resolution=week",
+        "chart_hourly_500": "/api/history?source=src1&days=365&resolution=hour&points=500",
+        "export_raw_ndjson": f"/api/history?source=src1&from={start}&resolution=raw&format=ndjson",
+    }
+    results = {"rows": rows, "load_s": load_s}
+    for name, url in queries.items():
+        elapsed, size = timed(client, url, 1 if name.startswith("export") else repeat)
+        results[name] = {"time_ms": elapsed * 1000, "bytes": size}
+    export = results["export_raw_ndjson"]
+    export["rows_per_s"] = (rows / sources) / (export["time_ms"] / 1000)
+    return results
+
+if __name__ == "__main__":
+    years = float(sys.argv[1]) if len(sys.argv) > 1 else 3
+    sources = int(sys.argv[2]) if len(sys.argv) > 2 else 10
+    print(json.dumps(run(years, sources), indent=2))
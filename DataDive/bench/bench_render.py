@@ -0,0 +1,49 @@
+"""
+Microbenchmark: the fetch, snapshot and render stages of /tasas, measured apart
+
+The fetch stage is timed with every source already in the cache (the common
+case), so it is pure fan-out overhead. Rendering is timed both cold (every
+language and format) and through the MessageCache.
+
+Run from the DataDive directory:
+    python -m bench.bench_render [repeat]
+"""
+
+import sys
+import json
+from bench.env import prepare
+from bench.bench_stats import measure
+
+P2P = [("binance", "🔸 Binance", 107.9), ("bybit", "🔶 Bybit", 108.2), ("yadio", "🔵 Yadio", 107.5)]
+CLP = {"usd": {"zelle": 104.3, "paypal": 99.8}, "eur": {"rate": 121.4}}
+
+def run(repeat=2000):
+    prepare()
+    from main import dollar_bot
+    from message_render import MessageCache, LANGUAGES, FORMATS, render
+
+    sources = {"bcv": 105.45, "p2p": P2P, "eur": 122.9, "clp": CLP}
+    for name, value in sources.items():
+        dollar_bot.cache.store(name, value)
+
+    report = dollar_bot.fetcher.fetch_all()
+    snapshot = dollar_bot.build_snapshot(report)
+    cache = MessageCache()
+    cache.update(snapshot)
+
+    results = {
+        "fetch_cached_us": measure(dollar_bot.fetcher.fetch_all, repeat) * 1e6,
+        "snapshot_us": measure(lambda: dollar_bot.build_snapshot(report), repeat) * 1e6,
+        "render_all_us": measure(
+            lambda: [render(snapshot, lang, fmt) for lang in LANGUAGES for fmt in FORMATS], repeat
+        ) * 1e6,
+        "cached_get_us": measure(lambda: cache.get(snapshot, "es", "Markdown"), repeat * 10) * 1e6,
+        "end_to_end_us": measure(dollar_bot.obtener_tasas, repeat) * 1e6,
+        "messages": dollar_bot.messages.get_stats(),
+    }
+    dollar_bot.fetcher.shutdown()
+    return results
+
+if __name__ == "__main__":
+    repeat = int(sys.argv[1]) if len(sys.argv) > 1 else 2000
+    print(json.dumps(run(repeat), indent=2, default=str))
@@ -0,0 +1,60 @@
+"""
+Microbenchmark: rolling get_stats vs. the old full-history scan
+
+Run from the DataDive directory:
+    python -m bench.bench_stats [points]
+"""
+
+import sys
+import time
+import random
+from rolling_stats import RollingStats
+
+def full_scan_stats(history):
+    """The pre-rolling implementation: rebuild the list and scan it"""
+    rates = [entry["rate"] for entry in history]
+    return {
+        "count": len(rates),
+        "min": min(rates),
+        "max": max(rates),
+        "avg": sum(rates) / len(rates)
+    }
+
+def measure(func, repeat):
+    start = time.perf_counter()
+    for _ in range(repeat):
+        func()
+    return (time.perf_counter() - start) / repeat
+
+def run(points=1_000_000, repeat=20):
+    now = time.time()
+    step = 60 * 86400 / points
+    history = []
+    rolling = RollingStats()
+    rate = 100.0
+
+    build_start = time.perf_counter()
+    for i in range(points):
+        rate *= 1 + random.uniform(-0.002, 0.002)
+        ts = now - (points - i) * step
+        history.append({"rate": rate, "timestamp": ts})
+        rolling.add("bcv", rate, ts)
+    build = time.perf_counter() - build_start
+
+    # Evicting everything outside the windows is amortized over the inserts,
+    # so keep it out of the steady-state figure
+    rolling.expire(now)
+    scan = measure(lambda: full_scan_stats(history), max(1, repeat // 10))
+    incremental = measure(lambda: rolling.summary("bcv", now), repeat * 100)
+    return {
+        "points": points,
+        "ingest_us_per_point": build / points * 1e6,
+        "full_scan_ms": scan * 1000,
+        "rolling_us": incremental * 1e6,
+        "speedup": scan / incremental if incremental else None
+    }
+
+if __name__ == "__main__":
+    points = int(sys.argv[1]) if len(sys.argv) > 1 else 1_000_000
+    for key, value in run(points).items():
+        print(f"{key}: {value:.3f}" if isinstance(value, float) else f"{key}: {value}")
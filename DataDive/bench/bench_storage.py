@@ -0,0 +1,64 @@
+"""
+Benchmark: RateStorage.save_rate cost as the history grows
+
+Times save_rate on each storage backend after pre-loading 1k to 1M rows, and
+the pre-backend implementation (rewrite the whole JSON file on every save)
+up to the sizes where it is still bearable. The write_behind entry is the
+default buffered path fed the same rate over and over, as /tasas does.
+
+Run from the DataDive directory:
+    python -m bench.bench_storage [max_rows]
+"""
+
+import sys
+import json
+import time
+import datetime
+from bench.env import prepare
+from bench.bench_stats import measure
+
+def legacy_save_rate(path, history, rate):
+    """The old rates_data.json behaviour: append, then dump everything"""
+    history.append({"rate": rate, "timestamp": datetime.datetime.now().isoformat()})
+    with open(path, "w", encoding="utf-8") as f:
+        json.dump({"last_rate": rate, "history": history}, f)
+
+def preload(backend, rows, chunk=50000):
+    now = time.time() - rows
+    for start in range(0, rows, chunk):
+        backend.append_many([("bcv", 100.0 + i % 50, now + i) for i in range(start, min(rows, start + chunk))])
+
+def run(max_rows=1_000_000, repeat=200):
+    prepare()
+    from storage_backends import create_backend
+    from rate_storage import RateStorage
+
+    sizes = [size for size in (1000, 10000, 100000, 1000000) if size <= max_rows]
+    results = {}
+    for kind in ("sqlite", "log"):
+        results[kind] = {}
+        for size in sizes:
+            backend = create_backend(kind, f"bench_{kind}_{size}.{'db' if kind == 'sqlite' else 'log'}")
+            preload(backend, size)
+            storage = RateStorage(storage_file="missing.json", backend=backend, write_behind=False)
+            results[kind][str(size)] = {"save_rate_us": measure(lambda: storage.save_rate(105.45), repeat) * 1e6}
+
+    backend = create_backend("sqlite", "bench_write_behind.db")
+    storage = RateStorage(storage_file="missing.json", backend=backend, write_behind=True)
+    saves = repeat * 10
+    results["write_behind"] = {"save_rate_us": measure(lambda: storage.save_rate(105.45), saves) * 1e6}
+    storage.close()
+    results["write_behind"].update(saves=saves, rows_written=backend.count())
+
+    results["legacy_json"] = {}
+    for size in (size for size in sizes if size <= 100000):
+        history = [{"rate": 100.0, "timestamp": "2025-01-01T00:00:00"}] * size
+        runs = max(1, repeat // (size // 1000 or 1))
+        results["legacy_json"][str(size)] = {
+            "save_rate_us": measure(lambda: legacy_save_rate("legacy.json", history, 105.45), runs) * 1e6
+        }
+    return results
+
+if __name__ == "__main__":
+    max_rows = int(sys.argv[1]) if len(sys.argv) > 1 else 1_000_000
+    print(json.dumps(run(max_rows), indent=2))
@@ -0,0 +1,76 @@
+"""
+Load test: /tasas latency in polling mode against local stubs
+
+Runs the threaded telebot bot from main.py against FakeTelegram, with the
+PyDolarVe and CLP Today stubs at a given latency and failure rate, and
+reports reply latency percentiles for warm-cache and cold-cache requests.
+
+Run from the DataDive directory:
+    python -m bench.bench_tasas [requests] [latency_s] [failure_rate]
+"""
+
+import sys
+import json
+import time
+import threading
+from bench.env import prepare, percentile
+from bench.stubs import PyDolarVeStub, CLPTodayStub, FakeTelegram
+from bench.bench_async_bot import reply_latencies
+
+def summarize(latencies, elapsed):
+    return {
+        "requests": len(latencies),
+        "p50_s": percentile(latencies, 50),
+        "p99_s": percentile(latencies, 99),
+        "replies_per_s": len(latencies) / elapsed if elapsed else None
+    }
+
+def run(requests=200, latency=0.05, failure_rate=0.05):
+    pydolarve = PyDolarVeStub(latency=latency, failure_rate=failure_rate).start()
+    clptoday = CLPTodayStub(latency=latency, failure_rate=failure_rate).start()
+    telegram = FakeTelegram().start()
+    prepare(PYDOLARVE_URL=pydolarve.url, CLPTODAY_URL=clptoday.url, RATE_POLLER="0")
+
+    from telebot import apihelper
+    apihelper.API_URL = telegram.api_url()
+    import main
+
+    threading.Thread(target=main.bot.infinity_polling, kwargs={"timeout": 1, "long_polling_timeout": 1},
+                     daemon=True).start()
+    results = {"latency_s": latency, "failure_rate": failure_rate}
+
+    # Warm cache: one request primes every source, the rest are served from it
+    main.dollar_bot.obtener_tasas()
+    start = len(telegram.sent)
+    pushed = {}
+    began = time.monotonic()
+    for chat_id in range(1, requests + 1):
+        telegram.push_message(chat_id, "/tasas")
+        pushed[chat_id] = [time.monotonic()]
+    telegram.wait_for_sent(start + requests, timeout=120)
+    results["warm"] = summarize(reply_latencies(telegram, pushed), time.monotonic() - began)
+
+    # Cold cache: every request goes upstream (timed on the fetch itself)
+    cold = []
+    errors = 0
+    for _ in range(max(1, requests // 10)):
+        main.dollar_bot.cache.entries.clear()
+        began = time.monotonic()
+        message = main.dollar_bot.obtener_tasas()
+        cold.append(time.monotonic() - began)
+        errors += "Sin respuesta" in message or message.startswith("❌")
+    results["cold"] = summarize(cold, sum(cold))
+    results["cold"]["degraded"] = errors
+    results["upstream_requests"] = pydolarve.requests + clptoday.requests
+
+    main.bot.stop_polling()
+    for stub in (pydolarve, clptoday, telegram):
+        stub.stop()
+    return results
+
+if __name__ == "__main__":
+    args = sys.argv[1:]
+    requests = int(args[0]) if len(args) > 0 else 200
+    latency = float(args[1]) if len(args) > 1 else 0.05
+    failure_rate = float(args[2]) if len(args) > 2 else 0.05
+    print(json.dumps(run(requests, latency, failure_rate), indent=2))
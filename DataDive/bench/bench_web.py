@@ -0,0 +1,68 @@
+"""
+Load test: /api/status requests per second on the Flask dashboard
+
+Serves web_interface.app on a local threaded server with the bot state from
+main.py, pre-loads some rate history, and hammers the endpoint from several
+keep-alive clients.
+
+Run from the DataDive directory:
+    python -m bench.bench_web [requests] [clients]
+"""
+
+import sys
+import json
+import time
+import threading
+import requests as http
+from concurrent.futures import ThreadPoolExecutor
+from werkzeug.serving import make_server
+from bench.env import prepare, percentile
+
+def run(total=2000, clients=8, path="/api/status", history=10000):
+    prepare(RATE_POLLER="0")
+    import main
+    import web_interface
+
+    now = time.time()
+    web_interface.storage.backend.append_many(
+        [("bcv", 100.0 + i % 50, now - (history - i) * 60) for i in range(history)]
+    )
+    web_interface.storage.sync(force=True)
+    web_interface.set_bot_instance(main.dollar_bot)
+    server = make_server("127.0.0.1", 0, web_interface.app, threaded=True)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    url = f"http://127.0.0.1:{server.server_port}{path}"
+
+    def client(count):
+        session = http.Session()
+        latencies = []
+        failures = 0
+        for _ in range(count):
+            began = time.perf_counter()
+            response = session.get(url)
+            latencies.append(time.perf_counter() - began)
+            failures += response.status_code != 200
+        return latencies, failures
+
+    client(20)
+    began = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=clients) as pool:
+        outcomes = list(pool.map(client, [total // clients] * clients))
+    elapsed = time.perf_counter() - began
+    server.shutdown()
+
+    latencies = [lat for outcome in outcomes for lat in outcome[0]]
+    return {
+        "path": path,
+        "clients": clients,
+        "requests": len(latencies),
+        "failures": sum(outcome[1] for outcome in outcomes),
+        "requests_per_s": len(latencies) / elapsed,
+        "p50_s": percentile(latencies, 50),
+        "p99_s": percentile(latencies, 99)
+    }
+
+if __name__ == "__main__":
+    total = int(sys.argv[1]) if len(sys.argv) > 1 else 2000
+    clients = int(sys.argv[2]) if len(sys.argv) > 2 else 8
+    print(json.dumps(run(total, clients), indent=2))
@@ -0,0 +1,29 @@
+"""Shared setup for benchmarks that import the bot modules"""
+
+import os
+import sys
+import tempfile
+
+DATADIVE = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+def prepare(**env):
+    """Point the bot at local stubs and run it from a scratch directory
+
+    main.py logs to ./bot.log and the storage lives in the working directory,
+    so benchmarks must never run against the real files.
+    """
+    os.environ.setdefault("TOKEN", "123456:stub-token")
+    os.environ.setdefault("CHAT_ID", "1")
+    os.environ.update({key: str(value) for key, value in env.items()})
+    workdir = tempfile.mkdtemp(prefix="dollarbot-bench-")
+    os.chdir(workdir)
+    if DATADIVE not in sys.path:
+        sys.path.insert(0, DATADIVE)
+    return workdir
+
+def percentile(values, pct):
+    if not values:
+        return None
+    ordered = sorted(values)
+    index = min(len(ordered) - 1, max(0, int(round(pct / 100 * (len(ordered) - 1)))))
+    return ordered[index]
@@ -0,0 +1,138 @@
+"""
+Run the whole offline benchmark suite and write the results as JSON
+
+Each benchmark runs in its own interpreter (they import main.py, which sets
+up module-level state), and the combined results go to one file together
+with the commit and Python version. With --compare, metrics that got worse
+than the baseline by more than --tolerance are listed and the exit status
+is 1, so a release can be checked against the previous one.
+
+Run from the DataDive directory:
+    python -m bench.run_all [--quick] [--only tasas,web] [--output results.json]
+                            [--compare baseline.json] [--tolerance 0.2]
+"""
+
+import os
+import sys
+import json
+import time
+import argparse
+import platform
+import subprocess
+import tempfile
+from bench.env import DATADIVE
+
+# name -> (module, run() kwargs for the full run, kwargs for --quick)
+SUITES = {
+    "tasas": ("bench.bench_tasas", {"requests": 200}, {"requests": 40}),
+    "async_bot": ("bench.bench_async_bot", {"chats": 50}, {"chats": 10, "slow_latency": 0.5}),
+    "broadcast": ("bench.bench_broadcast", {"count": 2000}, {"count": 300}),
+    "storage": ("bench.bench_storage", {"max_rows": 1_000_000}, {"max_rows": 10000, "repeat": 50}),
+    "web": ("bench.bench_web", {"total": 2000}, {"total": 400}),
+    "stats": ("bench.bench_stats", {"points": 1_000_000}, {"points": 100_000}),
+    "extractor": ("bench.bench_extractor", {}, {"repeat": 5}),
+    "render": ("bench.bench_render", {}, {"repeat": 200}),
+    "history": ("bench.bench_history", {"years": 3, "sources": 10}, {"years": 1, "sources": 3, "repeat": 2}),
+}
+
+RUNNER = """
+import json, sys, importlib
+module = importlib.import_module(sys.argv[1])
+result = module.run(**json.loads(sys.argv[2]))
+with open(sys.argv[3], "w", encoding="utf-8") as f:
+    json.dump(result, f, default=str)
+"""
+
+# Metric name endings where a bigger number is an improvement
+HIGHER_IS_BETTER = ("per_s", "per_second", "speedup", "mb_per_s")
+LOWER_IS_BETTER = ("_s", "_ms", "_us")
+
+def run_suite(name, quick=False):
+    module, full, light = SUITES[name]
+    fd, out = tempfile.mkstemp(suffix=".json")
+    os.close(fd)
+    began = time.monotonic()
+    try:
+        proc = subprocess.run(
+            [sys.executable, "-c", RUNNER, module, json.dumps(light if quick else full), out],
+            cwd=DATADIVE, capture_output=True, text=True
+        )
+        if proc.returncode != 0:
+            return {"error": proc.stderr.strip().splitlines()[-1] if proc.stderr.strip() else "failed"}
+        with open(out, encoding="utf-8") as f:
+            result = json.load(f)
+        result["wall_s"] = time.monotonic() - began
+        return result
+    finally:
+        os.remove(out)
+
+def git_commit():
+    try:
+        return subprocess.run(["git", "rev-parse", "--short", "HEAD"], cwd=DATADIVE,
+                              capture_output=True, text=True).stdout.strip() or None
+    except Exception:
+        return None
+
+def flatten(data, prefix=""):
+    flat = {}
+    for key, value in data.items():
+        name = f"{prefix}{key}"
+        if isinstance(value, dict):
+            flat.update(flatten(value, name + "."))
+        elif isinstance(value, (int, float)) and not isinstance(value, bool):
+            flat[name] = value
+    return flat
+
+def compare(current, baseline, tolerance):
+    """Metrics worse than the baseline by more than `tolerance` (a fraction)"""
+    regressions = []
+    old = flatten(baseline.get("results", {}))
+    for name, value in flatten(current.get("results", {})).items():
+        metric = name.rsplit(".", 1)[-1]
+        if name not in old or not old[name] or metric == "wall_s":
+            continue
+        if metric.endswith(HIGHER_IS_BETTER):
+            change = (old[name] - value) / old[name]
+        elif metric.endswith(LOWER_IS_BETTER):
+            change = (value - old[name]) / old[name]
+        else:
+            continue
+        if change > tolerance:
+            regressions.append({"metric": name, "baseline": old[name], "current": value, "worse_by": change})
+    return regressions
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Offline benchmark suite")
+    parser.add_argument("--only", help="comma-separated suites: " + ", ".join(SUITES))
+    parser.add_argument("--quick", action="store_true", help="smaller workloads, for a fast sanity run")
+    parser.add_argument("--output", default="bench_results.json")
+    parser.add_argument("--compare", help="previous results file to check for regressions")
+    parser.add_argument("--tolerance", type=float, default=0.2)
+    args = parser.parse_args(argv)
+
+    names = args.only.split(",") if args.only else list(SUITES)
+    report = {
+        "commit": git_commit(),
+        "python": platform.python_version(),
+        "platform": platform.platform(),
+        "quick": args.quick,
+        "started": time.strftime("%Y-%m-%dT%H:%M:%S"),
+        "results": {}
+    }
+    for name in names:
+        print(f"Running {name}...", file=sys.stderr)
+        report["results"][name] = run_suite(name, args.quick)
+
+    status = 0
+    if args.compare:
+        with open(args.compare, encoding="utf-8") as f:
+            report["regressions"] = compare(report, json.load(f), args.tolerance)
+        status = 1 if report["regressions"] else 0
+
+    with open(args.output, "w", encoding="utf-8") as f:
+        json.dump(report, f, indent=2, default=str)
+    print(json.dumps(report, indent=2, default=str))
+    return status
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,217 @@
+"""
+Local stand-ins for the bot's upstreams, for offline benchmarks
+
+- PyDolarVeStub: /api/v2/tipo-cambio and /api/v2/market-p2p
+- CLPTodayStub: serves the saved clptoday.com fixture with an ETag
+- FakeTelegram: enough of the Bot API (getMe, getUpdates, sendMessage, ...)
+  to drive pyTelegramBotAPI in both sync and asyncio modes
+
+Every stub takes a `latency` (seconds, or a callable returning seconds) and a
+`failure_rate` (fraction of requests answered with HTTP 500).
+"""
+
+import os
+import json
+import time
+import random
+import threading
+from http.server import ThreadingHTTPServer, BaseHTTPRequestHandler
+from urllib.parse import urlsplit, parse_qs
+
+FIXTURES = os.path.join(os.path.dirname(__file__), "fixtures")
+
+class StubServer:
+    """Threaded HTTP server on 127.0.0.1 with configurable latency and failures"""
+
+    def __init__(self, latency=0.0, failure_rate=0.0):
+        self.latency = latency
+        self.failure_rate = failure_rate
+        self.requests = 0
+        self.lock = threading.Lock()
+        stub = self
+
+        class Handler(BaseHTTPRequestHandler):
+            protocol_version = "HTTP/1.1"
+
+            def log_message(self, *args):
+                pass
+
+            def _dispatch(self):
+                with stub.lock:
+                    stub.requests += 1
+                delay = stub.latency() if callable(stub.latency) else stub.latency
+                if delay:
+                    time.sleep(delay)
+                if stub.failure_rate and random.random() < stub.failure_rate:
+                    return self._send(500, b'{"error": "stub failure"}')
+                url = urlsplit(self.path)
+                query = {k: v[-1] for k, v in parse_qs(url.query).items()}
+                length = int(self.headers.get("Content-Length") or 0)
+                body = self.rfile.read(length) if length else b""
+                status, payload, headers = stub.handle(self.command, url.path, query, body, self.headers)
+                self._send(status, payload, headers)
+
+            def _send(self, status, payload, headers=None):
+                if isinstance(payload, (dict, list)):
+                    payload = json.dumps(payload).encode("utf-8")
+                    headers = dict(headers or {}, **{"Content-Type": "application/json"})
+                self.send_response(status)
+                for key, value in (headers or {}).items():
+                    self.send_header(key, value)
+                self.send_header("Content-Length", str(len(payload)))
+                self.end_headers()
+                self.wfile.write(payload)
+
+            do_GET = _dispatch
+            do_POST = _dispatch
+
+        self.server = ThreadingHTTPServer(("127.0.0.1", 0), Handler)
+        self.server.daemon_threads = True
+        self.url = f"http://127.0.0.1:{self.server.server_port}"
+        self.thread = threading.Thread(target=self.server.serve_forever, daemon=True)
+
+    def handle(self, method, path, query, body, headers):
+        raise NotImplementedError
+
+    def start(self):
+        self.thread.start()
+        return self
+
+    def stop(self):
+        self.server.shutdown()
+        self.server.server_close()
+
+class PyDolarVeStub(StubServer):
+    """pydolarve.org rate endpoints with fixed prices"""
+
+    def __init__(self, bcv=105.45, eur=120.10, cop=0.0265, p2p=None, **kwargs):
+        super().__init__(**kwargs)
+        self.bcv = bcv
+        self.eur = eur
+        self.cop = cop
+        self.p2p = p2p or {"binance": 128.4, "bybit": 127.9, "okx": 129.1, "yadio": 126.5}
+
+    def handle(self, method, path, query, body, headers):
+        if path == "/api/v2/tipo-cambio":
+            price = {"eur": self.eur, "cop": self.cop}.get(query.get("currency"), self.bcv)
+            return 200, {"price": price}, None
+        if path == "/api/v2/market-p2p":
+            platforms = {key: {"title": key.capitalize(), "price": price} for key, price in self.p2p.items()}
+            return 200, {"platforms": platforms}, None
+        return 404, {"error": "not found"}, None
+
+class CLPTodayStub(StubServer):
+    """clptoday.com front page from a saved fixture, with ETag/304 support
+
+    The default fixture's prices sit next to PyDolarVeStub's BCV rate, so they
+    pass the scraper's order-of-magnitude check.
+    """
+
+    def __init__(self, fixture="clptoday_dotted.html", **kwargs):
+        super().__init__(**kwargs)
+        with open(os.path.join(FIXTURES, fixture), "rb") as f:
+            self.page = f.read()
+        self.etag = '"fixture-1"'
+
+    def handle(self, method, path, query, body, headers):
+        if headers.get("If-None-Match") == self.etag:
+            return 304, b"", {"ETag": self.etag}
+        return 200, self.page, {"Content-Type": "text/html; charset=utf-8", "ETag": self.etag}
+
+class FakeTelegram(StubServer):
+    """In-memory Telegram Bot API: queue updates in, collect sent messages out"""
+
+    def __init__(self, **kwargs):
+        super().__init__(**kwargs)
+        self.updates = []
+        self.sent = []
+        self.next_update_id = 1
+        self.next_message_id = 1
+        self.cond = threading.Condition()
+        # sendMessage answers 429 with this retry_after for the next N calls
+        self.throttle_calls = 0
+        self.retry_after = 1
+
+    def api_url(self):
+        """Value for telebot.apihelper.API_URL / asyncio_helper.API_URL"""
+        return self.url + "/bot{0}/{1}"
+
+    def push_message(self, chat_id, text):
+        with self.cond:
+            update_id = self.next_update_id
+            self.next_update_id += 1
+            self.updates.append({
+                "update_id": update_id,
+                "message": {
+                    "message_id": update_id,
+                    "date": int(time.time()),
+                    "chat": {"id": chat_id, "type": "private"},
+                    "from": {"id": chat_id, "is_bot": False, "first_name": f"user{chat_id}"},
+                    "text": text
+                }
+            })
+            self.cond.notify_all()
+        return update_id
+
+    def wait_for_sent(self, count, timeout=30):
+        deadline = time.monotonic() + timeout
+        with self.cond:
+            while len(self.sent) < count:
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    return False
+                self.cond.wait(remaining)
+        return True
+
+    def handle(self, method, path, query, body, headers):
+        parts = path.strip("/").split("/")
+        api_method = parts[-1] if len(parts) >= 2 else ""
+        params = dict(query)
+        if body:
+            if headers.get("Content-Type", "").startswith("application/json"):
+                params.update(json.loads(body))
+            else:
+                params.update({k: v[-1] for k, v in parse_qs(body.decode("utf-8")).items()})
+
+        if api_method == "getMe":
+            return 200, {"ok": True, "result": {"id": 1, "is_bot": True, "first_name": "Stub", "username": "stub_bot"}}, None
+        if api_method in ("deleteWebhook", "setWebhook", "close", "logOut"):
+            return 200, {"ok": True, "result": True}, None
+        if api_method == "getUpdates":
+            return 200, {"ok": True, "result": self._get_updates(params)}, None
+        if api_method == "sendMessage":
+            return self._send_message(params)
+        return 200, {"ok": True, "result": True}, None
+
+    def _get_updates(self, params):
+        offset = int(params.get("offset") or 0)
+        timeout = float(params.get("timeout") or 0)
+        deadline = time.monotonic() + min(timeout, 5)
+        with self.cond:
+            # Telegram semantics: asking for `offset` confirms everything before it
+            self.updates = [u for u in self.updates if u["update_id"] >= offset]
+            while not self.updates and time.monotonic() < deadline:
+                self.cond.wait(deadline - time.monotonic())
+            return list(self.updates[:100])
+
+    def _send_message(self, params):
+        with self.cond:
+            if self.throttle_calls > 0:
+                self.throttle_calls -= 1
+                return 429, {
+                    "ok": False,
+                    "error_code": 429,
+                    "description": f"Too Many Requests: retry after {self.retry_after}",
+                    "parameters": {"retry_after": self.retry_after}
+                }, None
+            message_id = self.next_message_id
+            self.next_message_id += 1
+            chat_id = int(params.get("chat_id", 0))
+            self.sent.append({"chat_id": chat_id, "text": params.get("text", ""), "at": time.monotonic()})
+            self.cond.notify_all()
+        return 200, {"ok": True, "result": {
+            "message_id": message_id,
+            "date": int(time.time()),
+            "chat": {"id": chat_id, "type": "private"},
+            "text": params.get("text", "")
+        }}, None
@@ -0,0 +1,182 @@
+import time
+import threading
+import logging
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+from requests.exceptions import ConnectionError as RequestsConnectionError, ConnectTimeout
+from urllib3.exceptions import ConnectTimeoutError
+from telebot.apihelper import ApiTelegramException
+
+logger = logging.getLogger(__name__)
+
+class TokenBucket:
+    """Thread-safe token bucket; acquire() blocks until a token is available"""
+
+    def __init__(self, rate, capacity=None, clock=time.monotonic, sleep=time.sleep):
+        self.rate = float(rate)
+        self.capacity = float(capacity if capacity is not None else max(1.0, rate))
+        self.tokens = self.capacity
+        self.clock = clock
+        self.sleep = sleep
+        self.updated = clock()
+        self.blocked_until = 0.0
+        self.lock = threading.Lock()
+
+    def _refill(self, now):
+        self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+        self.updated = now
+
+    def acquire(self):
+        while True:
+            with self.lock:
+                now = self.clock()
+                self._refill(now)
+                if now < self.blocked_until:
+                    wait = self.blocked_until - now
+                elif self.tokens >= 1:
+                    self.tokens -= 1
+                    return
+                else:
+                    wait = (1 - self.tokens) / self.rate
+            self.sleep(wait)
+
+    def pause(self, seconds):
+        """Hand out nothing for `seconds` (Telegram asked us to back off)"""
+        with self.lock:
+            self.blocked_until = max(self.blocked_until, self.clock() + seconds)
+            self.tokens = 0.0
+
+def never_sent(error):
+    """True when the request failed before reaching Telegram: DNS, refused or timed-out connect
+
+    A read timeout or a reset after the request went out may still have
+    delivered the message, so those are not safe to retry.
+    """
+    if isinstance(error, ConnectTimeout):
+        return True
+    if isinstance(error, RequestsConnectionError):
+        reason = error.args[0] if error.args else None
+        # requests wraps urllib3's MaxRetryError, whose reason is the connect error
+        reason = getattr(reason, "reason", reason)
+        # NewConnectionError and NameResolutionError are ConnectTimeoutErrors in urllib3
+        return isinstance(reason, ConnectTimeoutError)
+    return False
+
+class Broadcaster:
+    """Send one pre-rendered message to many chats within Telegram's rate limits
+
+    The journal is written around every send: a chat is marked in flight
+    right before its first attempt and gets its final status right after.
+    A broadcast resumed after a crash only sends to chats still pending, so
+    a chat is never messaged twice; one that was in flight at the crash may
+    miss this message instead. For the same reason only errors raised before
+    the request went out are retried; a timeout or reset while waiting for
+    the answer leaves the chat "unknown".
+
+    Urgent broadcasts (the rate alerts) run under their own lock, so they
+    don't wait behind a daily update; both share the global rate bucket.
+    """
+
+    def __init__(self, send, registry, journal, workers=8, global_rate=25.0, per_chat_rate=1.0,
+                 max_attempts=5):
+        self.send = send
+        self.registry = registry
+        self.journal = journal
+        self.workers = workers
+        self.per_chat_rate = per_chat_rate
+        self.max_attempts = max_attempts
+        # No burst allowance: Telegram counts messages per second, not per minute
+        self.global_bucket = TokenBucket(global_rate, capacity=1)
+        self.chat_buckets = OrderedDict()
+        self.chat_lock = threading.Lock()
+        self.run_lock = threading.Lock()
+        self.urgent_lock = threading.Lock()
+
+    def _chat_bucket(self, chat_id):
+        with self.chat_lock:
+            bucket = self.chat_buckets.get(chat_id)
+            if bucket is None:
+                bucket = self.chat_buckets[chat_id] = TokenBucket(self.per_chat_rate, capacity=1)
+                if len(self.chat_buckets) > 50000:
+                    self.chat_buckets.popitem(last=False)
+            else:
+                self.chat_buckets.move_to_end(chat_id)
+            return bucket
+
+    def _deliver(self, broadcast_id, chat_id, text, parse_mode):
+        result = self._send_with_retries(broadcast_id, chat_id, text, parse_mode)
+        self.journal.mark(broadcast_id, [result])
+        return result
+
+    def _send_with_retries(self, broadcast_id, chat_id, text, parse_mode):
+        attempts = 0
+        while True:
+            attempts += 1
+            self._chat_bucket(chat_id).acquire()
+            self.global_bucket.acquire()
+            if attempts == 1:
+                self.journal.mark_in_flight(broadcast_id, chat_id)
+            try:
+                self.send(chat_id, text, parse_mode)
+                return chat_id, "sent", attempts
+            except ApiTelegramException as e:
+                if e.error_code == 429 and attempts < self.max_attempts:
+                    retry_after = (e.result_json or {}).get("parameters", {}).get("retry_after", 1)
+                    logger.warning(f"Telegram rate limit hit, retrying after {retry_after}s")
+                    self.global_bucket.pause(retry_after)
+                    continue
+                if e.error_code == 403 or (e.error_code == 400 and "chat not found" in str(e.description).lower()):
+                    # Bot blocked, chat deleted or bot kicked: stop sending to it
+                    self.registry.unsubscribe(chat_id)
+                    return chat_id, "blocked", attempts
+                logger.error(f"Error sending to {chat_id}: {e}")
+                return chat_id, "failed", attempts
+            except Exception as e:
+                if not never_sent(e):
+                    logger.error(f"Sending to {chat_id} may or may not have gone through, not retrying: {e}")
+                    return chat_id, "unknown", attempts
+                if attempts < self.max_attempts:
+                    time.sleep(min(30, 0.5 * 2 ** attempts))
+                    continue
+                logger.error(f"Error sending to {chat_id}: {e}")
+                return chat_id, "failed", attempts
+
+    def broadcast(self, text, parse_mode=None, chat_ids=None, urgent=False):
+        """Journal a new broadcast to every active subscriber (or chat_ids) and run it"""
+        if chat_ids is None:
+            chat_ids = self.registry.active_chat_ids()
+        broadcast_id = self.journal.create(text, parse_mode, chat_ids)
+        return self.run(broadcast_id, urgent)
+
+    def run(self, broadcast_id, urgent=False):
+        """Deliver every pending chat of a journaled broadcast"""
+        with self.urgent_lock if urgent else self.run_lock:
+            record = self.journal.get(broadcast_id)
+            if record is None:
+                return None
+            text, parse_mode, _ = record
+            pending = self.journal.pending(broadcast_id)
+            in_flight = self.journal.in_flight(broadcast_id)
+            if in_flight:
+                logger.warning(f"Broadcast {broadcast_id}: {in_flight} deliveries were in flight "
+                               "when it stopped, not sending them again")
+            logger.info(f"Broadcast {broadcast_id}: {len(pending)} pending deliveries")
+
+            start = time.monotonic()
+            counts = {"sent": 0, "failed": 0, "blocked": 0, "unknown": 0}
+            with ThreadPoolExecutor(max_workers=self.workers, thread_name_prefix="broadcast") as pool:
+                for result in pool.map(lambda chat_id: self._deliver(broadcast_id, chat_id, text, parse_mode), pending):
+                    counts[result[1]] += 1
+            self.journal.finish(broadcast_id)
+
+            elapsed = time.monotonic() - start
+            counts["elapsed"] = elapsed
+            counts["per_second"] = counts["sent"] / elapsed if elapsed else 0.0
+            logger.info(f"Broadcast {broadcast_id} finished: {counts}")
+            return counts
+
+    def resume_unfinished(self):
+        """Finish broadcasts interrupted by a crash or restart"""
+        for broadcast_id in self.journal.unfinished():
+            logger.info(f"Resuming broadcast {broadcast_id}")
+            self.run(broadcast_id)
@@ -0,0 +1,174 @@
+import re
+import math
+import logging
+from functools import lru_cache
+from lxml import etree, html as lxml_html
+
+# label as it appears on the page -> keys it feeds in the rates dict
+LABELS = {
+    'zelle': ('usd_zelle',),
+    'paypal': ('usd_paypal',),
+    'dólar': ('usd_usd',),
+    'dollar': ('usd_dollar',),
+    # "euro" also contains "eur", so it answers for both keys
+    'euro': ('eur_euro', 'eur_eur'),
+    'eur': ('eur_eur',),
+    '€': ('eur_€',)
+}
+
+ALL_KEYS = frozenset(key for keys in LABELS.values() for key in keys)
+
+# While a label is waiting for its number we scan labels, numbers and line
+# breaks in one alternation; otherwise only the next useful label matters.
+# Longer labels come first so "euro" wins over "eur", and number groups are
+# split by a single [.,] so neither pattern can backtrack.
+NUMBER_PATTERN = r"(?P<num>\d+(?:[.,]\d+)*)|(?P<nl>\n)"
+
+NUMBER_RE = re.compile(r"\d+(?:[.,]\d+)+")
+
+# A rate more than this many times above or below the BCV rate is a misread
+MAX_BCV_RATIO = 10.0
+
+logger = logging.getLogger(__name__)
+
+@lru_cache(maxsize=None)
+def _patterns(labels):
+    """(label-only, label/number/newline) regexes for the given label tuple"""
+    label = "(?P<label>" + "|".join(re.escape(l) for l in labels) + ")"
+    return re.compile(label, re.IGNORECASE), re.compile(label + "|" + NUMBER_PATTERN, re.IGNORECASE)
+
+def _open_labels(done):
+    # Labels whose keys are all found can no longer change the result
+    return tuple(l for l in LABELS if not done.issuperset(LABELS[l]))
+
+def _decimal_of(raw):
+    """The decimal separator `raw` shows unambiguously, or None"""
+    dots = raw.count('.')
+    commas = raw.count(',')
+    if dots and commas:
+        return '.' if raw.rfind('.') > raw.rfind(',') else ','
+    sep = '.' if dots else ','
+    groups = raw.split(sep)
+    if len(groups) > 2:
+        # "1.234.567" groups thousands, so the other one is the decimal
+        return (',' if sep == '.' else '.') if all(len(g) == 3 for g in groups[1:]) else None
+    return sep if len(groups[1]) != 3 else None
+
+def page_decimal(text):
+    """',' or '.' when most unambiguous numbers on the page use it as decimal separator"""
+    votes = {'.': 0, ',': 0}
+    for raw in NUMBER_RE.findall(text):
+        sep = _decimal_of(raw)
+        if sep:
+            votes[sep] += 1
+    if votes['.'] == votes[',']:
+        return None
+    return max(votes, key=votes.get)
+
+def plausible(value, reference):
+    return reference / MAX_BCV_RATIO <= value <= reference * MAX_BCV_RATIO
+
+def parse_number(raw, decimal=None, reference=None):
+    """Parse '1.234,56', '1,234.56', '105,45' or '105.45' into a float
+
+    One separator before exactly three digits ("105.450", "36.500") is read as
+    a thousands group only when the page's `decimal` separator is the other
+    one; if that reading is off the `reference` (BCV) rate's order of
+    magnitude and the other is not, the other wins.
+    """
+    dots = raw.count('.')
+    commas = raw.count(',')
+    if dots and commas:
+        # Both present: whichever comes last is the decimal separator
+        decimal = '.' if raw.rfind('.') > raw.rfind(',') else ','
+        thousands = ',' if decimal == '.' else '.'
+        return float(raw.replace(thousands, '').replace(decimal, '.'))
+    if dots + commas > 1:
+        # The same separator repeated can only be grouping thousands
+        return float(raw.replace('.', '').replace(',', ''))
+    if not dots + commas:
+        return float(raw)
+    sep = '.' if dots else ','
+    as_decimal = float(raw.replace(sep, '.'))
+    if len(raw) - raw.find(sep) - 1 != 3:
+        return as_decimal
+    as_thousands = float(raw.replace(sep, ''))
+    value, other = (as_thousands, as_decimal) if decimal and decimal != sep else (as_decimal, as_thousands)
+    if reference and not plausible(value, reference) and plausible(other, reference):
+        return other
+    return value
+
+def extract_rates(text, reference=None):
+    """Find every label and the first number after it on the same line, in one pass
+
+    `reference` is the current BCV rate, if known: numbers far from its order
+    of magnitude are dropped rather than reported.
+    """
+    rates = {}
+    done = set()
+    pending = []
+    decimal = None
+    pos = 0
+    end = len(text)
+    label_re, token_re = _patterns(tuple(LABELS))
+
+    while pos < end and len(done) < len(ALL_KEYS):
+        match = (token_re if pending else label_re).search(text, pos)
+        if match is None:
+            break
+        pos = match.end()
+        kind = match.lastgroup
+        if kind == 'label':
+            for key in LABELS[match.group().lower()]:
+                if key not in done and key not in pending:
+                    pending.append(key)
+        elif kind == 'num':
+            raw = match.group()
+            if decimal is None and raw.strip('0123456789') and _decimal_of(raw) is None:
+                # Ambiguous: look at the rest of the page once
+                decimal = page_decimal(text) or ''
+            try:
+                value = parse_number(raw, decimal or None, reference)
+            except ValueError:
+                value = 0.0
+            if value > 0 and reference and not plausible(value, reference):
+                logger.warning(f"Ignoring {raw} for {', '.join(pending)}: far from the BCV rate {reference}")
+                value = 0.0
+            for key in pending:
+                done.add(key)
+                if value > 0:
+                    rates[key] = value
+            pending = []
+            label_re, token_re = _patterns(_open_labels(done))
+        else:
+            # Labels only pair with numbers on their own line
+            pending = []
+
+    return rates
+
+BLOCK_TAGS = frozenset([
+    'p', 'li', 'td', 'th', 'tr', 'dd', 'dt', 'div', 'section', 'article',
+    'h1', 'h2', 'h3', 'h4', 'h5', 'h6', 'body'
+])
+
+# Visible text nodes that mention one of the labels
+REGION_XPATH = etree.XPath(
+    "//body//text()[not(ancestor::script or ancestor::style)]"
+    "[re:test(., 'zelle|paypal|dólar|dollar|eur|€', 'i')]",
+    namespaces={'re': 'http://exslt.org/regular-expressions'}
+)
+
+def extract_region_text(page):
+    """Text of the blocks around the rate labels only, one block per line"""
+    root = lxml_html.fromstring(page)
+    blocks = []
+    seen = set()
+    for node in REGION_XPATH(root):
+        block = node.getparent()
+        while block is not None and block.tag not in BLOCK_TAGS:
+            block = block.getparent()
+        if block is None or id(block) in seen:
+            continue
+        seen.add(id(block))
+        blocks.append(" ".join(block.text_content().split()))
+    return "\n".join(blocks)
@@ -0,0 +1,121 @@
+import json
+import queue
+import threading
+import logging
+from collections import deque
+
+CLOSED = object()
+
+class Event:
+    """A published event, encoded once in Server-Sent Events wire format"""
+
+    __slots__ = ("id", "type", "data", "encoded")
+
+    def __init__(self, event_id, event_type, data):
+        self.id = event_id
+        self.type = event_type
+        self.data = data
+        self.encoded = encode(event_type, data, event_id)
+
+def encode(event_type, data, event_id=None):
+    payload = json.dumps(data, ensure_ascii=False, default=str)
+    head = f"id: {event_id}\n" if event_id is not None else ""
+    return f"{head}event: {event_type}\ndata: {payload}\n\n"
+
+class Subscription:
+    """One stream client: a bounded queue of events still to be sent"""
+
+    def __init__(self, buffer_size, last_id):
+        self.queue = queue.Queue(maxsize=buffer_size)
+        self.last_id = last_id
+        self.resumed = False
+        self.overflowed = False
+
+    def get(self, timeout):
+        """Next event, None on timeout (time for a heartbeat), CLOSED when dropped"""
+        try:
+            return self.queue.get(timeout=timeout)
+        except queue.Empty:
+            return None
+
+class EventHub:
+    """In-process publish/subscribe for the dashboard stream
+
+    Keeps the last `history` events so a client that reconnects with
+    Last-Event-ID gets what it missed. A client whose buffer fills up is
+    dropped instead of growing without bound; it reconnects and resumes.
+    """
+
+    def __init__(self, history=1000, buffer_size=256):
+        self.history = deque(maxlen=history)
+        self.buffer_size = buffer_size
+        self.subscribers = set()
+        self.next_id = 1
+        self.lock = threading.Lock()
+        self.stats = {"published": 0, "dropped_clients": 0}
+
+    def publish(self, event_type, data):
+        with self.lock:
+            event = Event(self.next_id, event_type, data)
+            self.next_id += 1
+            self.history.append(event)
+            self.stats["published"] += 1
+            for subscription in list(self.subscribers):
+                try:
+                    subscription.queue.put_nowait(event)
+                except queue.Full:
+                    self._drop(subscription)
+        return event.id
+
+    def _drop(self, subscription):
+        self.subscribers.discard(subscription)
+        subscription.overflowed = True
+        self.stats["dropped_clients"] += 1
+        # Free the backlog right away; the client resumes from history
+        while True:
+            try:
+                subscription.queue.get_nowait()
+            except queue.Empty:
+                break
+        subscription.queue.put_nowait(CLOSED)
+
+    def subscribe(self, last_event_id=None):
+        """Register a client; with a Last-Event-ID still in history, queue what it missed"""
+        with self.lock:
+            subscription = Subscription(self.buffer_size, self.next_id - 1)
+            try:
+                last_id = int(last_event_id) if last_event_id else None
+            except ValueError:
+                last_id = None
+            # An id from before a restart (or older than the history) can't be resumed
+            if last_id is not None and self.history and self.history[0].id - 1 <= last_id < self.next_id:
+                missed = [event for event in self.history if event.id > last_id]
+                if len(missed) < self.buffer_size:
+                    for event in missed:
+                        subscription.queue.put_nowait(event)
+                    subscription.resumed = True
+            self.subscribers.add(subscription)
+        return subscription
+
+    def unsubscribe(self, subscription):
+        with self.lock:
+            self.subscribers.discard(subscription)
+
+    def get_stats(self):
+        with self.lock:
+            return dict(self.stats, clients=len(self.subscribers), last_id=self.next_id - 1)
+
+class HubLogHandler(logging.Handler):
+    """Publish every formatted log record as a 'log' event"""
+
+    def __init__(self, hub, level=logging.INFO):
+        super().__init__(level)
+        self.hub = hub
+
+    def emit(self, record):
+        try:
+            self.hub.publish("log", self.format(record))
+        except Exception:
+            self.handleError(record)
+
+hub = EventHub()
@@ -0,0 +1,269 @@
+import time
+import random
+import threading
+import logging
+from urllib.parse import urlsplit
+import requests
+from requests.adapters import HTTPAdapter
+from urllib3.connection import HTTPConnection, HTTPSConnection
+from urllib3.connectionpool import HTTPConnectionPool, HTTPSConnectionPool
+from tracing import span
+
+logger = logging.getLogger(__name__)
+
+RETRY_STATUS = {429, 500, 502, 503, 504}
+
+class CircuitOpenError(Exception):
+    """Raised when a host's circuit breaker is refusing requests"""
+
+class CircuitBreaker:
+    """Stop calling a host after repeated failures, probe it again after a cool-down"""
+
+    def __init__(self, failure_threshold=5, reset_timeout=30.0, clock=time.monotonic):
+        self.failure_threshold = failure_threshold
+        self.reset_timeout = reset_timeout
+        self.clock = clock
+        self.failures = 0
+        self.opened_at = None
+        self.probing = False
+        self.lock = threading.Lock()
+
+    @property
+    def state(self):
+        if self.opened_at is None:
+            return "closed"
+        if self.clock() - self.opened_at >= self.reset_timeout:
+            return "half_open"
+        return "open"
+
+    def allow(self):
+        with self.lock:
+            state = self.state
+            if state == "closed":
+                return True
+            if state == "half_open" and not self.probing:
+                # Let exactly one request through to test the host
+                self.probing = True
+                return True
+            return False
+
+    def record_success(self):
+        with self.lock:
+            self.failures = 0
+            self.opened_at = None
+            self.probing = False
+
+    def record_failure(self):
+        with self.lock:
+            self.failures += 1
+            self.probing = False
+            if self.opened_at is not None or self.failures >= self.failure_threshold:
+                self.opened_at = self.clock()
+
+class TracedConnection:
+    """Connection mixin that shows new connections in the current trace
+
+    'dns+tcp' is name resolution plus the TCP handshake; for HTTPS the rest
+    of 'connect' is the TLS handshake. Reused keep-alive connections add
+    neither span.
+    """
+
+    def _new_conn(self):
+        with span("dns+tcp", host=self.host):
+            return super()._new_conn()
+
+    def connect(self):
+        with span("connect", host=self.host):
+            return super().connect()
+
+class TracedHTTPConnection(TracedConnection, HTTPConnection):
+    pass
+
+class TracedHTTPSConnection(TracedConnection, HTTPSConnection):
+    pass
+
+class TracedHTTPConnectionPool(HTTPConnectionPool):
+    ConnectionCls = TracedHTTPConnection
+
+class TracedHTTPSConnectionPool(HTTPSConnectionPool):
+    ConnectionCls = TracedHTTPSConnection
+
+class HttpClient:
+    """Shared keep-alive HTTP client with retries, conditional GETs and per-host breakers"""
+
+    def __init__(self, pool_size=10, retries=2, backoff=0.25, max_backoff=4.0,
+                 failure_threshold=5, reset_timeout=30.0):
+        self.retries = retries
+        self.backoff = backoff
+        self.max_backoff = max_backoff
+        self.failure_threshold = failure_threshold
+        self.reset_timeout = reset_timeout
+
+        self.session = requests.Session()
+        self.session.headers.update({"User-Agent": "DollarBot/1.0"})
+        adapter = HTTPAdapter(pool_connections=pool_size, pool_maxsize=pool_size, max_retries=0)
+        self.session.mount("http://", adapter)
+        self.session.mount("https://", adapter)
+        self.adapter = adapter
+        adapter.poolmanager.pool_classes_by_scheme = {
+            "http": TracedHTTPConnectionPool,
+            "https": TracedHTTPSConnectionPool
+        }
+
+        self.breakers = {}
+        self.validators = {}
+        self.lock = threading.Lock()
+        self.counters = {"requests": 0, "retries": 0, "not_modified": 0, "errors": 0, "circuit_open": 0}
+        self.latency = {}
+
+    def _breaker(self, host):
+        with self.lock:
+            breaker = self.breakers.get(host)
+            if breaker is None:
+                breaker = self.breakers[host] = CircuitBreaker(self.failure_threshold, self.reset_timeout)
+            return breaker
+
+    def _count(self, key, amount=1):
+        with self.lock:
+            self.counters[key] += amount
+
+    def _record_latency(self, host, elapsed):
+        with self.lock:
+            stats = self.latency.setdefault(host, {"count": 0, "total": 0.0, "max": 0.0})
+            stats["count"] += 1
+            stats["total"] += elapsed
+            stats["max"] = max(stats["max"], elapsed)
+
+    def _sleep_backoff(self, attempt, deadline, elapsed, retry_after=None):
+        """Wait before the next attempt; False when the wait plus another attempt as
+        long as the last one (`elapsed`) would run past the deadline"""
+        if retry_after is not None:
+            delay = min(retry_after, self.max_backoff)
+        else:
+            # Full jitter keeps concurrent retries from hitting the host in lockstep
+            delay = random.uniform(0, min(self.max_backoff, self.backoff * (2 ** attempt)))
+        if time.monotonic() + delay + elapsed >= deadline:
+            return False
+        self._count("retries")
+        time.sleep(delay)
+        return True
+
+    def _send(self, url, host, timeout, headers, kwargs):
+        """The request with retries; every attempt and backoff fits in `timeout` seconds"""
+        deadline = time.monotonic() + timeout
+        attempt = 0
+        while True:
+            self._count("requests")
+            start = time.monotonic()
+            try:
+                with span("http", host=host, attempt=attempt) as stage:
+                    response = self.session.get(url, timeout=max(0.001, deadline - start), headers=headers, **kwargs)
+                    if stage:
+                        stage.set(status=response.status_code,
+                                  headers_ms=round(response.elapsed.total_seconds() * 1000, 3),
+                                  bytes=len(response.content))
+            except (requests.ConnectionError, requests.Timeout, requests.exceptions.ChunkedEncodingError):
+                elapsed = time.monotonic() - start
+                self._record_latency(host, elapsed)
+                if attempt < self.retries and self._sleep_backoff(attempt, deadline, elapsed):
+                    attempt += 1
+                    continue
+                raise
+            elapsed = time.monotonic() - start
+            self._record_latency(host, elapsed)
+
+            if response.status_code in RETRY_STATUS and attempt < self.retries:
+                retry_after = response.headers.get("Retry-After")
+                retry_after = float(retry_after) if retry_after and retry_after.isdigit() else None
+                if self._sleep_backoff(attempt, deadline, elapsed, retry_after):
+                    attempt += 1
+                    continue
+            return response
+
+    def get(self, url, timeout=10, conditional=True, **kwargs):
+        """GET a URL; returns the cached response when the server answers 304
+
+        `timeout` bounds the whole call, retries and backoff included, so a
+        source never outlives the budget its caller gave it.
+        """
+        host = urlsplit(url).netloc
+        breaker = self._breaker(host)
+        if not breaker.allow():
+            self._count("circuit_open")
+            raise CircuitOpenError(f"Circuit open for {host}")
+
+        headers = dict(kwargs.pop("headers", None) or {})
+        cached = self.validators.get(url) if conditional else None
+        if cached:
+            etag, last_modified, _ = cached
+            if etag:
+                headers["If-None-Match"] = etag
+            if last_modified:
+                headers["If-Modified-Since"] = last_modified
+
+        try:
+            response = self._send(url, host, timeout, headers, kwargs)
+        except BaseException:
+            # Whatever went wrong, settle the breaker: a half-open probe left
+            # unanswered would keep the host refused forever
+            self._count("errors")
+            breaker.record_failure()
+            raise
+
+        if response.status_code == 304 and cached:
+            breaker.record_success()
+            self._count("not_modified")
+            return cached[2]
+
+        if response.status_code >= 500:
+            breaker.record_failure()
+            self._count("errors")
+        else:
+            breaker.record_success()
+
+        if conditional and response.ok:
+            etag = response.headers.get("ETag")
+            last_modified = response.headers.get("Last-Modified")
+            if etag or last_modified:
+                self.validators[url] = (etag, last_modified, response)
+        return response
+
+    def get_json(self, url, timeout=10, **kwargs):
+        response = self.get(url, timeout=timeout, **kwargs)
+        response.raise_for_status()
+        return response.json()
+
+    def get_text(self, url, timeout=10, **kwargs):
+        response = self.get(url, timeout=timeout, **kwargs)
+        response.raise_for_status()
+        return response.text
+
+    def _pool_counts(self):
+        opened = sent = 0
+        for pool_key in list(self.adapter.poolmanager.pools.keys()):
+            pool = self.adapter.poolmanager.pools.get(pool_key)
+            if pool is not None:
+                opened += getattr(pool, "num_connections", 0)
+                sent += getattr(pool, "num_requests", 0)
+        return opened, sent
+
+    def get_stats(self):
+        """Counters for requests, connection reuse, latency and breaker state"""
+        opened, sent = self._pool_counts()
+        with self.lock:
+            stats = dict(self.counters)
+            stats["connections_opened"] = opened
+            stats["connections_reused"] = max(0, sent - opened)
+            stats["latency"] = {
+                host: {
+                    "count": s["count"],
+                    "avg": s["total"] / s["count"] if s["count"] else 0.0,
+                    "max": s["max"]
+                }
+                for host, s in self.latency.items()
+            }
+            stats["breakers"] = {host: b.state for host, b in self.breakers.items()}
+        return stats
+
+    def close(self):
+        self.session.close()
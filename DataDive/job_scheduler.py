@@ -0,0 +1,325 @@
+import os
+import json
+import heapq
+import queue
+import time
+import datetime
+import threading
+import logging
+from zoneinfo import ZoneInfo
+from metrics import histogram
+
+logger = logging.getLogger(__name__)
+
+LAG_SECONDS = histogram("dollarbot_scheduler_lag_seconds", "Delay between a job's due time and its start",
+                        buckets=(0.001, 0.01, 0.1, 0.5, 1.0, 5.0, 30.0, 60.0, 300.0))
+
+class CronExpr:
+    """Five-field cron expression: minute hour day-of-month month day-of-week"""
+
+    RANGES = [(0, 59), (0, 23), (1, 31), (1, 12), (0, 6)]
+
+    def __init__(self, expr):
+        fields = expr.split()
+        if len(fields) != 5:
+            raise ValueError(f"Cron expression needs 5 fields: '{expr}'")
+        self.expr = expr
+        self.minutes, self.hours, self.days, self.months, self.weekdays = [
+            self._parse(field, low, high, index == 4)
+            for index, (field, (low, high)) in enumerate(zip(fields, self.RANGES))
+        ]
+        # Classic cron rule: if both day fields are restricted, either may match
+        self.dom_any = fields[2] == "*"
+        self.dow_any = fields[4] == "*"
+
+    @staticmethod
+    def _parse(field, low, high, weekday):
+        values = set()
+        for part in field.split(","):
+            step = 1
+            if "/" in part:
+                part, step_str = part.split("/")
+                step = int(step_str)
+            if part == "*":
+                start, end = low, high
+            elif "-" in part:
+                start, end = (int(x) for x in part.split("-"))
+            else:
+                start = end = int(part)
+                if step > 1:
+                    end = high
+            if weekday:
+                # 7 is Sunday too
+                end = min(end, 7)
+            if start < low or end > (7 if weekday else high) or start > end:
+                raise ValueError(f"Cron field out of range: '{field}'")
+            values.update(v % 7 if weekday else v for v in range(start, end + 1, step))
+        return frozenset(values)
+
+    def _day_matches(self, day):
+        dom = day.day in self.days
+        dow = (day.weekday() + 1) % 7 in self.weekdays
+        if self.dom_any or self.dow_any:
+            return dom and dow
+        return dom or dow
+
+    def next_after(self, moment):
+        """First wall-clock datetime strictly after `moment` (same tzinfo) that matches"""
+        candidate = moment.replace(second=0, microsecond=0) + datetime.timedelta(minutes=1)
+        for _ in range(366 * 5):
+            if candidate.month not in self.months or not self._day_matches(candidate):
+                candidate = (candidate + datetime.timedelta(days=1)).replace(hour=0, minute=0)
+                continue
+            hour = next((h for h in sorted(self.hours) if h >= candidate.hour), None)
+            if hour is None:
+                candidate = (candidate + datetime.timedelta(days=1)).replace(hour=0, minute=0)
+                continue
+            if hour != candidate.hour:
+                candidate = candidate.replace(hour=hour, minute=0)
+            minute = next((m for m in sorted(self.minutes) if m >= candidate.minute), None)
+            if minute is None:
+                candidate = candidate.replace(minute=0) + datetime.timedelta(hours=1)
+                continue
+            return candidate.replace(minute=minute)
+        raise ValueError(f"Cron expression never matches: '{self.expr}'")
+
+class SystemClock:
+    """Wall clock; waiting is done on the scheduler's condition variable"""
+
+    def attach(self, cond):
+        pass
+
+    def now(self):
+        return time.time()
+
+    def wait(self, cond, timeout):
+        cond.wait(timeout)
+
+class ManualClock:
+    """Clock that only moves when told to, for driving the scheduler in tests"""
+
+    def __init__(self, start=0.0):
+        self.current = start
+        self.cond = None
+
+    def attach(self, cond):
+        self.cond = cond
+
+    def now(self):
+        return self.current
+
+    def wait(self, cond, timeout):
+        # Time only moves in advance(), which wakes the scheduler
+        cond.wait()
+
+    def advance(self, seconds):
+        if self.cond is None:
+            self.current += seconds
+            return
+        with self.cond:
+            self.current += seconds
+            self.cond.notify_all()
+
+class Job:
+    """A named callable with a cron schedule in a given time zone"""
+
+    def __init__(self, name, cron, func, timezone="America/Caracas", catchup=6 * 3600):
+        self.name = name
+        self.cron = CronExpr(cron) if isinstance(cron, str) else cron
+        self.func = func
+        self.tz = ZoneInfo(timezone)
+        self.timezone = timezone
+        self.catchup = catchup
+        self.next_run = None
+        self.last_run = None
+
+    def next_after(self, ts):
+        moment = datetime.datetime.fromtimestamp(ts, self.tz)
+        return self.cron.next_after(moment).timestamp()
+
+class OneShot:
+    """A callable that runs once at a given timestamp (not persisted)"""
+
+    def __init__(self, name, when, func):
+        self.name = name
+        self.func = func
+        self.next_run = when
+        self.last_run = None
+        self.cron = None
+        self.timezone = None
+        self.tz = None
+
+class JobScheduler:
+    """Timer-heap scheduler: sleeps until the next due job, persists last-run markers
+
+    The timer thread only dispatches: job bodies run on `workers` worker
+    threads, so a long broadcast doesn't hold back the other zones' jobs or
+    the poller and status timers. A cron job that is still running when it
+    comes due again skips that run.
+    """
+
+    def __init__(self, state_file=None, clock=None, workers=4):
+        self.state_file = state_file or os.getenv("SCHEDULER_STATE", "scheduler_state.json")
+        self.clock = clock or SystemClock()
+        self.jobs = {}
+        self.heap = []
+        self.seq = 0
+        self.cond = threading.Condition()
+        self.clock.attach(self.cond)
+        self.running = False
+        self.thread = None
+        self.workers = max(1, workers)
+        self.work = queue.Queue()
+        self.worker_threads = []
+        self.active = set()
+        self.state = self._load_state()
+        self.lag = {}
+
+    def _load_state(self):
+        try:
+            if os.path.exists(self.state_file):
+                with open(self.state_file, 'r', encoding='utf-8') as f:
+                    return json.load(f)
+        except Exception as e:
+            logger.error(f"Error loading scheduler state: {e}")
+        return {}
+
+    def _save_state(self):
+        try:
+            tmp = self.state_file + ".tmp"
+            with open(tmp, 'w', encoding='utf-8') as f:
+                json.dump(self.state, f)
+            os.replace(tmp, self.state_file)
+        except Exception as e:
+            logger.error(f"Error saving scheduler state: {e}")
+
+    def _push(self, job):
+        self.seq += 1
+        heapq.heappush(self.heap, (job.next_run, self.seq, job.name))
+
+    def add_job(self, job):
+        """Schedule a job; a run missed while we were down is caught up right away"""
+        with self.cond:
+            now = self.clock.now()
+            job.last_run = self.state.get(job.name)
+            if job.last_run is not None:
+                missed = job.next_after(job.last_run)
+                if missed <= now and now - missed <= job.catchup:
+                    logger.info(f"Job {job.name} missed its run, catching up")
+                    job.next_run = now
+                else:
+                    job.next_run = job.next_after(now)
+            else:
+                job.next_run = job.next_after(now)
+            self.jobs[job.name] = job
+            self._push(job)
+            self.cond.notify_all()
+        return job
+
+    def call_at(self, name, when, func):
+        """Run func once at timestamp `when`; replaces a pending timer with the same name"""
+        with self.cond:
+            job = OneShot(name, when, func)
+            self.jobs[name] = job
+            self._push(job)
+            self.cond.notify_all()
+        return job
+
+    def remove_job(self, name):
+        with self.cond:
+            # Heap entries for removed jobs are skipped when they surface
+            self.jobs.pop(name, None)
+            self.cond.notify_all()
+
+    def run_due(self):
+        """Hand every job whose time has come to the workers; returns how many were dispatched"""
+        dispatched = 0
+        while True:
+            with self.cond:
+                now = self.clock.now()
+                if not self.heap or self.heap[0][0] > now:
+                    return dispatched
+                due, _, name = heapq.heappop(self.heap)
+                job = self.jobs.get(name)
+                if job is None or job.next_run != due:
+                    continue
+                self.lag[name] = now - due
+                LAG_SECONDS.observe(now - due)
+                if job.cron is None:
+                    del self.jobs[name]
+                else:
+                    # Mark before running: a crash mid-run must not resend on restart
+                    job.last_run = due
+                    self.state[name] = due
+                    self._save_state()
+                    job.next_run = job.next_after(max(now, due))
+                    self._push(job)
+                    if name in self.active:
+                        logger.warning(f"Job {name} is still running, skipping this run")
+                        continue
+                self.active.add(name)
+            self.work.put(job)
+            dispatched += 1
+
+    def _worker(self):
+        while True:
+            job = self.work.get()
+            if job is None:
+                break
+            try:
+                job.func()
+            except Exception as e:
+                logger.error(f"Error in job {job.name}: {e}")
+            finally:
+                with self.cond:
+                    self.active.discard(job.name)
+
+    def _loop(self):
+        while self.running:
+            self.run_due()
+            with self.cond:
+                if not self.running:
+                    break
+                timeout = None
+                if self.heap:
+                    timeout = max(0.0, self.heap[0][0] - self.clock.now())
+                if timeout is None or timeout > 0:
+                    self.clock.wait(self.cond, timeout)
+
+    def start(self):
+        if self.running:
+            return
+        self.running = True
+        # Daemon threads rather than an executor: a broadcast cut short at exit
+        # is resumed from its journal, so shutdown shouldn't wait for it
+        self.worker_threads = [
+            threading.Thread(target=self._worker, name=f"job-worker-{index}", daemon=True)
+            for index in range(self.workers)
+        ]
+        for worker in self.worker_threads:
+            worker.start()
+        self.thread = threading.Thread(target=self._loop, name="job-scheduler", daemon=True)
+        self.thread.start()
+        logger.info("Scheduler started")
+
+    def stop(self):
+        with self.cond:
+            self.running = False
+            self.cond.notify_all()
+        for _ in self.worker_threads:
+            self.work.put(None)
+        self.worker_threads = []
+
+    def describe(self):
+        with self.cond:
+            return [
+                {
+                    'name': job.name,
+                    'cron': job.cron.expr if job.cron else None,
+                    'timezone': job.timezone,
+                    'next_run': datetime.datetime.fromtimestamp(job.next_run, job.tz).isoformat() if job.next_run else None,
+                    'last_run': datetime.datetime.fromtimestamp(job.last_run, job.tz).isoformat() if job.last_run else None,
+                    'lag': self.lag.get(job.name)
+                }
+                for job in self.jobs.values()
+            ]
@@ -0,0 +1,205 @@
+import os
+import re
+import time
+import datetime
+import threading
+import logging
+from collections import deque
+from logging.handlers import TimedRotatingFileHandler
+
+LOG_FORMAT = '%(asctime)s - %(name)s - %(levelname)s - %(message)s'
+LOG_FILE = os.getenv("LOG_FILE", "bot.log")
+LOG_MAX_BYTES = int(os.getenv("LOG_MAX_BYTES", str(5 * 1024 * 1024)))
+LOG_BACKUPS = int(os.getenv("LOG_BACKUPS", "5"))
+LOG_ROTATE_WHEN = os.getenv("LOG_ROTATE_WHEN", "midnight")
+LOG_RING_SIZE = int(os.getenv("LOG_RING_SIZE", "2000"))
+
+# "2025-06-19 09:00:01,123 - main - INFO - message"
+LINE_PATTERN = re.compile(r'^(\d{4}-\d\d-\d\d \d\d:\d\d:\d\d),(\d{3}) - (\S+) - ([A-Z]+) - ')
+
+class SizedTimedRotatingFileHandler(TimedRotatingFileHandler):
+    """Rotate at `when` (daily by default) or as soon as the file passes max_bytes"""
+
+    def __init__(self, filename, max_bytes=0, **kwargs):
+        super().__init__(filename, **kwargs)
+        self.max_bytes = max_bytes
+
+    def shouldRollover(self, record):
+        if self.max_bytes > 0 and self.stream is not None:
+            if self.stream.tell() + len(self.format(record)) + 1 >= self.max_bytes:
+                return True
+        return super().shouldRollover(record)
+
+    def rotation_filename(self, default_name):
+        # Several size rollovers in one day: bot.log.2025-06-19, .2025-06-19.1, ...
+        name = super().rotation_filename(default_name)
+        candidate = name
+        index = 1
+        while os.path.exists(candidate):
+            candidate = f"{name}.{index}"
+            index += 1
+        return candidate
+
+class RingBufferHandler(logging.Handler):
+    """Keep the most recent records in memory for the dashboard"""
+
+    def __init__(self, capacity=LOG_RING_SIZE, level=logging.NOTSET):
+        super().__init__(level)
+        self.records = deque(maxlen=capacity)
+        self.version = 0
+
+    def emit(self, record):
+        try:
+            line = self.format(record)
+            with self.lock:
+                self.records.append((record.created, record.levelno, record.name, line))
+                self.version += 1
+        except Exception:
+            self.handleError(record)
+
+    def query(self, limit=50, level=None, logger_name=None, since=None, until=None):
+        """Newest `limit` formatted lines matching the filters, oldest first"""
+        with self.lock:
+            records = list(self.records)
+        matched = []
+        for created, levelno, name, line in reversed(records):
+            if since is not None and created < since:
+                break
+            if _matches(created, levelno, name, level, logger_name, None, until):
+                matched.append(line)
+                if len(matched) >= limit:
+                    break
+        matched.reverse()
+        return matched
+
+def _matches(created, levelno, name, level, logger_name, since, until):
+    if level is not None and levelno < level:
+        return False
+    if logger_name and name != logger_name and not name.startswith(logger_name + "."):
+        return False
+    if since is not None and created < since:
+        return False
+    if until is not None and created >= until:
+        return False
+    return True
+
+def tail_lines(path, count=50, block_size=8192):
+    """Last `count` lines of a file, reading backwards from the end"""
+    with open(path, 'rb') as f:
+        f.seek(0, os.SEEK_END)
+        position = f.tell()
+        chunks = []
+        newlines = 0
+        # One extra newline: the file normally ends with one
+        while position > 0 and newlines <= count:
+            size = min(block_size, position)
+            position -= size
+            f.seek(position)
+            chunk = f.read(size)
+            chunks.append(chunk)
+            newlines += chunk.count(b"\n")
+    data = b"".join(reversed(chunks))
+    lines = data.decode('utf-8', errors='replace').splitlines()
+    return lines[-count:] if count else []
+
+class LogFollower:
+    """Return the lines appended to a log file since the last call, across rotations"""
+
+    def __init__(self, path):
+        self.path = path
+        self.inode = None
+        self.offset = 0
+        self.partial = b""
+        try:
+            info = os.stat(path)
+            self.inode, self.offset = info.st_ino, info.st_size
+        except FileNotFoundError:
+            pass
+
+    def read_new(self, max_bytes=1024 * 1024):
+        try:
+            info = os.stat(self.path)
+        except FileNotFoundError:
+            return []
+        if info.st_ino != self.inode or info.st_size < self.offset:
+            # Rotated or truncated: the current file is all new
+            self.inode, self.offset, self.partial = info.st_ino, 0, b""
+        if info.st_size == self.offset:
+            return []
+        with open(self.path, 'rb') as f:
+            f.seek(max(self.offset, info.st_size - max_bytes))
+            data = self.partial + f.read(info.st_size - f.tell())
+        self.offset = info.st_size
+        lines = data.split(b"\n")
+        # Keep a half-written last line for the next call
+        self.partial = lines.pop()
+        return [line.decode('utf-8', errors='replace') for line in lines if line]
+
+def parse_line(line):
+    """(created, levelno, logger name) of a formatted log line, or None for continuation lines"""
+    match = LINE_PATTERN.match(line)
+    if not match:
+        return None
+    moment = datetime.datetime.strptime(match.group(1), "%Y-%m-%d %H:%M:%S")
+    created = time.mktime(moment.timetuple()) + int(match.group(2)) / 1000
+    return created, logging.getLevelName(match.group(4)), match.group(3)
+
+def query_file(path, limit=50, level=None, logger_name=None, since=None, until=None, scan=5000):
+    """Filtered tail of a log file, looking at no more than its last `scan` lines"""
+    if not os.path.exists(path):
+        return []
+    if level is None and not logger_name and since is None and until is None:
+        return tail_lines(path, limit)
+    matched = []
+    for line in reversed(tail_lines(path, scan)):
+        parsed = parse_line(line)
+        if parsed is None:
+            continue
+        created, levelno, name = parsed
+        if since is not None and created < since:
+            break
+        if isinstance(levelno, int) and _matches(created, levelno, name, level, logger_name, None, until):
+            matched.append(line)
+            if len(matched) >= limit:
+                break
+    matched.reverse()
+    return matched
+
+def parse_level(value):
+    """'warning' -> logging.WARNING; None for empty or unknown names"""
+    if not value:
+        return None
+    level = logging.getLevelName(value.upper())
+    return level if isinstance(level, int) else None
+
+def parse_time(value):
+    """Epoch seconds or an ISO date/datetime -> epoch seconds"""
+    if not value:
+        return None
+    try:
+        return float(value)
+    except ValueError:
+        return datetime.datetime.fromisoformat(value).timestamp()
+
+ring_handler = RingBufferHandler()
+_configured = False
+_setup_lock = threading.Lock()
+
+def setup_logging(level=logging.INFO):
+    """Console, rotating bot.log and the in-memory ring; safe to call more than once"""
+    global _configured
+    with _setup_lock:
+        if _configured:
+            return ring_handler
+        file_handler = SizedTimedRotatingFileHandler(
+            LOG_FILE, max_bytes=LOG_MAX_BYTES, when=LOG_ROTATE_WHEN,
+            backupCount=LOG_BACKUPS, encoding='utf-8'
+        )
+        # basicConfig gives every handler the LOG_FORMAT formatter
+        logging.basicConfig(
+            level=level,
+            format=LOG_FORMAT,
+            handlers=[file_handler, logging.StreamHandler(), ring_handler]
+        )
+        _configured = True
+        return ring_handler
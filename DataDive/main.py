@@ -1,5 +1,4 @@
 import os
-import requests
 import telebot
 from telebot import types
 import datetime
@@ -7,20 +6,37 @@ import json
 import threading
 import time
 import logging
-from rate_storage import RateStorage
+import functools
+from zoneinfo import ZoneInfo
+from rate_storage import shared_storage
 from clp_scraper import CLPTodayScraper
+from rate_fetcher import RateFetcher
+from source_registry import SourceRegistry
+from rate_sources import PyDolarVeRate, PyDolarVeP2P, CLPTodayAdapter
+from rate_cache import SnapshotCache
+from http_client import HttpClient
+from webhook import WebhookIngest
+from subscribers import SubscriberDB, SubscriberRegistry, BroadcastJournal, DEFAULT_TIMEZONE
+from job_scheduler import JobScheduler, Job
+from broadcast import Broadcaster
+from rate_poller import RatePoller
+from message_render import MessageCache, RateSnapshot
+from rate_model import (RateBook, CrossRates, aggregate_book, estimate_missing, premiums,
+                        USD, EUR, COP, OFFICIAL, P2P, TRANSFER, ESTIMATE)
+from event_hub import hub, HubLogHandler
+from log_access import setup_logging, LOG_FORMAT
+from metrics import registry as metrics_registry, histogram, timed, ratio
+from tracing import tracer, trace, span
 
 # ==========================
 # Configuración de logs
 # ==========================
-logging.basicConfig(
-    level=logging.INFO,
-    format='%(asctime)s - %(name)s - %(levelname)s - %(message)s',
-    handlers=[
-        logging.FileHandler('bot.log'),
-        logging.StreamHandler()
-    ]
-)
+# bot.log rota por tamaño y a medianoche; las últimas líneas quedan en memoria
+setup_logging()
+# Las líneas nuevas también se envían al panel por /api/stream
+hub_handler = HubLogHandler(hub)
+hub_handler.setFormatter(logging.Formatter(LOG_FORMAT))
+logging.getLogger().addHandler(hub_handler)
 logger = logging.getLogger(__name__)
 
 # ==========================
@@ -42,8 +58,134 @@ except ValueError:
     logger.error(f"Invalid CHAT_ID format: '{CHAT_ID_STR}'. CHAT_ID should be numeric.")
     exit(1)
 
-bot = telebot.TeleBot(TOKEN)
-storage = RateStorage()
+PYDOLARVE_URL = os.getenv("PYDOLARVE_URL", "https://pydolarve.org").rstrip('/')
+SOURCE_TIMEOUT = float(os.getenv("SOURCE_TIMEOUT", "10"))
+FETCH_DEADLINE = float(os.getenv("FETCH_DEADLINE", "12"))
+FORCE_REFRESH_INTERVAL = float(os.getenv("FORCE_REFRESH_INTERVAL", "30"))
+# Salud de las fuentes: tras SOURCE_DOWN_AFTER fallos seguidos una fuente se
+# salta durante SOURCE_COOLDOWN s (el doble en cada prueba fallida, hasta
+# SOURCE_MAX_COOLDOWN); con latencia media sobre SOURCE_SLOW_AFTER s se degrada
+SOURCE_DOWN_AFTER = int(os.getenv("SOURCE_DOWN_AFTER", "3"))
+SOURCE_COOLDOWN = float(os.getenv("SOURCE_COOLDOWN", "30"))
+SOURCE_MAX_COOLDOWN = float(os.getenv("SOURCE_MAX_COOLDOWN", "600"))
+SOURCE_SLOW_AFTER = float(os.getenv("SOURCE_SLOW_AFTER", "3"))
+
+# Segundos que cada fuente se considera fresca en caché
+CACHE_TTLS = {
+    'bcv': 300,
+    'eur': 300,
+    'p2p': 60,
+    'clp': 120
+}
+
+SOURCE_NAMES = {
+    'bcv': 'BCV',
+    'p2p': 'P2P',
+    'eur': 'Euro BCV',
+    'clp': 'CLP Today'
+}
+
+# El peso colombiano de PyDolarVe es opcional: solo entra en los cruces (USD/COP, EUR/COP)
+PYDOLARVE_COP = os.getenv("PYDOLARVE_COP", "0") == "1"
+if PYDOLARVE_COP:
+    CACHE_TTLS['cop'] = 300
+    SOURCE_NAMES['cop'] = 'Peso COP'
+
+# Pesos del promedio por fuente, p. ej. "p2p_binance=3,bcv=1" (1 por defecto)
+def parse_weights(raw):
+    """Pesos de RATE_WEIGHTS; las entradas mal escritas se avisan y se ignoran"""
+    weights = {}
+    for item in raw.split(','):
+        if not item.strip():
+            continue
+        key, _, value = item.partition('=')
+        try:
+            weight = float(value)
+            if not key.strip() or weight < 0 or weight != weight:
+                raise ValueError(value)
+            weights[key.strip()] = weight
+        except ValueError:
+            logger.error(f"RATE_WEIGHTS: se ignora la entrada '{item.strip()}'")
+    return weights
+
+RATE_WEIGHTS = parse_weights(os.getenv("RATE_WEIGHTS", ""))
+
+# Fuentes que se estiman con su última relación con el BCV cuando no responden
+ESTIMATED_SOURCES = {
+    'zelle': ("💳 Zelle", USD),
+    'paypal': ("💙 PayPal", USD),
+    'eur_bcv': ("Euro BCV", EUR)
+}
+
+# Relación con el BCV que se supone mientras no haya una real guardada (los fijos de antes)
+DEFAULT_PREMIUMS = {
+    'zelle': 1.08,
+    'paypal': 1.15,
+    'eur_bcv': 1.1
+}
+
+EURO_KINDS = {'eur_clp': 'clp', 'eur_bcv': 'bcv'}
+
+def alert_name(source):
+    """Nombre legible de una tasa guardada (bcv, eur_bcv, p2p_binance...)"""
+    if source == 'eur_bcv':
+        return 'Euro BCV'
+    if source.startswith('p2p_'):
+        return f"P2P {source[4:].capitalize()}"
+    return SOURCE_NAMES.get(source, source.upper())
+
+# En modo webhook los manejadores corren dentro de los workers de WebhookIngest
+BOT_MODE = os.getenv("BOT_MODE", "polling")
+WEBHOOK_URL = os.getenv("WEBHOOK_URL", "").rstrip('/')
+WEBHOOK_SECRET = os.getenv("WEBHOOK_SECRET", "")
+WEBHOOK_WORKERS = int(os.getenv("WEBHOOK_WORKERS", "4"))
+WEBHOOK_QUEUE_SIZE = int(os.getenv("WEBHOOK_QUEUE_SIZE", "1000"))
+WEBHOOK_PATH = "/telegram/webhook"
+# minuto hora día-del-mes mes día-de-la-semana, en la zona horaria de cada suscriptor
+DAILY_UPDATE_CRON = os.getenv("DAILY_UPDATE_CRON", "0 9 * * 1-5")
+# Hilos que ejecutan los trabajos; el hilo del planificador solo los despacha
+SCHEDULER_WORKERS = int(os.getenv("SCHEDULER_WORKERS", "4"))
+BROADCAST_WORKERS = int(os.getenv("BROADCAST_WORKERS", "8"))
+# Telegram permite ~30 mensajes/s en total y ~1/s por chat
+BROADCAST_RATE = float(os.getenv("BROADCAST_RATE", "25"))
+# Sondeo continuo: alerta cuando una tasa se mueve más de ALERT_THRESHOLD % en el día
+RATE_POLLER = os.getenv("RATE_POLLER", "1") == "1"
+ALERT_THRESHOLD = float(os.getenv("ALERT_THRESHOLD", "2"))
+POLL_MIN_INTERVAL = float(os.getenv("POLL_MIN_INTERVAL", "60"))
+POLL_MAX_INTERVAL = float(os.getenv("POLL_MAX_INTERVAL", "1800"))
+# "builtin" sirve el panel en un hilo de este proceso; "waitress" o "gunicorn"
+# en un proceso aparte que lee el estado que el bot exporta al almacenamiento
+WEB_SERVER = os.getenv("WEB_SERVER", "builtin")
+STATUS_EXPORT_INTERVAL = float(os.getenv("STATUS_EXPORT_INTERVAL", "30"))
+
+# Latencias para /metrics (METRICS=0 las desactiva sin costo)
+HANDLER_SECONDS = histogram("dollarbot_handler_seconds", "Time to handle a Telegram update", ("handler",))
+SEND_SECONDS = histogram("dollarbot_send_message_seconds", "Time of each Telegram send_message call")
+
+class InstrumentedTeleBot(telebot.TeleBot):
+    """TeleBot que mide cada send_message (también las respuestas de reply_to y los envíos masivos)"""
+
+    def send_message(self, *args, **kwargs):
+        with SEND_SECONDS.time():
+            return super().send_message(*args, **kwargs)
+
+# threaded=False: con webhook cada actualización se atiende en el worker de su
+# chat (orden por chat, cola acotada y 503 cuando se llena) y no en el pool de telebot
+bot = InstrumentedTeleBot(TOKEN, threaded=BOT_MODE != "webhook")
+storage = shared_storage()
+subscriber_db = SubscriberDB()
+subscribers = SubscriberRegistry(subscriber_db)
+broadcaster = Broadcaster(
+    lambda chat_id, text, parse_mode: bot.send_message(chat_id, text, parse_mode=parse_mode),
+    subscribers,
+    BroadcastJournal(subscriber_db),
+    workers=BROADCAST_WORKERS,
+    global_rate=BROADCAST_RATE
+)
+
+# El chat configurado sigue recibiendo las actualizaciones como antes
+if not subscribers.is_known(CHAT_ID):
+    subscribers.subscribe(CHAT_ID)
 
 # ==========================
 # Clase principal del bot
@@ -53,150 +195,360 @@ class DollarBot:
         self.last_update = None
         self.last_rates = None
         self.scheduler_running = False
-        self.clp_scraper = CLPTodayScraper()
-
-    def obtener_tasas(self):
-        """Obtiene las tasas de cambio"""
-        try:
-            bcv_response = requests.get("https://pydolarve.org/api/v2/tipo-cambio?currency=usd&rounded_price=true", timeout=10)
-            bcv_response.raise_for_status()
-            bcv_data = bcv_response.json()
-            bcv = bcv_data.get('price', 0)
-
-            if bcv <= 0:
-                return "❌ Error al obtener la tasa BCV."
-
-            now = datetime.datetime.now()
-            mensaje = f"💱 *Tasas de Cambio en Venezuela* ({now.strftime('%d/%m/%Y')}):\n\n🏛️ BCV Oficial: {bcv} Bs/USD"
-
-            clp_rates = self.clp_scraper.get_specific_rates()
-            promedio = bcv
-            tasas_adicionales = []
-
-            # Tasas P2P
+        self.scheduler = JobScheduler(workers=SCHEDULER_WORKERS)
+        self.messages = MessageCache()
+        self.stored_key = None
+        self.published_version = None
+        self.exported_traces = 0
+        self.premiums = self._load_premiums()
+        self.rates_key = None
+        self.rates = None
+        self.http = HttpClient()
+        self.clp_scraper = CLPTodayScraper(http_client=self.http, reference=lambda: storage.get_previous_rate('bcv'))
+        self.cache = SnapshotCache(ttls=CACHE_TTLS, force_interval=FORCE_REFRESH_INTERVAL)
+        self.sources = self._build_sources()
+        self.fetcher = RateFetcher(deadline=FETCH_DEADLINE)
+        for feed in SOURCE_NAMES:
+            self.fetcher.register(feed, self.cache.wrap(feed, self.sources.loader(feed)), timeout=SOURCE_TIMEOUT)
+        self.poller = RatePoller(
+            self.scheduler,
+            baseline=storage.get_baseline,
+            on_alert=self.send_alert,
+            on_sample=lambda name, values: storage.save_rates(values),
+            threshold=ALERT_THRESHOLD,
+            min_interval=POLL_MIN_INTERVAL,
+            max_interval=POLL_MAX_INTERVAL
+        )
+        self.poller.add_feed('bcv', self._sample_bcv)
+        self.poller.add_feed('eur', self._sample_eur)
+        self.poller.add_feed('p2p', self._sample_p2p, interval=120)
+        metrics_registry.add_collector(self.collect_metrics)
+
+    # ==========================
+    # Fuentes de datos
+    # ==========================
+    def _build_sources(self):
+        """Proveedores de cada fuente; para añadir uno basta registrar otro adaptador con la misma fuente"""
+        sources = SourceRegistry(
+            down_after=SOURCE_DOWN_AFTER,
+            cooldown=SOURCE_COOLDOWN,
+            max_cooldown=SOURCE_MAX_COOLDOWN,
+            slow_after=SOURCE_SLOW_AFTER
+        )
+        sources.register(PyDolarVeRate('pydolarve_bcv', 'bcv', self.http, PYDOLARVE_URL, 'usd',
+                                       label="PyDolarVe BCV", timeout=SOURCE_TIMEOUT))
+        sources.register(PyDolarVeP2P('pydolarve_p2p', 'p2p', self.http, PYDOLARVE_URL,
+                                      label="PyDolarVe P2P", timeout=SOURCE_TIMEOUT))
+        sources.register(PyDolarVeRate('pydolarve_eur', 'eur', self.http, PYDOLARVE_URL, 'eur',
+                                       label="PyDolarVe Euro", timeout=SOURCE_TIMEOUT))
+        sources.register(CLPTodayAdapter('clp_today', 'clp', self.clp_scraper,
+                                         label="CLP Today", timeout=SOURCE_TIMEOUT))
+        if PYDOLARVE_COP:
+            sources.register(PyDolarVeRate('pydolarve_cop', 'cop', self.http, PYDOLARVE_URL, 'cop',
+                                           label="PyDolarVe COP", timeout=SOURCE_TIMEOUT))
+        return sources
+
+    # Muestras del sondeo: también refrescan la caché de /tasas
+    def _sample_bcv(self):
+        bcv = self.sources.fetch('bcv', SOURCE_TIMEOUT)
+        self.cache.store('bcv', bcv)
+        return {'bcv': bcv}
+
+    def _sample_eur(self):
+        eur = self.sources.fetch('eur', SOURCE_TIMEOUT)
+        self.cache.store('eur', eur)
+        return {'eur_bcv': eur}
+
+    def _sample_p2p(self):
+        p2p_rates = self.sources.fetch('p2p', SOURCE_TIMEOUT)
+        self.cache.store('p2p', p2p_rates)
+        return {f"p2p_{key}": precio for key, _, precio in p2p_rates}
+
+    def send_alert(self, source, base, rate, cambio):
+        """Avisa a todos los suscriptores en cuanto una tasa cruza el umbral del día"""
+        signo = "📈 Subió" if cambio > 0 else "📉 Bajó"
+        mensaje = (f"⚠️ *Alerta {alert_name(source)}*: {signo} {abs(cambio):.2f}% hoy\n"
+                   f"{base:.2f} → {rate:.2f} Bs")
+        logger.info(f"Alerta {source}: {cambio:+.2f}%")
+        # El envío puede tardar; no bloquea el hilo del planificador ni espera a la actualización diaria
+        threading.Thread(target=broadcaster.broadcast, args=(mensaje, "Markdown"), kwargs={"urgent": True},
+                         daemon=True).start()
+
+    def obtener_tasas(self, force=False, lang="es", fmt="Markdown"):
+        """Obtiene las tasas de cambio (desde caché salvo que se fuerce la actualización)"""
+        # Si tarda más de TRACE_SLOW_MS, el árbol de etapas queda en /api/traces
+        with trace("obtener_tasas", force=force, lang=lang) as raiz:
             try:
-                p2p_response = requests.get("https://pydolarve.org/api/v2/market-p2p?currency=usd&rounded_price=true", timeout=10)
-                p2p_response.raise_for_status()
-                p2p_data = p2p_response.json()
-
-                if 'platforms' in p2p_data:
-                    platforms = p2p_data['platforms']
-                    platform_display = {
-                        'binance': '🔸 Binance',
-                        'bybit': '🔶 Bybit',
-                        'okx': '⚫ OKX',
-                        'yadio': '🔵 Yadio'
-                    }
-                    for key, data in platforms.items():
-                        if isinstance(data, dict) and 'title' in data and 'price' in data:
-                            display_name = platform_display.get(key.lower(), data['title'])
-                            tasas_adicionales.append((display_name, data['price']))
+                if force and not self.cache.force_refresh():
+                    logger.info("Actualización forzada ignorada: se hizo una hace menos de "
+                                f"{FORCE_REFRESH_INTERVAL:.0f}s")
+                with span("fetch"):
+                    report = self.fetcher.fetch_all()
+                raiz.set(failed=sorted(report.failed))
+                return self.formatear_tasas(report, lang, fmt)
             except Exception as e:
-                logger.warning(f"No se pudieron obtener tasas P2P: {e}")
-
-            # Tasas Zelle y PayPal
-            if bcv > 0:
-                if clp_rates and clp_rates.get('usd'):
-                    usd_rates = clp_rates['usd']
-                    zelle_rate = usd_rates.get('zelle', bcv * 1.08)
-                    paypal_rate = usd_rates.get('paypal', bcv * 1.15)
-                else:
-                    zelle_rate = bcv * 1.08
-                    paypal_rate = bcv * 1.15
-
-                tasas_adicionales.insert(0, ("💳 Zelle", zelle_rate))
-                tasas_adicionales.insert(1, ("💙 PayPal", paypal_rate))
-
-            if tasas_adicionales:
-                tasas_adicionales.sort(key=lambda x: x[1])
-                for nombre, precio in tasas_adicionales:
-                    mensaje += f"\n{nombre}: {precio:.2f} Bs/USD"
-
-                all_prices = [bcv] + [precio for _, precio in tasas_adicionales]
-                promedio = sum(all_prices) / len(all_prices)
-                mensaje += f"\n\n📊 Promedio USD: {promedio:.2f} Bs"
-
-            # Tasas Euro
-            euro_rates = []
-            if clp_rates and clp_rates.get('eur') and 'rate' in clp_rates['eur']:
-                euro_rates.append(("🇪🇺 Euro (CLP)", clp_rates['eur']['rate']))
+                raiz.set(error=str(e))
+                return f"❌ Error: {str(e)}"
+
+    def _load_premiums(self):
+        """Última relación guardada de Zelle, PayPal y Euro BCV con el BCV, o la fija de antes"""
+        ratios = dict(DEFAULT_PREMIUMS)
+        bcv = storage.get_previous_rate('bcv')
+        if not bcv:
+            return ratios
+        for source in ESTIMATED_SOURCES:
+            rate = storage.get_previous_rate(source)
+            if rate:
+                ratios[source] = rate / bcv
+        return ratios
+
+    def build_book(self, report):
+        """Todas las cotizaciones del reporte en un RateBook; None si no hay BCV"""
+        bcv = report.get('bcv', 0)
+        if bcv <= 0:
+            return None
+        clp_rates = report.get('clp') or {}
+        usd_clp = clp_rates.get('usd') or {}
+        eur_clp = clp_rates.get('eur') or {}
+
+        book = RateBook()
+        book.add('bcv', 'BCV', USD, OFFICIAL, bcv, weight=RATE_WEIGHTS.get('bcv', 1.0))
+        book.add('zelle', "💳 Zelle", USD, TRANSFER, usd_clp.get('zelle'), weight=RATE_WEIGHTS.get('zelle', 1.0))
+        book.add('paypal', "💙 PayPal", USD, TRANSFER, usd_clp.get('paypal'), weight=RATE_WEIGHTS.get('paypal', 1.0))
+        for key, nombre, precio in report.get('p2p', []):
+            source = f"p2p_{key}"
+            book.add(source, nombre, USD, P2P, precio, weight=RATE_WEIGHTS.get(source, 1.0))
+        book.add('eur_clp', "Euro (CLP)", EUR, P2P, eur_clp.get('rate'))
+        book.add('eur_bcv', "Euro BCV", EUR, OFFICIAL, report.get('eur', 0))
+        book.add('cop_bcv', "Peso COP", COP, OFFICIAL, report.get('cop', 0))
+
+        # Las relaciones reales de esta consulta sirven para estimar la próxima que falle
+        self.premiums.update({
+            source: ratio for source, ratio in premiums(book, 'bcv').items() if source in ESTIMATED_SOURCES
+        })
+        expected = dict(ESTIMATED_SOURCES)
+        if book.mask(EUR).any():
+            # Con alguna tasa real del euro no hace falta estimarla
+            expected.pop('eur_bcv')
+        estimate_missing(book, self.premiums, 'bcv', expected)
+        return book
+
+    def compute_rates(self, report):
+        """Tasas del mensaje, promedio y cruces de un reporte; se recalculan solo si el reporte cambió"""
+        clp_rates = report.get('clp') or {}
+        key = (
+            report.get('bcv', 0),
+            tuple(report.get('p2p') or ()),
+            tuple(sorted((clp_rates.get('usd') or {}).items())),
+            (clp_rates.get('eur') or {}).get('rate'),
+            report.get('eur', 0),
+            report.get('cop', 0)
+        )
+        if key == self.rates_key:
+            return self.rates
+        book = self.build_book(report)
+        rates = None
+        if book is not None:
+            usd = book.quotes(USD, (P2P, TRANSFER, ESTIMATE))
+            # Promedio ponderado del BCV y las tasas reales, sin las que se alejan demasiado de la mediana
+            resumen = aggregate_book(book, USD)
+            # Mediana, media recortada y brecha entre plataformas, sin el BCV
+            mercado = aggregate_book(book, USD, (P2P, TRANSFER))
+            if resumen['rejected']:
+                logger.info(f"Tasas descartadas del promedio: {', '.join(resumen['rejected'])}")
+            rates = {
+                'bcv': book.price('bcv'),
+                'usd': tuple(sorted(
+                    ((q.label + (" (est.)" if q.kind == ESTIMATE else ""), q.price) for q in usd),
+                    key=lambda x: x[1]
+                )),
+                'promedio': resumen['weighted'],
+                'mercado': mercado,
+                'euro': tuple(
+                    ('est' if q.kind == ESTIMATE else EURO_KINDS[q.source], q.price)
+                    for q in book.quotes(EUR)
+                ),
+                'p2p': {q.label: q.price for q in book.quotes(USD, (P2P,))},
+                'cross': CrossRates.from_book(book).to_dict(),
+                'to_store': book.market()
+            }
+        self.rates_key, self.rates = key, rates
+        return rates
+
+    def build_snapshot(self, report):
+        """Calcula las tasas del mensaje y las guarda si cambiaron; None si no hay BCV"""
+        with span("compute_rates"):
+            rates = self.compute_rates(report)
+        if rates is None:
+            return None
+        bcv = rates['bcv']
+        to_store = rates['to_store']
+
+        # Se compara con el cierre del día anterior, no con la última consulta
+        _, cambio = self.poller.daily_change('bcv', bcv)
+
+        # Con la caché, la mayoría de las consultas repiten los mismos datos
+        store_key = tuple(sorted(to_store.items()))
+        if store_key != self.stored_key:
+            with span("storage.save", rates=len(to_store)):
+                storage.save_rates(to_store)
+            self.stored_key = store_key
 
-            try:
-                eur_response = requests.get("https://pydolarve.org/api/v2/tipo-cambio?currency=eur&rounded_price=true", timeout=10)
-                eur_response.raise_for_status()
-                eur_data = eur_response.json()
-                eur_bcv = eur_data.get('price', 0)
-                if eur_bcv > 0:
-                    euro_rates.append(("🏛️ Euro BCV", eur_bcv))
-            except:
-                pass
-
-            if not euro_rates and bcv > 0:
-                euro_rates.append(("🇪🇺 Euro (Est.)", bcv * 1.1))
-
-            if euro_rates:
-                mensaje += "\n\n💶 *Tasas del Euro*:"
-                for nombre, precio in euro_rates:
-                    mensaje += f"\n{nombre}: {precio:.2f} Bs/EUR"
-
-            rate_to_store = bcv
-            anterior = storage.get_previous_rate()
-            if anterior > 0:
-                cambio = abs(rate_to_store - anterior) / anterior * 100
-                if cambio >= 2:
-                    signo = "📈 Subió" if rate_to_store > anterior else "📉 Bajó"
-                    mensaje += f"\n\n⚠️ {signo} más de 2% respecto al día anterior."
-
-            storage.save_rate(rate_to_store)
-            mensaje += f"\n\n🕐 Actualizado: {now.strftime('%H:%M')}"
-            mensaje += f"\n📡 Fuentes: PyDolarVe, CLP Today"
-
-            self.last_update = now
-            self.last_rates = {'bcv': bcv, 'promedio': promedio}
-            return mensaje
+        now = datetime.datetime.now()
+        self.last_update = now
+        self.last_rates = {
+            'bcv': bcv,
+            'promedio': rates['promedio'],
+            'p2p': rates['p2p'],
+            'market': rates['mercado'],
+            'cross': rates['cross']
+        }
+        snapshot = RateSnapshot(
+            bcv=bcv,
+            usd=rates['usd'],
+            average=rates['promedio'],
+            euro=rates['euro'],
+            change=cambio if abs(cambio) >= ALERT_THRESHOLD else None,
+            failed=tuple(SOURCE_NAMES.get(name, name) for name in sorted(report.failed)),
+            taken_at=now
+        )
+        # El panel muestra la hora de la última consulta: se publica también al cambiar el minuto
+        published = (snapshot.version, now.strftime("%Y%m%d%H%M"))
+        if published != self.published_version:
+            self.published_version = published
+            with span("publish"):
+                hub.publish('rates', {
+                    'last_update': now.isoformat(),
+                    'last_rates': self.last_rates,
+                    'stats': storage.get_stats()
+                })
+                self.publish_status()
+        return snapshot
+
+    def formatear_tasas(self, report, lang="es", fmt="Markdown"):
+        """Devuelve el mensaje ya renderizado para el snapshot de este reporte"""
+        try:
+            with span("snapshot"):
+                snapshot = self.build_snapshot(report)
+            if snapshot is None:
+                return "❌ Error al obtener la tasa BCV."
+            with span("render"):
+                return self.messages.get(snapshot, lang, fmt)
         except Exception as e:
             return f"❌ Error: {str(e)}"
 
-    def send_daily_update(self):
+    def send_daily_update(self, timezone=None):
         try:
+            # Se arma el mensaje una sola vez y se envía a todos los suscriptores
             mensaje = self.obtener_tasas()
-            bot.send_message(CHAT_ID, mensaje)
+            broadcaster.broadcast(mensaje, parse_mode="Markdown", chat_ids=subscribers.active_chat_ids(timezone))
         except Exception as e:
             logger.error(f"Error al enviar actualización: {e}")
 
-    def should_send_update(self):
-        now = datetime.datetime.now()
-        return now.weekday() < 5 and now.hour == 9 and now.minute < 5
+    def sync_jobs(self):
+        """Un trabajo diario por cada zona horaria con suscriptores"""
+        zonas = set(subscribers.timezones()) | {DEFAULT_TIMEZONE}
+        for zona in zonas:
+            name = f"daily-update:{zona}"
+            if name not in self.scheduler.jobs:
+                self.scheduler.add_job(Job(name, DAILY_UPDATE_CRON, lambda zona=zona: self.send_daily_update(zona), timezone=zona))
 
     def start_scheduler(self):
         if self.scheduler_running:
             return
         self.scheduler_running = True
-
-        def scheduler_loop():
-            last_check_hour = -1
-            while self.scheduler_running:
-                try:
-                    now = datetime.datetime.now()
-                    if (now.hour != last_check_hour and now.weekday() < 5 and now.hour == 9 and now.minute < 30):
-                        self.send_daily_update()
-                        last_check_hour = now.hour
-                    time.sleep(60)
-                except Exception as e:
-                    logger.error(f"Error en scheduler: {e}")
-                    time.sleep(60)
-
-        threading.Thread(target=scheduler_loop, daemon=True).start()
+        self.sync_jobs()
+        if RATE_POLLER:
+            self.poller.start()
+        self.scheduler.start()
+        if WEB_SERVER != "builtin":
+            self.export_status()
+        else:
+            self.publish_status()
 
     def stop_scheduler(self):
         self.scheduler_running = False
+        self.poller.stop()
+        self.scheduler.stop()
+        self.publish_status()
+
+    def publish_status(self):
+        try:
+            status = self.get_status()
+            hub.publish('status', status)
+            if WEB_SERVER != "builtin":
+                status['stats'] = storage.get_stats()
+                storage.save_status(status)
+        except Exception as e:
+            logger.error(f"Error publicando estado: {e}")
+
+    def export_status(self):
+        """Refresca el estado exportado para el panel en otro proceso"""
+        self.publish_status()
+        # Métricas y trazas solo con el temporizador: exportarlas en cada publicación
+        # pondría una escritura más en el camino de /tasas que miden
+        storage.save_metrics(metrics_registry.render())
+        if tracer.version != self.exported_traces:
+            storage.save_traces(tracer.recent())
+            self.exported_traces = tracer.version
+        if self.scheduler_running:
+            self.scheduler.call_at('status-export', time.time() + STATUS_EXPORT_INTERVAL, self.export_status)
+
+    def status_version(self):
+        """Cambia cuando cambia algo visible en el panel (tasas, mensaje, planificador)"""
+        return (self.last_update, self.messages.version, self.scheduler_running, storage.version(),
+                self.sources.version)
+
+    def collect_metrics(self):
+        """Aciertos de caché, colas y salud de las fuentes, leídos solo cuando se consulta /metrics"""
+        cache = self.cache.get_stats()
+        messages = self.messages.get_stats()
+        scraper = self.clp_scraper.get_metrics()
+        writes = storage.get_write_stats() or {}
+        sources = self.sources.get_status()
+        lookups = cache['hits'] + cache['stale_hits'] + cache['misses'] + cache['joined']
+        return [
+            ("dollarbot_cache_requests_total", "counter", "Source cache lookups by result", [
+                ({'cache': 'sources', 'result': result}, cache[key])
+                for result, key in (('hit', 'hits'), ('stale', 'stale_hits'), ('miss', 'misses'),
+                                    ('joined', 'joined'), ('error', 'errors'))
+            ]),
+            ("dollarbot_cache_hit_ratio", "gauge", "Share of lookups answered from cache", [
+                ({'cache': 'sources'}, ratio(cache['hits'] + cache['stale_hits'], lookups)),
+                ({'cache': 'messages'}, ratio(messages['hits'], messages['hits'] + messages['renders'])),
+                ({'cache': 'clp_page'}, scraper['hit_rate'] if scraper['fetches'] else None)
+            ]),
+            ("dollarbot_queue_depth", "gauge", "Items waiting in internal queues", [
+                ({'queue': 'write_behind'}, writes.get('pending')),
+                ({'queue': 'scheduler'}, len(self.scheduler.jobs))
+            ]),
+            ("dollarbot_source_up", "gauge", "1 unless the source is being skipped as down", [
+                ({'source': name, 'feed': health['feed']}, 0 if health['state'] == 'down' else 1)
+                for name, health in sources.items()
+            ]),
+            ("dollarbot_source_latency_ewma_seconds", "gauge", "Moving average of each source's latency", [
+                ({'source': name}, health['latency_ms'] / 1000 if health['latency_ms'] is not None else None)
+                for name, health in sources.items()
+            ])
+        ]
 
     def get_status(self):
         return {
             'last_update': self.last_update.isoformat() if self.last_update else None,
             'last_rates': self.last_rates,
             'scheduler_running': self.scheduler_running,
-            'chat_id': CHAT_ID
+            'jobs': self.scheduler.describe(),
+            'poller': self.poller.get_status(),
+            'chat_id': CHAT_ID,
+            'subscribers': subscribers.count(),
+            'cache': self.cache.get_stats(),
+            'http': self.http.get_stats(),
+            'sources': self.sources.get_status(),
+            'scraper': self.clp_scraper.get_metrics(),
+            'messages': self.messages.get_stats(),
+            'writes': storage.get_write_stats(),
+            'traces': tracer.get_stats(),
+            'stream': hub.get_stats()
         }
 
 # Inicializar bot
@@ -205,21 +557,21 @@ dollar_bot = DollarBot()
 # ==========================
 # Teclado principal
 # ==========================
+@functools.lru_cache(maxsize=None)
 def create_main_keyboard():
+    """Teclado principal, serializado a JSON una sola vez"""
     keyboard = types.ReplyKeyboardMarkup(row_width=2, resize_keyboard=True)
     btn_tasas = types.KeyboardButton('💰 Tasas')
     btn_actualizar = types.KeyboardButton('🔄 Actualizar')
     btn_ayuda = types.KeyboardButton('❓ Ayuda')
     keyboard.add(btn_tasas, btn_actualizar)
     keyboard.add(btn_ayuda)
-    return keyboard
+    return keyboard.to_json()
 
 # ==========================
 # Comandos del bot
 # ==========================
-@bot.message_handler(commands=['start'])
-def send_welcome(message):
-    welcome_msg = """
+WELCOME_MSG = """
 ¡Hola! 👋 Soy tu bot del dólar venezolano.
 
 • 💰 Tasas - Ver tasas actuales del dólar
@@ -227,12 +579,10 @@ def send_welcome(message):
 • ❓ Ayuda - Información del bot
 
 Recibirás actualizaciones automáticas cada día hábil a las 9:00 AM.
-    """
-    bot.reply_to(message, welcome_msg, reply_markup=create_main_keyboard())
+Usa /stop para dejar de recibirlas.
+"""
 
-@bot.message_handler(commands=['help'])
-def send_help(message):
-    help_msg = """
+HELP_MSG = """
 🤖 Bot del Dólar Venezolano
 
 • 💰 Tasas - Consultar tasas actuales
@@ -240,37 +590,110 @@ def send_help(message):
 • ❓ Ayuda - Mostrar esta información
 
 El bot envía actualizaciones automáticas:
-• Todos los días hábiles a las 9:00 AM
-• Alertas cuando las tasas cambien más del 2%
+• Todos los días hábiles a las 9:00 AM (usa /start America/Bogota para otra zona horaria)
+• Alertas en cuanto una tasa cambie más del 2% en el día
 
 Fuente de datos: PyDolarVe
-    """
-    bot.reply_to(message, help_msg, reply_markup=create_main_keyboard())
+"""
+
+STOP_MSG = "Listo, ya no recibirás actualizaciones automáticas. Usa /start para volver a suscribirte."
+
+UNKNOWN_MSG = "No entiendo ese comando. Usa los botones de abajo:"
+
+def chat_language(message):
+    """Idioma del mensaje de tasas según el idioma de Telegram del usuario"""
+    user = getattr(message, 'from_user', None)
+    code = (getattr(user, 'language_code', None) or '').lower()
+    return 'en' if code.startswith('en') else 'es'
+
+def subscribe_chat(message):
+    """Suscribe el chat; "/start America/Bogota" elige otra zona horaria"""
+    partes = (message.text or "").split()
+    zona = partes[1] if len(partes) > 1 else None
+    if zona:
+        try:
+            ZoneInfo(zona)
+        except Exception:
+            zona = None
+    subscribers.subscribe(message.chat.id, zona)
+    if zona:
+        dollar_bot.sync_jobs()
+
+@bot.message_handler(commands=['start'])
+@timed(HANDLER_SECONDS, 'start')
+def send_welcome(message):
+    subscribe_chat(message)
+    bot.reply_to(message, WELCOME_MSG, reply_markup=create_main_keyboard())
+
+@bot.message_handler(commands=['stop'])
+@timed(HANDLER_SECONDS, 'stop')
+def send_stop(message):
+    subscribers.unsubscribe(message.chat.id)
+    bot.reply_to(message, STOP_MSG, reply_markup=types.ReplyKeyboardRemove())
+
+@bot.message_handler(commands=['help'])
+@timed(HANDLER_SECONDS, 'help')
+def send_help(message):
+    bot.reply_to(message, HELP_MSG, reply_markup=create_main_keyboard())
 
 @bot.message_handler(commands=['tasas'])
+@timed(HANDLER_SECONDS, 'tasas')
 def consulta_manual(message):
-    mensaje = dollar_bot.obtener_tasas()
+    mensaje = dollar_bot.obtener_tasas(lang=chat_language(message))
     bot.reply_to(message, mensaje, parse_mode="Markdown", reply_markup=create_main_keyboard())
 
 @bot.message_handler(func=lambda message: message.text in ['💰 Tasas', '🔄 Actualizar', '❓ Ayuda'])
+@timed(HANDLER_SECONDS, 'buttons')
 def handle_buttons(message):
     if message.text in ['💰 Tasas', '🔄 Actualizar']:
-        mensaje = dollar_bot.obtener_tasas()
+        mensaje = dollar_bot.obtener_tasas(force=message.text == '🔄 Actualizar', lang=chat_language(message))
         bot.reply_to(message, mensaje, parse_mode="Markdown", reply_markup=create_main_keyboard())
     elif message.text == '❓ Ayuda':
         send_help(message)
 
 @bot.message_handler(func=lambda message: True)
+@timed(HANDLER_SECONDS, 'unknown')
 def handle_unknown(message):
-    response = "No entiendo ese comando. Usa los botones de abajo:"
-    bot.reply_to(message, response, reply_markup=create_main_keyboard())
+    bot.reply_to(message, UNKNOWN_MSG, reply_markup=create_main_keyboard())
 
 # ==========================
 # Iniciar bot
 # ==========================
+def resume_broadcasts():
+    """Termina en segundo plano los envíos interrumpidos por un reinicio"""
+    threading.Thread(target=broadcaster.resume_unfinished, daemon=True).start()
+
 def start_bot():
     dollar_bot.start_scheduler()
+    resume_broadcasts()
     bot.infinity_polling(timeout=10, long_polling_timeout=5)
 
+def process_update(update_json):
+    """Corre los manejadores de la actualización en este hilo (bot sin hilos en modo webhook)"""
+    bot.process_new_updates([types.Update.de_json(update_json)])
+
+def create_webhook_ingest():
+    """Worker pool that processes updates posted to the Flask webhook route"""
+    return WebhookIngest(
+        process_update,
+        workers=WEBHOOK_WORKERS,
+        queue_size=WEBHOOK_QUEUE_SIZE,
+        secret=WEBHOOK_SECRET
+    ).start()
+
+def register_webhook():
+    """Point Telegram at our webhook route (call once the route is being served)"""
+    if not WEBHOOK_URL:
+        raise ValueError("WEBHOOK_URL no está configurado")
+    dollar_bot.start_scheduler()
+    resume_broadcasts()
+    bot.remove_webhook()
+    bot.set_webhook(
+        url=WEBHOOK_URL + WEBHOOK_PATH,
+        secret_token=WEBHOOK_SECRET or None,
+        max_connections=WEBHOOK_WORKERS * 10
+    )
+    logger.info(f"Webhook registrado en {WEBHOOK_URL}{WEBHOOK_PATH}")
+
 if __name__ == "__main__":
     start_bot()
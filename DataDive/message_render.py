@@ -0,0 +1,151 @@
+import re
+import html
+import threading
+
+LANGUAGES = ("es", "en")
+FORMATS = ("Markdown", "HTML", "plain")
+
+TEXTS = {
+    "es": {
+        "title": "Tasas de Cambio en Venezuela",
+        "date": "%d/%m/%Y",
+        "bcv": "🏛️ BCV Oficial",
+        "average": "📊 Promedio USD",
+        "euro": "💶 Tasas del Euro",
+        "euro_labels": {"clp": "🇪🇺 Euro (CLP)", "bcv": "🏛️ Euro BCV", "est": "🇪🇺 Euro (Est.)"},
+        "up": "📈 Subió",
+        "down": "📉 Bajó",
+        "change": "respecto al día anterior",
+        "updated": "🕐 Actualizado",
+        "sources": "📡 Fuentes",
+        "failed": "⚠️ Sin respuesta",
+    },
+    "en": {
+        "title": "Exchange Rates in Venezuela",
+        "date": "%Y-%m-%d",
+        "bcv": "🏛️ Official BCV",
+        "average": "📊 USD average",
+        "euro": "💶 Euro rates",
+        "euro_labels": {"clp": "🇪🇺 Euro (CLP)", "bcv": "🏛️ Euro BCV", "est": "🇪🇺 Euro (est.)"},
+        "up": "📈 Up",
+        "down": "📉 Down",
+        "change": "against the previous day",
+        "updated": "🕐 Updated",
+        "sources": "📡 Sources",
+        "failed": "⚠️ No response",
+    },
+}
+
+PARSE_MODES = {"Markdown": "Markdown", "HTML": "HTML", "plain": None}
+
+# Stand-ins for the snapshot's date and time in a cached message, filled in on every read
+DATE = "\x00date\x00"
+TIME = "\x00time\x00"
+
+MARKDOWN_SPECIAL = re.compile(r"([_*`\[])")
+
+class RateSnapshot:
+    """Everything the rate message shows, computed once per fetch"""
+
+    __slots__ = ("version", "bcv", "usd", "average", "euro", "change", "failed", "taken_at")
+
+    def __init__(self, bcv, usd, average, euro, change, failed, taken_at):
+        self.bcv = bcv
+        self.usd = usd
+        self.average = average
+        self.euro = euro
+        self.change = change
+        self.failed = failed
+        self.taken_at = taken_at
+        # Same data, same rendered text: the time is stamped in when the message is read
+        self.version = hash((bcv, usd, average, euro, change, failed))
+
+def escape_markdown(text):
+    """Backslash the characters that open an entity in Telegram's legacy Markdown"""
+    return MARKDOWN_SPECIAL.sub(r"\\\1", text)
+
+ESCAPES = {"Markdown": escape_markdown, "HTML": html.escape, "plain": str}
+
+def _bold(text, fmt):
+    if fmt == "Markdown":
+        return f"*{text}*"
+    if fmt == "HTML":
+        return f"<b>{text}</b>"
+    return text
+
+def render_template(snapshot, lang="es", fmt="Markdown"):
+    """The rate message for one language and format, with DATE and TIME left to stamp()"""
+    texts = TEXTS[lang]
+    # Platform titles and source names can come from the APIs
+    escape = ESCAPES[fmt]
+    lines = [
+        f"💱 {_bold(texts['title'], fmt)} ({DATE}):",
+        "",
+        f"{texts['bcv']}: {snapshot.bcv} Bs/USD",
+    ]
+    if snapshot.usd:
+        lines.extend(f"{escape(name)}: {price:.2f} Bs/USD" for name, price in snapshot.usd)
+        lines += ["", f"{texts['average']}: {snapshot.average:.2f} Bs"]
+    if snapshot.euro:
+        lines += ["", f"{_bold(texts['euro'], fmt)}:"]
+        lines.extend(f"{texts['euro_labels'][kind]}: {price:.2f} Bs/EUR" for kind, price in snapshot.euro)
+    if snapshot.change is not None:
+        direction = texts["up"] if snapshot.change > 0 else texts["down"]
+        lines += ["", f"⚠️ {direction} {abs(snapshot.change):.2f}% {texts['change']}."]
+    lines += [
+        "",
+        f"{texts['updated']}: {TIME}",
+        f"{texts['sources']}: PyDolarVe, CLP Today",
+    ]
+    if snapshot.failed:
+        lines.append(f"{texts['failed']}: {escape(', '.join(snapshot.failed))}")
+    return "\n".join(lines)
+
+def stamp(template, taken_at, lang="es"):
+    return template.replace(DATE, taken_at.strftime(TEXTS[lang]["date"])).replace(TIME, taken_at.strftime("%H:%M"))
+
+def render(snapshot, lang="es", fmt="Markdown"):
+    """Build the rate message for one language and format"""
+    return stamp(render_template(snapshot, lang, fmt), snapshot.taken_at, lang)
+
+class MessageCache:
+    """Rendered rate messages for the current snapshot, every language and format
+
+    Messages are kept as templates keyed on the rates only, so a new minute
+    costs a stamp() per read instead of rendering every variant again.
+    """
+
+    def __init__(self, languages=LANGUAGES, formats=FORMATS):
+        self.languages = languages
+        self.formats = formats
+        self.version = None
+        self.messages = {}
+        self.lock = threading.Lock()
+        self.stats = {"renders": 0, "hits": 0}
+
+    def update(self, snapshot):
+        """Render a new snapshot once; a repeated version is a no-op"""
+        if snapshot.version == self.version:
+            return False
+        messages = {
+            (lang, fmt): render_template(snapshot, lang, fmt)
+            for lang in self.languages for fmt in self.formats
+        }
+        with self.lock:
+            self.version = snapshot.version
+            self.messages = messages
+            self.stats["renders"] += 1
+        return True
+
+    def get(self, snapshot, lang="es", fmt="Markdown"):
+        if lang not in self.languages:
+            lang = self.languages[0]
+        self.update(snapshot)
+        with self.lock:
+            self.stats["hits"] += 1
+            template = self.messages[(lang, fmt)]
+        return stamp(template, snapshot.taken_at, lang)
+
+    def get_stats(self):
+        with self.lock:
+            return dict(self.stats, version=self.version)
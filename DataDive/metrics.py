@@ -0,0 +1,207 @@
+"""
+Prometheus-style metrics for the bot and the dashboard
+
+Latency histograms are updated on the hot paths; everything that is
+already counted elsewhere (cache statistics, queue sizes) is read by
+collectors only when /metrics is scraped. With METRICS=0 timers are a
+shared no-op and timed() hands the function back untouched, so the
+instrumentation costs one attribute lookup at most.
+"""
+
+import os
+import time
+import bisect
+import inspect
+import functools
+import threading
+import logging
+
+logger = logging.getLogger(__name__)
+
+METRICS_ENABLED = os.getenv("METRICS", "1") == "1"
+
+# Seconds; upstream fetches and Telegram calls sit in the 50ms-5s range
+DEFAULT_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+def _escape(value):
+    return str(value).replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+def _labels(names, values, extra=None):
+    pairs = [f'{name}="{_escape(value)}"' for name, value in zip(names, values)]
+    if extra:
+        pairs.append(extra)
+    return "{" + ",".join(pairs) + "}" if pairs else ""
+
+def _number(value):
+    if value == float("inf"):
+        return "+Inf"
+    if isinstance(value, float) and value.is_integer() and abs(value) < 1e15:
+        return str(int(value))
+    return repr(value) if isinstance(value, float) else str(value)
+
+class NullTimer:
+    """What time() returns while metrics are disabled"""
+
+    __slots__ = ()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        return False
+
+NULL_TIMER = NullTimer()
+
+class Timer:
+    __slots__ = ("histogram", "labels", "start")
+
+    def __init__(self, histogram, labels):
+        self.histogram = histogram
+        self.labels = labels
+
+    def __enter__(self):
+        self.start = time.perf_counter()
+        return self
+
+    def __exit__(self, *exc):
+        self.histogram.observe(time.perf_counter() - self.start, *self.labels)
+        return False
+
+class Histogram:
+    """Cumulative latency buckets per label set"""
+
+    kind = "histogram"
+
+    def __init__(self, name, documentation, labelnames=(), buckets=DEFAULT_BUCKETS):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self.buckets = tuple(sorted(buckets))
+        # labels -> [count per bucket (last one is +Inf), sum, count]
+        self.series = {}
+        self.lock = threading.Lock()
+
+    def observe(self, value, *labels):
+        if not METRICS_ENABLED:
+            return
+        index = bisect.bisect_left(self.buckets, value)
+        with self.lock:
+            series = self.series.get(labels)
+            if series is None:
+                series = self.series[labels] = [[0] * (len(self.buckets) + 1), 0.0, 0]
+            series[0][index] += 1
+            series[1] += value
+            series[2] += 1
+
+    def time(self, *labels):
+        """Context manager that observes the time spent inside it"""
+        if not METRICS_ENABLED:
+            return NULL_TIMER
+        return Timer(self, labels)
+
+    def samples(self):
+        with self.lock:
+            series = [(labels, list(counts), total, count) for labels, (counts, total, count) in self.series.items()]
+        lines = []
+        for labels, counts, total, count in sorted(series):
+            cumulative = 0
+            for bound, bucket in zip(self.buckets + (float("inf"),), counts):
+                cumulative += bucket
+                le = 'le="' + _number(float(bound)) + '"'
+                lines.append(f"{self.name}_bucket{_labels(self.labelnames, labels, le)} {cumulative}")
+            lines.append(f"{self.name}_sum{_labels(self.labelnames, labels)} {_number(total)}")
+            lines.append(f"{self.name}_count{_labels(self.labelnames, labels)} {count}")
+        return lines
+
+class Registry:
+    """Metric families plus collectors that read existing statistics at scrape time
+
+    A collector returns (name, kind, documentation, samples) tuples, where
+    samples is a list of ({label: value}, number).
+    """
+
+    def __init__(self):
+        self.metrics = {}
+        self.collectors = []
+        self.lock = threading.Lock()
+
+    def register(self, metric):
+        with self.lock:
+            # Re-importing a module must not create a second family with the same name
+            return self.metrics.setdefault(metric.name, metric)
+
+    def add_collector(self, collector):
+        with self.lock:
+            self.collectors.append(collector)
+
+    def render(self, skip_empty=False):
+        """Prometheus text exposition format (version 0.0.4)"""
+        with self.lock:
+            metrics = list(self.metrics.values())
+            collectors = list(self.collectors)
+        out = []
+        for metric in metrics:
+            samples = metric.samples()
+            if skip_empty and not samples:
+                continue
+            out.append(f"# HELP {metric.name} {metric.documentation}")
+            out.append(f"# TYPE {metric.name} {metric.kind}")
+            out.extend(samples)
+        # Several collectors may report samples of the same family (queue depths)
+        families = {}
+        for collector in collectors:
+            try:
+                collected = collector()
+            except Exception as e:
+                logger.error(f"Error collecting metrics: {e}")
+                continue
+            for name, kind, documentation, samples in collected:
+                family = families.setdefault(name, (kind, documentation, []))
+                family[2].extend(
+                    f"{name}{_labels(labels.keys(), labels.values())} {_number(value)}"
+                    for labels, value in samples if value is not None
+                )
+        for name, (kind, documentation, samples) in families.items():
+            out.append(f"# HELP {name} {documentation}")
+            out.append(f"# TYPE {name} {kind}")
+            out.extend(samples)
+        return "\n".join(out) + "\n"
+
+registry = Registry()
+
+def histogram(name, documentation, labelnames=(), buckets=DEFAULT_BUCKETS):
+    return registry.register(Histogram(name, documentation, labelnames, buckets))
+
+def timed(metric, *labels):
+    """Decorator timing every call of a function or coroutine function"""
+    def decorate(func):
+        if not METRICS_ENABLED:
+            return func
+        if inspect.iscoroutinefunction(func):
+            @functools.wraps(func)
+            async def timed_async(*args, **kwargs):
+                with metric.time(*labels):
+                    return await func(*args, **kwargs)
+            return timed_async
+
+        @functools.wraps(func)
+        def timed_call(*args, **kwargs):
+            with metric.time(*labels):
+                return func(*args, **kwargs)
+        return timed_call
+    return decorate
+
+def merge_exposition(primary, secondary):
+    """primary plus the families of secondary it doesn't have (another process's metrics)"""
+    present = {line.split()[2] for line in primary.splitlines() if line.startswith("# TYPE ")}
+    out = [primary.rstrip("\n")] if primary.strip() else []
+    keep = True
+    for line in secondary.splitlines():
+        if line.startswith("# HELP "):
+            keep = line.split()[2] not in present
+        if keep and line:
+            out.append(line)
+    return "\n".join(out) + "\n"
+
+def ratio(hits, total):
+    return hits / total if total else None
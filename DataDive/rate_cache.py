@@ -0,0 +1,142 @@
+import time
+import threading
+import logging
+from concurrent.futures import Future, ThreadPoolExecutor
+
+logger = logging.getLogger(__name__)
+
+class CacheEntry:
+    """A cached value and the moment it was fetched"""
+
+    __slots__ = ("value", "fetched_at")
+
+    def __init__(self, value, fetched_at):
+        self.value = value
+        self.fetched_at = fetched_at
+
+class SnapshotCache:
+    """Per-source TTL cache with single-flight loads and stale-while-revalidate"""
+
+    def __init__(self, ttls=None, default_ttl=60, max_stale=900, force_interval=30, clock=time.monotonic):
+        self.ttls = dict(ttls or {})
+        self.default_ttl = default_ttl
+        self.max_stale = max_stale
+        self.force_interval = force_interval
+        self.clock = clock
+        self.entries = {}
+        self.inflight = {}
+        self.invalidated = set()
+        self.last_forced = None
+        self.lock = threading.Lock()
+        self.executor = ThreadPoolExecutor(max_workers=4, thread_name_prefix="rate-refresh")
+        self.stats = {"hits": 0, "stale_hits": 0, "misses": 0, "joined": 0, "errors": 0}
+
+    def ttl_for(self, key):
+        return self.ttls.get(key, self.default_ttl)
+
+    def get(self, key, loader, *args):
+        """Return the cached value for key, loading it through loader(*args) when needed"""
+        with self.lock:
+            entry = self.entries.get(key)
+            now = self.clock()
+            age = now - entry.fetched_at if entry else None
+
+            if entry and key not in self.invalidated:
+                if age < self.ttl_for(key):
+                    self.stats["hits"] += 1
+                    return entry.value
+                if age < self.max_stale:
+                    # Serve the stale value right away and refresh behind the user's back
+                    self.stats["stale_hits"] += 1
+                    if key not in self.inflight:
+                        self.inflight[key] = Future()
+                        self.executor.submit(self._load, key, loader, args)
+                    return entry.value
+
+            future = self.inflight.get(key)
+            if future is None:
+                future = self.inflight[key] = Future()
+                owner = True
+                self.stats["misses"] += 1
+            else:
+                owner = False
+                self.stats["joined"] += 1
+
+        if owner:
+            self._load(key, loader, args)
+        return future.result()
+
+    def _load(self, key, loader, args):
+        with self.lock:
+            future = self.inflight[key]
+        try:
+            value = loader(*args)
+        except Exception as e:
+            with self.lock:
+                self.stats["errors"] += 1
+                self.inflight.pop(key, None)
+                entry = self.entries.get(key)
+                # Stale-if-error: an old answer beats no answer
+                usable = entry and self.clock() - entry.fetched_at < self.max_stale
+            logger.warning(f"Refresh of {key} failed: {e}")
+            if usable:
+                future.set_result(entry.value)
+            else:
+                future.set_exception(e)
+            return
+
+        with self.lock:
+            self.entries[key] = CacheEntry(value, self.clock())
+            self.invalidated.discard(key)
+            self.inflight.pop(key, None)
+        future.set_result(value)
+
+    def lookup(self, key):
+        """(state, value) without loading, for callers that load on their own (asyncio)
+
+        state is 'fresh', 'stale' (serve it and refresh in the background) or
+        'load' (a new value is required; value, if any, is only a fallback).
+        """
+        with self.lock:
+            entry = self.entries.get(key)
+            if entry is None:
+                self.stats["misses"] += 1
+                return "load", None
+            age = self.clock() - entry.fetched_at
+            usable = entry.value if age < self.max_stale else None
+            if key in self.invalidated or usable is None:
+                self.stats["misses"] += 1
+                return "load", usable
+            if age < self.ttl_for(key):
+                self.stats["hits"] += 1
+                return "fresh", entry.value
+            self.stats["stale_hits"] += 1
+            return "stale", entry.value
+
+    def store(self, key, value):
+        with self.lock:
+            self.entries[key] = CacheEntry(value, self.clock())
+            self.invalidated.discard(key)
+
+    def wrap(self, key, loader):
+        """Return a function with the loader's signature that goes through the cache"""
+        def cached(*args):
+            return self.get(key, loader, *args)
+        return cached
+
+    def force_refresh(self):
+        """Invalidate every source, at most once per force_interval; returns True if honoured"""
+        with self.lock:
+            now = self.clock()
+            if self.last_forced is not None and now - self.last_forced < self.force_interval:
+                return False
+            self.last_forced = now
+            self.invalidated.update(self.entries)
+            return True
+
+    def get_stats(self):
+        with self.lock:
+            stats = dict(self.stats)
+            now = self.clock()
+            stats["ages"] = {key: round(now - entry.fetched_at, 1) for key, entry in self.entries.items()}
+        return stats
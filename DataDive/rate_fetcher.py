@@ -0,0 +1,162 @@
+import time
+import asyncio
+import contextvars
+import logging
+from concurrent.futures import ThreadPoolExecutor, wait, FIRST_COMPLETED
+from tracing import span
+
+logger = logging.getLogger(__name__)
+
+# Seconds an async source may run past its timeout before it is cancelled
+LOAD_SLACK = 1.0
+
+class FetchReport:
+    """Outcome of one fan-out fetch: results per source plus the ones that failed"""
+
+    def __init__(self):
+        self.results = {}
+        self.failed = {}
+        self.latencies = {}
+        self.elapsed = 0.0
+
+    def ok(self, name):
+        return name in self.results
+
+    def get(self, name, default=None):
+        return self.results.get(name, default)
+
+class RateFetcher:
+    """Run every rate source at the same time under one overall deadline"""
+
+    def __init__(self, deadline=12.0, max_workers=8):
+        self.deadline = deadline
+        self.sources = {}
+        # Shared pool: a source that blows its timeout keeps its worker busy
+        # until the underlying socket gives up, so size it above len(sources).
+        self.executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix="rate-fetch")
+
+    def register(self, name, func, timeout=10.0):
+        """Register a source; func(timeout) returns its data or raises"""
+        self.sources[name] = (func, timeout)
+
+    def _run(self, name, func, timeout):
+        start = time.monotonic()
+        try:
+            with span(f"source:{name}", timeout=timeout):
+                return func(timeout)
+        finally:
+            logger.debug(f"Source {name} finished in {time.monotonic() - start:.3f}s")
+
+    def fetch_all(self, names=None, deadline=None):
+        """Fetch the given sources (all by default) and wait at most `deadline` seconds"""
+        report = FetchReport()
+        names = list(names) if names is not None else list(self.sources)
+        overall = self.deadline if deadline is None else deadline
+        start = time.monotonic()
+
+        pending = {}
+        for name in names:
+            func, timeout = self.sources[name]
+            # The worker continues the caller's trace, if any
+            future = self.executor.submit(contextvars.copy_context().run, self._run, name, func, timeout)
+            pending[future] = (name, start + min(timeout, overall))
+
+        while pending:
+            now = time.monotonic()
+            expired = [f for f, (_, due) in pending.items() if due <= now]
+            for future in expired:
+                name, _ = pending.pop(future)
+                future.cancel()
+                report.failed[name] = "timeout"
+                logger.warning(f"Source {name} timed out")
+            if not pending:
+                break
+
+            next_due = min(due for _, due in pending.values())
+            done, _ = wait(list(pending), timeout=max(0.0, next_due - now), return_when=FIRST_COMPLETED)
+            for future in done:
+                name, _ = pending.pop(future)
+                report.latencies[name] = time.monotonic() - start
+                try:
+                    report.results[name] = future.result()
+                except Exception as e:
+                    report.failed[name] = str(e) or e.__class__.__name__
+                    logger.warning(f"Source {name} failed: {e}")
+
+        report.elapsed = time.monotonic() - start
+        return report
+
+    def shutdown(self):
+        self.executor.shutdown(wait=False, cancel_futures=True)
+
+class AsyncRateFetcher:
+    """asyncio counterpart of RateFetcher; sources are coroutines sharing a SnapshotCache"""
+
+    def __init__(self, deadline=12.0, cache=None):
+        self.deadline = deadline
+        self.cache = cache
+        self.sources = {}
+        self.inflight = {}
+        self.background = set()
+
+    def register(self, name, coro_func, timeout=10.0):
+        """Register a source; await coro_func(timeout) returns its data or raises"""
+        self.sources[name] = (coro_func, timeout)
+
+    def _load(self, name):
+        # Single-flight: every waiter for this source shares one task
+        task = self.inflight.get(name)
+        if task is None:
+            func, timeout = self.sources[name]
+            # The source keeps to `timeout` itself; the slack lets it settle its own
+            # timeouts (and source health) before this outer guard cancels it
+            task = asyncio.ensure_future(asyncio.wait_for(func(timeout), timeout + LOAD_SLACK))
+            self.inflight[name] = task
+
+            def done(t):
+                self.inflight.pop(name, None)
+                if not t.cancelled() and t.exception() is None and self.cache is not None:
+                    self.cache.store(name, t.result())
+            task.add_done_callback(done)
+        return task
+
+    async def _get(self, name):
+        if self.cache is None:
+            return await asyncio.shield(self._load(name))
+        state, value = self.cache.lookup(name)
+        if state == "fresh":
+            return value
+        if state == "stale":
+            task = self._load(name)
+            self.background.add(task)
+            task.add_done_callback(self.background.discard)
+            return value
+        try:
+            return await asyncio.shield(self._load(name))
+        except Exception:
+            if value is not None:
+                return value
+            raise
+
+    async def fetch_all(self, names=None, deadline=None):
+        report = FetchReport()
+        names = list(names) if names is not None else list(self.sources)
+        overall = self.deadline if deadline is None else deadline
+        start = time.monotonic()
+
+        async def run(name):
+            _, timeout = self.sources[name]
+            try:
+                with span(f"source:{name}", timeout=timeout):
+                    report.results[name] = await asyncio.wait_for(self._get(name), min(timeout, overall))
+            except asyncio.TimeoutError:
+                report.failed[name] = "timeout"
+                logger.warning(f"Source {name} timed out")
+            except Exception as e:
+                report.failed[name] = str(e) or e.__class__.__name__
+                logger.warning(f"Source {name} failed: {e}")
+            report.latencies[name] = time.monotonic() - start
+
+        await asyncio.gather(*(run(name) for name in names))
+        report.elapsed = time.monotonic() - start
+        return report
@@ -0,0 +1,99 @@
+import os
+
+# Bucket sizes of the pre-aggregated OHLC rollups
+RESOLUTIONS = {
+    "hour": 3600,
+    "day": 86400,
+    "week": 7 * 86400
+}
+
+# Days and weeks follow Venezuelan time (UTC-4, no DST) rather than UTC
+HISTORY_UTC_OFFSET = int(os.getenv("HISTORY_UTC_OFFSET", str(-4 * 3600)))
+# 1970-01-05 was a Monday: weeks start on Mondays
+WEEK_ANCHOR = 4 * 86400
+
+def bucket_start(ts, resolution, offset=HISTORY_UTC_OFFSET):
+    """Start (epoch seconds) of the bucket of `resolution` that contains ts"""
+    size = RESOLUTIONS[resolution]
+    anchor = WEEK_ANCHOR if resolution == "week" else 0
+    return ((ts + offset - anchor) // size) * size + anchor - offset
+
+class Candle:
+    """Open/high/low/close of one bucket; open and close keep their timestamps so
+    rows arriving out of order still land in the right place"""
+
+    __slots__ = ("open", "high", "low", "close", "open_ts", "close_ts", "count", "total")
+
+    def __init__(self, rate, ts):
+        self.open = self.high = self.low = self.close = rate
+        self.open_ts = self.close_ts = ts
+        self.count = 1
+        self.total = rate
+
+    def add(self, rate, ts):
+        if ts < self.open_ts:
+            self.open, self.open_ts = rate, ts
+        if ts >= self.close_ts:
+            self.close, self.close_ts = rate, ts
+        self.high = max(self.high, rate)
+        self.low = min(self.low, rate)
+        self.count += 1
+        self.total += rate
+
+    def row(self):
+        return (self.open, self.high, self.low, self.close, self.open_ts, self.close_ts, self.count, self.total)
+
+def rollup_batch(rows):
+    """{(source, resolution, bucket): Candle} for (source, rate, ts) rows"""
+    candles = {}
+    for source, rate, ts in rows:
+        for resolution in RESOLUTIONS:
+            key = (source, resolution, bucket_start(ts, resolution))
+            candle = candles.get(key)
+            if candle is None:
+                candles[key] = Candle(rate, ts)
+            else:
+                candle.add(rate, ts)
+    return candles
+
+def choose_resolution(since, until, points=1000):
+    """'auto': raw rows up to a day, else the finest rollup with no more than `points` buckets"""
+    span = until - since
+    if span <= 86400:
+        return "raw"
+    for resolution, size in RESOLUTIONS.items():
+        if span / size <= points:
+            return resolution
+    return "week"
+
+def lttb(rows, threshold, x, y):
+    """Largest-Triangle-Three-Buckets: keep `threshold` of `rows` that preserve the chart's shape
+
+    x and y pull the coordinates out of a row. The first and last rows are always kept.
+    """
+    count = len(rows)
+    if threshold >= count or threshold < 3:
+        return list(rows)
+    sampled = [rows[0]]
+    every = (count - 2) / (threshold - 2)
+    a = 0
+    for i in range(threshold - 2):
+        # Average of the next bucket is the third point of the triangle
+        next_start = int((i + 1) * every) + 1
+        next_end = min(int((i + 2) * every) + 1, count)
+        span = next_end - next_start
+        avg_x = sum(x(rows[j]) for j in range(next_start, next_end)) / span
+        avg_y = sum(y(rows[j]) for j in range(next_start, next_end)) / span
+
+        start = int(i * every) + 1
+        end = int((i + 1) * every) + 1
+        ax, ay = x(rows[a]), y(rows[a])
+        best, best_area = start, -1.0
+        for j in range(start, end):
+            area = abs((ax - avg_x) * (y(rows[j]) - ay) - (ax - x(rows[j])) * (avg_y - ay))
+            if area > best_area:
+                best, best_area = j, area
+        sampled.append(rows[best])
+        a = best
+    sampled.append(rows[-1])
+    return sampled
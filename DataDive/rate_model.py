@@ -0,0 +1,222 @@
+import time
+from array import array
+import numpy as np
+
+USD = "USD"
+EUR = "EUR"
+COP = "COP"
+
+# What a quote is: the BCV fixing, a P2P platform, a transfer channel
+# (Zelle, PayPal) or a value estimated from the last known cross rate
+OFFICIAL = "official"
+P2P = "p2p"
+TRANSFER = "transfer"
+ESTIMATE = "estimate"
+MARKET_KINDS = (OFFICIAL, P2P, TRANSFER)
+
+class Quote:
+    """One row of a RateBook"""
+
+    __slots__ = ("source", "label", "currency", "kind", "price", "ts", "weight")
+
+    def __init__(self, source, label, currency, kind, price, ts, weight):
+        self.source = source
+        self.label = label
+        self.currency = currency
+        self.kind = kind
+        self.price = price
+        self.ts = ts
+        self.weight = weight
+
+class RateBook:
+    """The Bs price of every source in one fetch, stored as columns
+
+    Prices, timestamps and weights are float arrays, so the aggregation
+    moves them into NumPy in one copy instead of building lists row by row.
+    """
+
+    __slots__ = ("sources", "labels", "currencies", "kinds", "prices", "timestamps", "weights")
+
+    def __init__(self):
+        self.sources = []
+        self.labels = []
+        self.currencies = []
+        self.kinds = []
+        self.prices = array("d")
+        self.timestamps = array("d")
+        self.weights = array("d")
+
+    def add(self, source, label, currency, kind, price, ts=None, weight=1.0):
+        if price is None or price <= 0:
+            return False
+        self.sources.append(source)
+        self.labels.append(label)
+        self.currencies.append(currency)
+        self.kinds.append(kind)
+        self.prices.append(float(price))
+        self.timestamps.append(ts if ts is not None else time.time())
+        self.weights.append(weight)
+        return True
+
+    def __len__(self):
+        return len(self.sources)
+
+    def __contains__(self, source):
+        return source in self.sources
+
+    def price(self, source, default=None):
+        try:
+            return self.prices[self.sources.index(source)]
+        except ValueError:
+            return default
+
+    def mask(self, currency=None, kinds=None):
+        """Boolean array selecting the rows of a currency and/or kinds"""
+        selected = np.ones(len(self), dtype=bool)
+        if currency is not None:
+            selected &= np.array([c == currency for c in self.currencies], dtype=bool)
+        if kinds is not None:
+            selected &= np.array([k in kinds for k in self.kinds], dtype=bool)
+        return selected
+
+    def column(self, name):
+        # A copy, not np.frombuffer: a live buffer view would stop add() from growing the array
+        return np.array(getattr(self, name), dtype=np.float64)
+
+    def quote(self, i):
+        return Quote(self.sources[i], self.labels[i], self.currencies[i], self.kinds[i],
+                     self.prices[i], self.timestamps[i], self.weights[i])
+
+    def quotes(self, currency=None, kinds=None):
+        return [self.quote(i) for i in np.flatnonzero(self.mask(currency, kinds))]
+
+    def market(self, include_estimates=False):
+        """{source: price} of the real quotes (what gets stored)"""
+        return {
+            source: price for source, kind, price in zip(self.sources, self.kinds, self.prices)
+            if include_estimates or kind != ESTIMATE
+        }
+
+def trimmed_mean(values, proportion=0.1):
+    """Mean after dropping `proportion` of the values at each end"""
+    ordered = np.sort(values)
+    cut = int(len(ordered) * proportion)
+    if cut * 2 >= len(ordered):
+        return float(np.median(ordered))
+    return float(ordered[cut:len(ordered) - cut].mean())
+
+def aggregate(prices, weights=None, trim=0.1, outlier_z=3.5, pinned=None):
+    """Robust summary of a set of quotes for the same currency
+
+    Quotes whose modified z-score (distance to the median in MADs) passes
+    `outlier_z` are rejected before the averages are taken; with fewer than
+    three quotes, or all of them equal, nothing is rejected. `pinned` rows
+    (the official rate, which sits apart from the market by design) are
+    never rejected and don't count towards the median and MAD.
+    """
+    values = np.asarray(prices, dtype=np.float64)
+    if values.size == 0:
+        return None
+    weights = np.ones_like(values) if weights is None else np.asarray(weights, dtype=np.float64)
+    pinned = np.zeros(values.size, dtype=bool) if pinned is None else np.asarray(pinned, dtype=bool)
+
+    keep = np.ones(values.size, dtype=bool)
+    market = values[~pinned]
+    if market.size >= 3:
+        median = np.median(market)
+        mad = np.median(np.abs(market - median))
+        if mad > 0:
+            keep = pinned | (0.6745 * np.abs(values - median) / mad <= outlier_z)
+    kept = values[keep]
+    kept_weights = weights[keep]
+    low, high = float(kept.min()), float(kept.max())
+    return {
+        "count": int(values.size),
+        "rejected": [int(i) for i in np.flatnonzero(~keep)],
+        "mean": float(kept.mean()),
+        "weighted": float(np.average(kept, weights=kept_weights)) if kept_weights.sum() > 0 else float(kept.mean()),
+        "median": float(np.median(kept)),
+        "trimmed": trimmed_mean(kept, trim),
+        "min": low,
+        "max": high,
+        "spread": high - low,
+        "spread_pct": (high - low) / low * 100
+    }
+
+def aggregate_book(book, currency=USD, kinds=MARKET_KINDS, pinned_kinds=(OFFICIAL,), **options):
+    """aggregate() over the book's rows of a currency; rejected lists sources instead of indexes"""
+    rows = np.flatnonzero(book.mask(currency, kinds))
+    if rows.size == 0:
+        return None
+    pinned = [book.kinds[i] in pinned_kinds for i in rows]
+    summary = aggregate(book.column("prices")[rows], book.column("weights")[rows], pinned=pinned, **options)
+    summary["rejected"] = [book.sources[rows[i]] for i in summary["rejected"]]
+    return summary
+
+class CrossRates:
+    """Every pair of currencies from their Bs prices, in one division
+
+    matrix[i, j] is how many units of codes[j] one unit of codes[i] buys.
+    """
+
+    __slots__ = ("codes", "matrix")
+
+    def __init__(self, codes, bolivar_prices):
+        self.codes = tuple(codes)
+        prices = np.asarray(bolivar_prices, dtype=np.float64)
+        self.matrix = prices[:, None] / prices[None, :] if prices.size else np.empty((0, 0))
+
+    @classmethod
+    def from_book(cls, book):
+        """Every currency in the book at the weighted blend of its official,
+        P2P and transfer quotes, or of its estimates when it has nothing else"""
+        codes = []
+        prices = []
+        for currency in dict.fromkeys(book.currencies):
+            summary = aggregate_book(book, currency) or aggregate_book(book, currency, MARKET_KINDS + (ESTIMATE,))
+            if summary:
+                codes.append(currency)
+                prices.append(summary["weighted"])
+        return cls(codes, prices)
+
+    def rate(self, base, quote):
+        """Units of `quote` per unit of `base`, None when either is missing"""
+        try:
+            return float(self.matrix[self.codes.index(base), self.codes.index(quote)])
+        except ValueError:
+            return None
+
+    def to_dict(self):
+        return {
+            f"{base}/{quote}": float(self.matrix[i, j])
+            for i, base in enumerate(self.codes)
+            for j, quote in enumerate(self.codes) if i != j
+        }
+
+def estimate_missing(book, ratios, anchor, expected):
+    """Add ESTIMATE rows for expected sources the fetch didn't return
+
+    `ratios` holds each source's last known price relative to the `anchor`
+    source (its premium over BCV, or the EUR/USD cross for the euro), and
+    all missing prices are scaled from the anchor in one step.
+    """
+    base = book.price(anchor)
+    if base is None:
+        return []
+    missing = [source for source in expected if source not in book and source in ratios]
+    if not missing:
+        return []
+    prices = base * np.array([ratios[source] for source in missing], dtype=np.float64)
+    for source, price in zip(missing, prices):
+        label, currency = expected[source]
+        book.add(source, label, currency, ESTIMATE, float(price))
+    return missing
+
+def premiums(book, anchor):
+    """{source: price / anchor price} for the real quotes, to estimate them later"""
+    base = book.price(anchor)
+    if not base:
+        return {}
+    rows = np.flatnonzero(book.mask(kinds=MARKET_KINDS))
+    ratios = book.column("prices")[rows] / base
+    return {book.sources[i]: float(ratio) for i, ratio in zip(rows, ratios) if book.sources[i] != anchor}
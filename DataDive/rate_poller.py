@@ -0,0 +1,155 @@
+import time
+import datetime
+import threading
+import logging
+from zoneinfo import ZoneInfo
+
+logger = logging.getLogger(__name__)
+
+class Feed:
+    """One upstream sampled on its own adaptive interval"""
+
+    def __init__(self, name, sample, interval):
+        self.name = name
+        self.sample = sample
+        self.interval = interval
+        self.last_values = {}
+        self.last_sample = None
+        self.errors = 0
+
+class RatePoller:
+    """Samples each feed on a timer and alerts when a rate crosses the daily threshold
+
+    A feed is a callable returning {source: rate}. Its interval halves when a
+    sample moves more than `volatility` percent and grows back towards
+    `max_interval` while the market is quiet. Between samples nothing runs:
+    the next sample is a one-shot timer on the shared JobScheduler.
+    """
+
+    def __init__(self, scheduler, baseline, on_alert, on_sample=None, threshold=2.0, volatility=0.25,
+                 min_interval=60, max_interval=1800, timezone="America/Caracas", clock=time.time):
+        self.scheduler = scheduler
+        self.baseline = baseline
+        self.on_alert = on_alert
+        self.on_sample = on_sample
+        self.threshold = threshold
+        self.volatility = volatility
+        self.min_interval = min_interval
+        self.max_interval = max_interval
+        self.tz = ZoneInfo(timezone)
+        self.clock = clock
+        self.feeds = {}
+        self.baselines = {}
+        self.alerted = set()
+        self.day = None
+        self.lock = threading.Lock()
+        self.running = False
+
+    def add_feed(self, name, sample, interval=300):
+        self.feeds[name] = Feed(name, sample, interval)
+
+    def start(self):
+        if self.running:
+            return
+        self.running = True
+        now = self.clock()
+        for feed in self.feeds.values():
+            self._schedule(feed, now)
+        logger.info(f"Rate poller started for {', '.join(self.feeds)}")
+
+    def stop(self):
+        self.running = False
+        for name in self.feeds:
+            self.scheduler.remove_job(f"poll:{name}")
+
+    def _schedule(self, feed, when):
+        self.scheduler.call_at(f"poll:{feed.name}", when, lambda: self.poll(feed.name))
+
+    def _day_start(self, now):
+        moment = datetime.datetime.fromtimestamp(now, self.tz)
+        return moment.replace(hour=0, minute=0, second=0, microsecond=0).timestamp()
+
+    def _baseline(self, source, day_start, rate):
+        """Previous day's close; the first sample of the day if there is no history"""
+        with self.lock:
+            if self.day != day_start:
+                self.day = day_start
+                self.baselines.clear()
+                self.alerted.clear()
+            if source not in self.baselines:
+                self.baselines[source] = self.baseline(source, day_start) or rate
+            return self.baselines[source]
+
+    def daily_change(self, source, rate):
+        """(baseline, percent change) of rate against today's baseline"""
+        base = self._baseline(source, self._day_start(self.clock()), rate)
+        return base, (rate - base) / base * 100
+
+    def poll(self, name):
+        """Take one sample of a feed and schedule the next one"""
+        feed = self.feeds[name]
+        now = self.clock()
+        try:
+            values = {source: rate for source, rate in feed.sample().items() if rate and rate > 0}
+            feed.errors = 0
+        except Exception as e:
+            values = {}
+            feed.errors += 1
+            logger.error(f"Error polling {name}: {e}")
+
+        if values:
+            self._adapt(feed, values)
+            self._check(values, now)
+            feed.last_values = values
+            feed.last_sample = now
+            if self.on_sample:
+                try:
+                    self.on_sample(name, values)
+                except Exception as e:
+                    logger.error(f"Error storing {name} sample: {e}")
+        elif feed.errors:
+            # Failing upstream: back off instead of hammering it
+            feed.interval = min(self.max_interval, feed.interval * 2)
+
+        if self.running:
+            self._schedule(feed, self.clock() + feed.interval)
+
+    def _adapt(self, feed, values):
+        moves = [
+            abs(rate - feed.last_values[source]) / feed.last_values[source] * 100
+            for source, rate in values.items() if feed.last_values.get(source)
+        ]
+        if not moves:
+            return
+        if max(moves) >= self.volatility:
+            feed.interval = max(self.min_interval, feed.interval / 2)
+        else:
+            feed.interval = min(self.max_interval, feed.interval * 1.5)
+
+    def _check(self, values, now):
+        day_start = self._day_start(now)
+        for source, rate in values.items():
+            base = self._baseline(source, day_start, rate)
+            change = (rate - base) / base * 100
+            if abs(change) < self.threshold:
+                continue
+            key = (source, change > 0)
+            with self.lock:
+                if key in self.alerted:
+                    continue
+                self.alerted.add(key)
+            try:
+                self.on_alert(source, base, rate, change)
+            except Exception as e:
+                logger.error(f"Error sending {source} alert: {e}")
+
+    def get_status(self):
+        return {
+            name: {
+                'interval': feed.interval,
+                'last_sample': datetime.datetime.fromtimestamp(feed.last_sample, self.tz).isoformat() if feed.last_sample else None,
+                'last_values': feed.last_values,
+                'errors': feed.errors
+            }
+            for name, feed in self.feeds.items()
+        }
@@ -0,0 +1,105 @@
+"""
+Adapters for the upstream rate providers
+
+Each adapter fetches one feed from one provider and raises when the answer
+is unusable, so SourceRegistry can count it against the provider's health.
+A new provider for an existing feed only needs an adapter registered with
+the same feed; the registry ranks it against the others and falls back
+between them.
+"""
+
+import asyncio
+
+class SourceAdapter:
+    """One provider of a feed ('bcv', 'p2p', 'eur', 'clp')
+
+    Lower `priority` is preferred among equally healthy adapters; a success
+    older than `max_age` seconds is reported as not fresh.
+    """
+
+    def __init__(self, name, feed, label=None, timeout=10.0, priority=0, max_age=900):
+        self.name = name
+        self.feed = feed
+        self.label = label or name
+        self.timeout = timeout
+        self.priority = priority
+        self.max_age = max_age
+
+    def fetch(self, timeout):
+        raise NotImplementedError
+
+    async def fetch_async(self, get_json, timeout):
+        return await asyncio.to_thread(self.fetch, timeout)
+
+class JsonAdapter(SourceAdapter):
+    """Adapter for a JSON endpoint; subclasses turn the document into the feed's data"""
+
+    def __init__(self, name, feed, http, url, **options):
+        super().__init__(name, feed, **options)
+        self.http = http
+        self.url = url
+
+    def parse(self, data):
+        return data
+
+    def fetch(self, timeout):
+        return self.parse(self.http.get_json(self.url, timeout=timeout))
+
+    async def fetch_async(self, get_json, timeout):
+        return self.parse(await get_json(self.url, timeout))
+
+class PyDolarVeRate(JsonAdapter):
+    """Official BCV price of a currency from PyDolarVe"""
+
+    def __init__(self, name, feed, http, base_url, currency, **options):
+        url = f"{base_url}/api/v2/tipo-cambio?currency={currency}&rounded_price=true"
+        super().__init__(name, feed, http, url, **options)
+
+    def parse(self, data):
+        price = data.get('price') if isinstance(data, dict) else None
+        if not price or price <= 0:
+            raise ValueError(f"no price in response: {str(data)[:100]}")
+        return price
+
+PLATFORM_DISPLAY = {
+    'binance': '🔸 Binance',
+    'bybit': '🔶 Bybit',
+    'okx': '⚫ OKX',
+    'yadio': '🔵 Yadio'
+}
+
+def parse_p2p(p2p_data):
+    """PyDolarVe's P2P response as (key, display name, price) tuples"""
+    tasas = []
+    if 'platforms' in p2p_data:
+        for key, data in p2p_data['platforms'].items():
+            if isinstance(data, dict) and 'title' in data and 'price' in data:
+                display_name = PLATFORM_DISPLAY.get(key.lower(), data['title'])
+                tasas.append((key.lower(), display_name, data['price']))
+    return tasas
+
+class PyDolarVeP2P(JsonAdapter):
+    """P2P platform prices from PyDolarVe"""
+
+    def __init__(self, name, feed, http, base_url, **options):
+        url = f"{base_url}/api/v2/market-p2p?currency=usd&rounded_price=true"
+        super().__init__(name, feed, http, url, **options)
+
+    def parse(self, data):
+        tasas = parse_p2p(data if isinstance(data, dict) else {})
+        if not tasas:
+            raise ValueError("no P2P platforms in response")
+        return tasas
+
+class CLPTodayAdapter(SourceAdapter):
+    """Zelle, PayPal and euro prices scraped from CLP Today"""
+
+    def __init__(self, name, feed, scraper, **options):
+        super().__init__(name, feed, **options)
+        self.scraper = scraper
+
+    def fetch(self, timeout):
+        clp_rates = self.scraper.get_specific_rates(timeout=timeout)
+        if not clp_rates:
+            raise ValueError("no data from CLP Today")
+        return clp_rates
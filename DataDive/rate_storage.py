@@ -1,102 +1,352 @@
 import json
 import os
+import time
 import datetime
+import atexit
+import threading
 import logging
+from storage_backends import create_backend
+from rolling_stats import RollingStats
+from rate_history import RESOLUTIONS
+from write_buffer import WriteBehindBuffer
+from metrics import histogram
+from tracing import span
 
 logger = logging.getLogger(__name__)
 
+# Seconds between checks for rows written by other processes (or threads
+# using the backend directly); a process sees its own saves right away
+STORAGE_SYNC_INTERVAL = float(os.getenv("STORAGE_SYNC_INTERVAL", "1"))
+# Write-behind: an unchanged rate is stored again only after STORAGE_DEDUP_WINDOW
+# seconds, and changes are written in batches every STORAGE_FLUSH_INTERVAL
+STORAGE_WRITE_BEHIND = os.getenv("STORAGE_WRITE_BEHIND", "1") == "1"
+STORAGE_DEDUP_WINDOW = float(os.getenv("STORAGE_DEDUP_WINDOW", "3600"))
+STORAGE_FLUSH_INTERVAL = float(os.getenv("STORAGE_FLUSH_INTERVAL", "5"))
+
+# "save" is what callers of save_rates wait for, "write" one batch reaching the backend
+WRITE_SECONDS = histogram("dollarbot_storage_write_seconds", "Time spent saving rates", ("op",),
+                          buckets=(0.0001, 0.0005, 0.001, 0.005, 0.01, 0.05, 0.1, 0.5, 1.0))
+
+class StorageView:
+    """What readers see: replaced as a whole when rates arrive, never modified"""
+
+    __slots__ = ("cursor", "latest", "sources")
+
+    def __init__(self, cursor, latest):
+        self.cursor = cursor
+        self.latest = latest
+        self.sources = tuple(sorted(latest))
+
 class RateStorage:
-    """Handle persistent storage of exchange rates"""
-    
-    def __init__(self, storage_file="rates_data.json"):
+    """Handle persistent storage of exchange rates
+
+    Safe to share between threads and processes: the backend serializes
+    writes in transactions, and every instance follows the backend's change
+    feed into copy-on-write rolling stats and view of the latest rates, so
+    reads never wait on a writer.
+    """
+
+    def __init__(self, storage_file="rates_data.json", backend=None, windows=None, write_behind=None):
         self.storage_file = storage_file
-        self.data = self._load_data()
-    
-    def _load_data(self):
-        """Load data from storage file"""
-        try:
-            if os.path.exists(self.storage_file):
-                with open(self.storage_file, 'r', encoding='utf-8') as f:
-                    data = json.load(f)
-                    logger.info("Rate data loaded from storage")
-                    return data
-            else:
-                logger.info("No existing storage file, creating new data structure")
-                return {"anterior": 0.0, "history": []}
-        except Exception as e:
-            logger.error(f"Error loading storage file: {e}")
-            return {"anterior": 0.0, "history": []}
-    
-    def _save_data(self):
-        """Save data to storage file"""
-        try:
-            with open(self.storage_file, 'w', encoding='utf-8') as f:
-                json.dump(self.data, f, ensure_ascii=False, indent=2)
-            logger.debug("Rate data saved to storage")
-        except Exception as e:
-            logger.error(f"Error saving storage file: {e}")
-    
-    def get_previous_rate(self):
+        self.backend = backend or create_backend()
+        self.windows = windows
+        self.rolling = RollingStats(windows)
+        self.view = StorageView(0, {})
+        self.sync_lock = threading.Lock()
+        self.checked_at = 0.0
+        self._migrate_legacy_file()
+        self._seed_stats()
+        self.buffer = None
+        if STORAGE_WRITE_BEHIND if write_behind is None else write_behind:
+            self.buffer = WriteBehindBuffer(
+                self._write_rows,
+                dedup_window=STORAGE_DEDUP_WINDOW,
+                flush_interval=STORAGE_FLUSH_INTERVAL,
+                latest=self.view.latest
+            )
+
+    def _seed_stats(self):
+        """Replay stored history once so get_stats never has to scan it again"""
+        with self.sync_lock:
+            self._reseed()
+
+    def _reseed(self):
+        try:
+            rolling = RollingStats(self.windows)
+            last_rows = {}
+            cursor, rows = self.backend.snapshot()
+            # Rows come by source and time, so the last one of each source is its latest
+            for row in rows:
+                rolling.add(*row)
+                last_rows[row[0]] = row
+            # Not shared yet, so it is filled in place and published whole
+            rolling.expire(time.time())
+            self.rolling = rolling
+            self.view = StorageView(cursor, {source: (rate, ts) for source, rate, ts in last_rows.values()})
+        except Exception as e:
+            logger.error(f"Error seeding rate statistics: {e}")
+
+    def sync(self, force=False):
+        """Apply rows written since the last sync (by anyone) and return the current view
+
+        Without `force` this checks at most every STORAGE_SYNC_INTERVAL seconds
+        and never waits: while another thread syncs, readers keep the old view.
+        """
+        now = time.monotonic()
+        if not force and now - self.checked_at < STORAGE_SYNC_INTERVAL:
+            return self.view
+        if not self.sync_lock.acquire(blocking=force):
+            return self.view
+        try:
+            self.checked_at = now
+            view = self.view
+            cursor = view.cursor
+            latest = None
+            while True:
+                result = self.backend.changes(cursor)
+                if result is None:
+                    # Fell too far behind the backend's change feed: start over
+                    self._reseed()
+                    return self.view
+                cursor, rows = result
+                if not rows:
+                    break
+                if latest is None:
+                    latest = dict(view.latest)
+                self.rolling.add_many(rows)
+                for source, rate, ts in rows:
+                    current = latest.get(source)
+                    if current is None or ts >= current[1]:
+                        latest[source] = (rate, ts)
+            if latest is not None:
+                self.view = StorageView(cursor, latest)
+            return self.view
+        except Exception as e:
+            logger.error(f"Error syncing storage: {e}")
+            return self.view
+        finally:
+            self.sync_lock.release()
+
+    def _migrate_legacy_file(self):
+        """Import the old rates_data.json history into the backend once"""
+        try:
+            if self.backend.get_meta("legacy_migrated") or not os.path.exists(self.storage_file):
+                return
+            with open(self.storage_file, 'r', encoding='utf-8') as f:
+                data = json.load(f)
+
+            rows = []
+            for entry in data.get("history", []):
+                ts = datetime.datetime.fromisoformat(entry["timestamp"]).timestamp()
+                rows.append(("bcv", float(entry["rate"]), ts))
+            # Rows and marker in one write: a crash or a second process can't import them twice
+            if self.backend.append_once("legacy_migrated", self.storage_file, rows):
+                logger.info(f"Migrated {len(rows)} entries from {self.storage_file}")
+        except Exception as e:
+            logger.error(f"Error migrating storage file: {e}")
+
+    def _entry(self, source, rate, ts):
+        timestamp = datetime.datetime.fromtimestamp(ts).isoformat()
+        return {
+            "source": source,
+            "rate": rate,
+            "ts": ts,
+            "timestamp": timestamp,
+            # Slicing the ISO string is several times cheaper than strftime
+            "date": timestamp[:10]
+        }
+
+    def get_previous_rate(self, source="bcv"):
         """Get the previous rate for comparison"""
-        return self.data.get("anterior", 0.0)
-    
-    def save_rate(self, rate):
+        try:
+            latest = self.sync().latest.get(source)
+            buffered = self.buffer.latest(source) if self.buffer else None
+            # A value still in the buffer is newer than what's stored, unless another process wrote since
+            if buffered is not None and (latest is None or buffered[1] >= latest[1]):
+                latest = buffered
+            return latest[0] if latest else 0.0
+        except Exception as e:
+            logger.error(f"Error reading previous rate: {e}")
+            return 0.0
+
+    def get_baseline(self, source, day_start):
+        """Last rate stored before `day_start` (a timestamp), i.e. the previous day's close"""
+        try:
+            # Range reads go to the backend; sync first so the append log has indexed other processes' rows
+            self.sync()
+            rows = self.backend.range(source, until=day_start, limit=1)
+            return rows[-1][0] if rows else None
+        except Exception as e:
+            logger.error(f"Error reading baseline: {e}")
+            return None
+
+    def save_rate(self, rate, source="bcv"):
         """Save current rate and add to history"""
+        self.save_rates({source: rate})
+
+    def save_rates(self, rates):
+        """Save several {source: rate} values in one write"""
         try:
-            now = datetime.datetime.now()
-            
-            # Update previous rate
-            self.data["anterior"] = rate
-            
-            # Add to history
-            if "history" not in self.data:
-                self.data["history"] = []
-            
-            # Keep only last 30 days of history
-            self.data["history"].append({
-                "rate": rate,
-                "timestamp": now.isoformat(),
-                "date": now.strftime("%Y-%m-%d")
-            })
-            
-            # Limit history to last 30 entries
-            if len(self.data["history"]) > 30:
-                self.data["history"] = self.data["history"][-30:]
-            
-            self._save_data()
-            logger.debug(f"Rate saved: {rate}")
-            
+            now = time.time()
+            rows = [(source, float(rate), now) for source, rate in rates.items() if rate is not None]
+            if rows:
+                with WRITE_SECONDS.time("save"):
+                    if self.buffer:
+                        with span("storage.buffer", rows=len(rows)) as stage:
+                            stage.set(accepted=self.buffer.add(rows))
+                    else:
+                        self._write_rows(rows)
+            logger.debug(f"Rates saved: {rates}")
         except Exception as e:
             logger.error(f"Error saving rate: {e}")
-    
-    def get_history(self, days=7):
-        """Get rate history for specified number of days"""
+
+    def _write_rows(self, rows):
+        with WRITE_SECONDS.time("write"), span("storage.append", rows=len(rows)):
+            self.backend.append_many(rows)
+        # The rows come back through the change feed, with any written meanwhile
+        with span("storage.sync"):
+            self.sync(force=True)
+
+    def flush(self):
+        """Write the rates still waiting in the write-behind buffer"""
+        if self.buffer:
+            return self.buffer.flush()
+        return 0
+
+    def close(self):
+        """Flush for good (shutdown); later saves go straight to the backend"""
+        if self.buffer:
+            self.buffer.close()
+
+    def get_write_stats(self):
+        return self.buffer.get_stats() if self.buffer else None
+
+    def get_history(self, days=7, source="bcv"):
+        """Get rate history for the last `days` days"""
         try:
-            history = self.data.get("history", [])
-            # Return last N entries
-            return history[-days:] if len(history) >= days else history
+            since = time.time() - days * 86400
+            self.sync()
+            return [self._entry(source, rate, ts) for rate, ts in self.backend.range(source, since=since)]
         except Exception as e:
             logger.error(f"Error getting history: {e}")
             return []
-    
-    def get_stats(self):
+
+    def _candle(self, source, bucket, open_, high, low, close, count, total):
+        entry = self._entry(source, close, bucket)
+        entry.update(open=open_, high=high, low=low, close=close, average=total / count, count=count)
+        return entry
+
+    def iter_history(self, source, since=None, until=None, resolution="raw"):
+        """History rows for one source, oldest first, read lazily
+
+        "raw" yields the stored rates; "hour", "day" and "week" yield OHLC
+        buckets from the rollups, with "rate" set to the close so both kinds
+        of row chart the same way.
+        """
+        self.sync()
+        if resolution == "raw":
+            for rate, ts in self.backend.iter_range(source, since, until):
+                yield self._entry(source, rate, ts)
+        elif resolution in RESOLUTIONS:
+            for row in self.backend.rollups(source, resolution, since, until):
+                yield self._candle(source, *row)
+        else:
+            raise ValueError(f"Unknown resolution '{resolution}'")
+
+    def get_sources(self):
+        """List every source that has stored rates"""
+        try:
+            return list(self.sync().sources)
+        except Exception as e:
+            logger.error(f"Error listing sources: {e}")
+            return []
+
+    def version(self):
+        """Data version for response caching: changes when rates are saved"""
+        try:
+            return self.sync().cursor
+        except Exception as e:
+            logger.error(f"Error reading storage version: {e}")
+            return None
+
+    def save_status(self, status):
+        """Publish the bot's status for a dashboard running in another process"""
+        try:
+            exported_at = time.time()
+            self.backend.set_export("bot_status", json.dumps(dict(status, exported_at=exported_at), default=str))
+            self.backend.set_export("bot_status_at", str(exported_at))
+        except Exception as e:
+            logger.error(f"Error saving bot status: {e}")
+
+    def status_exported_at(self):
+        """Cheap change marker for the status saved by save_status"""
+        try:
+            return self.backend.get_export("bot_status_at")
+        except Exception as e:
+            logger.error(f"Error reading bot status: {e}")
+            return None
+
+    def save_metrics(self, text):
+        """Publish the bot's /metrics text for a dashboard running in another process"""
+        try:
+            self.backend.set_export("bot_metrics", text)
+        except Exception as e:
+            logger.error(f"Error saving bot metrics: {e}")
+
+    def save_traces(self, traces):
+        """Publish the bot's slow traces for a dashboard running in another process"""
+        try:
+            self.backend.set_export("bot_traces", json.dumps(traces, default=str))
+        except Exception as e:
+            logger.error(f"Error saving traces: {e}")
+
+    def load_traces(self):
+        try:
+            raw = self.backend.get_export("bot_traces")
+            return json.loads(raw) if raw else []
+        except Exception as e:
+            logger.error(f"Error reading traces: {e}")
+            return []
+
+    def load_metrics(self):
+        try:
+            return self.backend.get_export("bot_metrics")
+        except Exception as e:
+            logger.error(f"Error reading bot metrics: {e}")
+            return None
+
+    def load_status(self):
+        try:
+            raw = self.backend.get_export("bot_status")
+            return json.loads(raw) if raw else None
+        except Exception as e:
+            logger.error(f"Error reading bot status: {e}")
+            return None
+
+    def get_stats(self, source="bcv"):
         """Get statistics about rates"""
         try:
-            history = self.data.get("history", [])
-            if not history:
+            self.sync()
+            stats = self.rolling.summary(source, time.time())
+            if not stats:
                 return None
-            
-            rates = [entry["rate"] for entry in history]
-            
-            return {
-                "count": len(rates),
-                "min": min(rates),
-                "max": max(rates),
-                "avg": sum(rates) / len(rates),
-                "current": self.data.get("anterior", 0.0),
-                "first_date": history[0]["date"] if history else None,
-                "last_date": history[-1]["date"] if history else None
-            }
+
+            stats["first_date"] = datetime.datetime.fromtimestamp(stats.pop("first_ts")).strftime("%Y-%m-%d")
+            stats["last_date"] = datetime.datetime.fromtimestamp(stats.pop("last_ts")).strftime("%Y-%m-%d")
+            return stats
         except Exception as e:
             logger.error(f"Error calculating stats: {e}")
             return None
+
+_shared = None
+_shared_lock = threading.Lock()
+
+def shared_storage():
+    """The process-wide RateStorage used by the bot and the web interface"""
+    global _shared
+    with _shared_lock:
+        if _shared is None:
+            _shared = RateStorage()
+            # Normal interpreter exit; run.py also turns SIGTERM into one
+            atexit.register(_shared.close)
+        return _shared
@@ -0,0 +1,90 @@
+import gzip
+import json
+import hashlib
+import threading
+import logging
+
+try:
+    import brotli
+except ImportError:
+    brotli = None
+
+logger = logging.getLogger(__name__)
+
+# Below this size compression costs more than it saves
+MIN_COMPRESS_SIZE = 512
+
+class CachedResponse:
+    """A JSON payload serialized and compressed once, with one strong ETag per encoding"""
+
+    __slots__ = ("version", "bodies", "etags")
+
+    def __init__(self, version, payload):
+        self.version = version
+        body = json.dumps(payload, ensure_ascii=False, default=str).encode("utf-8")
+        tag = hashlib.blake2b(body, digest_size=16).hexdigest()
+        self.bodies = {"identity": body}
+        self.etags = {"identity": f'"{tag}"'}
+        if len(body) >= MIN_COMPRESS_SIZE:
+            self.bodies["gzip"] = gzip.compress(body, compresslevel=6)
+            self.etags["gzip"] = f'"{tag}-gz"'
+            if brotli is not None:
+                self.bodies["br"] = brotli.compress(body, quality=5)
+                self.etags["br"] = f'"{tag}-br"'
+
+    def encoding_for(self, accept_encoding):
+        accepted = {part.split(";")[0].strip() for part in (accept_encoding or "").split(",")}
+        for encoding in ("br", "gzip"):
+            if encoding in self.bodies and encoding in accepted:
+                return encoding
+        return "identity"
+
+class ResponseCache:
+    """JSON responses rebuilt only when the version of the data behind them changes"""
+
+    def __init__(self):
+        self.entries = {}
+        self.lock = threading.Lock()
+        self.build_locks = {}
+        self.stats = {"builds": 0, "served": 0, "not_modified": 0}
+
+    def _entry(self, key, version, build):
+        entry = self.entries.get(key)
+        if entry is not None and entry.version == version:
+            return entry
+        with self.lock:
+            build_lock = self.build_locks.setdefault(key, threading.Lock())
+        with build_lock:
+            # Another request may have rebuilt it while we waited
+            entry = self.entries.get(key)
+            if entry is None or entry.version != version:
+                entry = CachedResponse(version, build())
+                self.entries[key] = entry
+                self._count("builds")
+            return entry
+
+    def _count(self, name):
+        with self.lock:
+            self.stats[name] += 1
+
+    def respond(self, key, version, build, if_none_match=None, accept_encoding=None):
+        """(status, body, headers) for a request; build() returns the payload to cache"""
+        entry = self._entry(key, version, build)
+        encoding = entry.encoding_for(accept_encoding)
+        etag = entry.etags[encoding]
+        headers = {
+            "ETag": etag,
+            "Cache-Control": "no-cache",
+            "Vary": "Accept-Encoding",
+        }
+        if encoding != "identity":
+            headers["Content-Encoding"] = encoding
+        if if_none_match and (if_none_match.strip() == "*" or etag in [t.strip() for t in if_none_match.split(",")]):
+            self._count("not_modified")
+            return 304, b"", headers
+        self._count("served")
+        return 200, entry.bodies[encoding], headers
+
+    def get_stats(self):
+        with self.lock:
+            return dict(self.stats)
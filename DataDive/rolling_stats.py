@@ -0,0 +1,211 @@
+import math
+import time
+import threading
+from collections import deque
+
+DEFAULT_WINDOWS = {
+    "1d": 86400,
+    "7d": 7 * 86400,
+    "30d": 30 * 86400
+}
+
+class WindowStats:
+    """Count/min/max/mean/variance/change over a sliding time window, O(1) amortized"""
+
+    def __init__(self, span):
+        self.span = span
+        self.points = deque()
+        self.mins = deque()
+        self.maxs = deque()
+        self.shift = None
+        self.total = 0.0
+        self.total_sq = 0.0
+
+    def copy(self):
+        other = WindowStats(self.span)
+        other.points = deque(self.points)
+        other.mins = deque(self.mins)
+        other.maxs = deque(self.maxs)
+        other.shift = self.shift
+        other.total = self.total
+        other.total_sq = self.total_sq
+        return other
+
+    def add(self, rate, ts):
+        if self.shift is None:
+            # Summing offsets from a reference value avoids cancellation in the variance
+            self.shift = rate
+        x = rate - self.shift
+        self.points.append((ts, rate))
+        self.total += x
+        self.total_sq += x * x
+        # Monotonic deques: the front is always the window min/max
+        while self.mins and self.mins[-1][1] > rate:
+            self.mins.pop()
+        self.mins.append((ts, rate))
+        while self.maxs and self.maxs[-1][1] < rate:
+            self.maxs.pop()
+        self.maxs.append((ts, rate))
+
+    def expire(self, now):
+        cutoff = now - self.span
+        points = self.points
+        while points and points[0][0] < cutoff:
+            ts, rate = points.popleft()
+            x = rate - self.shift
+            self.total -= x
+            self.total_sq -= x * x
+            if self.mins and self.mins[0][0] <= ts:
+                self.mins.popleft()
+            if self.maxs and self.maxs[0][0] <= ts:
+                self.maxs.popleft()
+        if not points:
+            self.shift = None
+            self.total = self.total_sq = 0.0
+
+    def summary(self, now):
+        """Like expire(now) then summary, without modifying the window
+
+        Only the points that expired since the last write are skipped here.
+        """
+        cutoff = now - self.span
+        points, mins, maxs = self.points, self.mins, self.maxs
+        total, total_sq = self.total, self.total_sq
+        skip = lo = hi = 0
+        for ts, rate in points:
+            if ts >= cutoff:
+                break
+            x = rate - self.shift
+            total -= x
+            total_sq -= x * x
+            skip += 1
+            if lo < len(mins) and mins[lo][0] <= ts:
+                lo += 1
+            if hi < len(maxs) and maxs[hi][0] <= ts:
+                hi += 1
+        n = len(points) - skip
+        if n <= 0:
+            return {"count": 0}
+        mean = total / n
+        variance = max(0.0, total_sq / n - mean * mean)
+        first = points[skip][1]
+        last = points[-1][1]
+        return {
+            "count": n,
+            "min": mins[lo][1],
+            "max": maxs[hi][1],
+            "mean": self.shift + mean,
+            "variance": variance,
+            "change_pct": (last - first) / first * 100 if first else 0.0
+        }
+
+class SourceStats:
+    """All-time and windowed aggregates for one source"""
+
+    def __init__(self, windows, ewma_alpha):
+        self.ewma_alpha = ewma_alpha
+        self.count = 0
+        self.min = None
+        self.max = None
+        self.mean = 0.0
+        self.m2 = 0.0
+        self.ewma = None
+        self.first_ts = None
+        self.last_ts = None
+        self.current = None
+        self.windows = {name: WindowStats(span) for name, span in windows.items()}
+
+    def copy(self):
+        other = SourceStats({}, self.ewma_alpha)
+        other.__dict__.update(self.__dict__)
+        other.windows = {name: window.copy() for name, window in self.windows.items()}
+        return other
+
+    def add(self, rate, ts):
+        # Welford's update for the all-time mean and variance
+        self.count += 1
+        delta = rate - self.mean
+        self.mean += delta / self.count
+        self.m2 += delta * (rate - self.mean)
+        self.min = rate if self.min is None else min(self.min, rate)
+        self.max = rate if self.max is None else max(self.max, rate)
+        self.ewma = rate if self.ewma is None else self.ewma_alpha * rate + (1 - self.ewma_alpha) * self.ewma
+        if self.first_ts is None:
+            self.first_ts = ts
+        if self.last_ts is None or ts >= self.last_ts:
+            self.last_ts = ts
+            self.current = rate
+        for window in self.windows.values():
+            window.add(rate, ts)
+
+    def expire(self, now):
+        for window in self.windows.values():
+            window.expire(now)
+
+    def summary(self, now):
+        variance = self.m2 / self.count if self.count else 0.0
+        windows = {name: window.summary(now) for name, window in self.windows.items()}
+        return {
+            "count": self.count,
+            "min": self.min,
+            "max": self.max,
+            "avg": self.mean,
+            "variance": variance,
+            "stddev": math.sqrt(variance),
+            "ewma": self.ewma,
+            "current": self.current,
+            "first_ts": self.first_ts,
+            "last_ts": self.last_ts,
+            "windows": windows
+        }
+
+class RollingStats:
+    """Per-source rolling aggregators updated as each rate is saved
+
+    Copy-on-write once shared: add_many applies a batch to copies of the
+    sources it touches and swaps the map in, so summary() reads without a
+    lock. add() and expire() modify in place and are for an instance that
+    is still being built by one thread.
+    """
+
+    def __init__(self, windows=None, ewma_alpha=0.2):
+        self.window_spans = dict(windows or DEFAULT_WINDOWS)
+        self.ewma_alpha = ewma_alpha
+        self.sources = {}
+        # Serializes writers only
+        self.lock = threading.Lock()
+
+    def _stats(self, sources, source):
+        stats = sources.get(source)
+        if stats is None:
+            stats = sources[source] = SourceStats(self.window_spans, self.ewma_alpha)
+        return stats
+
+    def add(self, source, rate, ts):
+        self._stats(self.sources, source).add(rate, ts)
+
+    def expire(self, now):
+        for stats in self.sources.values():
+            stats.expire(now)
+
+    def add_many(self, rows, now=None):
+        now = time.time() if now is None else now
+        with self.lock:
+            sources = dict(self.sources)
+            copied = set()
+            for source, rate, ts in rows:
+                if source not in copied:
+                    if source in sources:
+                        sources[source] = sources[source].copy()
+                    copied.add(source)
+                self._stats(sources, source).add(rate, ts)
+            # Evict on the copies so readers only skip what expired since
+            for source in copied:
+                sources[source].expire(now)
+            self.sources = sources
+
+    def summary(self, source, now):
+        stats = self.sources.get(source)
+        if stats is None or not stats.count:
+            return None
+        return stats.summary(now)
@@ -6,23 +6,36 @@ This script starts both the Telegram bot and web interface
 
 import os
 import sys
+import signal
 import threading
 import time
 import logging
-from main import start_bot, dollar_bot
-from web_interface import start_web_interface, set_bot_instance
+from log_access import setup_logging
+from main import start_bot, dollar_bot, storage
+from web_interface import start_web_interface, set_bot_instance, set_webhook_ingest
 
-# Configure logging
-logging.basicConfig(
-    level=logging.INFO,
-    format='%(asctime)s - %(name)s - %(levelname)s - %(message)s',
-    handlers=[
-        logging.FileHandler('bot.log'),
-        logging.StreamHandler()
-    ]
-)
+# Configure logging (rotating bot.log plus the in-memory ring for /api/logs)
+setup_logging()
 logger = logging.getLogger(__name__)
 
+# "polling" (telebot, one thread), "async" (AsyncTeleBot + aiohttp)
+# or "webhook" (updates posted to the Flask app, processed by a worker pool)
+BOT_MODE = os.getenv("BOT_MODE", "polling")
+# "builtin" (Flask dev server on a thread of this process), "waitress" or
+# "gunicorn" (a separate dashboard process supervised from here)
+WEB_SERVER = os.getenv("WEB_SERVER", "builtin")
+
+def handle_sigterm(signum, frame):
+    # Unwind through main()'s shutdown path, as Ctrl+C does
+    raise SystemExit(0)
+
+def shutdown(supervisor):
+    """Stop the jobs, write the buffered rates and stop the dashboard process"""
+    dollar_bot.stop_scheduler()
+    storage.close()
+    if supervisor:
+        supervisor.stop()
+
 def main():
     """Main entry point"""
     logger.info("Starting Venezuelan Dollar Bot Application")
@@ -60,14 +73,32 @@ def main():
         sys.exit(1)
     
     logger.info(f"Configuration loaded - Chat ID: {chat_id}")
+    # Replit and most process managers stop the bot with SIGTERM
+    signal.signal(signal.SIGTERM, handle_sigterm)
     
     # Set bot instance for web interface
     set_bot_instance(dollar_bot)
+    if BOT_MODE == "webhook":
+        from main import create_webhook_ingest
+        set_webhook_ingest(create_webhook_ingest())
     
-    # Start web interface in a separate thread
-    web_thread = threading.Thread(target=start_web_interface, daemon=True)
-    web_thread.start()
-    logger.info("Web interface thread started")
+    web_server = WEB_SERVER
+    if BOT_MODE == "webhook" and web_server != "builtin":
+        # Telegram posts updates to the Flask app, which must live next to the bot
+        logger.warning("Webhook mode serves the dashboard in-process; ignoring WEB_SERVER")
+        web_server = "builtin"
+
+    supervisor = None
+    web_thread = None
+    if web_server == "builtin":
+        # Start web interface in a separate thread
+        web_thread = threading.Thread(target=start_web_interface, daemon=True)
+        web_thread.start()
+        logger.info("Web interface thread started")
+    else:
+        from web_server import WebSupervisor
+        supervisor = WebSupervisor(web_server).start()
+        logger.info(f"Web interface process started ({web_server})")
     
     # Give web interface time to start
     time.sleep(2)
@@ -75,29 +106,40 @@ def main():
     # Print startup information
     print("\n🤖 Venezuelan Dollar Bot Started Successfully!")
     print("=" * 50)
-    print(f"📱 Telegram Bot: Active")
-    print(f"🌐 Web Dashboard: http://localhost:5000")
+    print(f"📱 Telegram Bot: Active ({BOT_MODE})")
+    print(f"🌐 Web Dashboard: http://localhost:{os.getenv('PORT', '5000')} ({web_server})")
     print(f"💬 Chat ID: {chat_id}")
     print(f"📅 Daily Updates: Weekdays at 9:00 AM")
     print("=" * 50)
     print("\nPress Ctrl+C to stop the bot")
     print("\nCommands available in Telegram:")
-    print("  /start - Start the bot")
+    print("  /start - Start the bot and subscribe to updates")
+    print("  /stop - Unsubscribe from updates")
     print("  /tasas - Get current exchange rates")
     print("  /help - Show help message")
     print("\n")
     
     try:
         # Start the Telegram bot (this will block)
-        start_bot()
-    except KeyboardInterrupt:
-        logger.info("Shutdown requested by user")
+        if BOT_MODE == "async":
+            from async_bot import start_async_bot
+            start_async_bot()
+        elif BOT_MODE == "webhook":
+            from main import register_webhook
+            register_webhook()
+            # Updates now arrive through the web interface thread
+            web_thread.join()
+        else:
+            start_bot()
+    except (KeyboardInterrupt, SystemExit):
+        logger.info("Shutdown requested")
         print("\n\n👋 Bot shutting down...")
-        dollar_bot.stop_scheduler()
+        shutdown(supervisor)
         sys.exit(0)
     except Exception as e:
         logger.error(f"Fatal error: {e}")
         print(f"\n❌ Fatal error: {e}")
+        shutdown(supervisor)
         sys.exit(1)
 
 if __name__ == "__main__":
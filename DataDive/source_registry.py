@@ -0,0 +1,239 @@
+import time
+import asyncio
+import threading
+import logging
+from metrics import histogram
+from tracing import span
+
+logger = logging.getLogger(__name__)
+
+FETCH_SECONDS = histogram("dollarbot_source_fetch_seconds", "Upstream fetch time per source", ("source", "outcome"))
+
+HEALTHY = "healthy"
+DEGRADED = "degraded"
+DOWN = "down"
+STATE_RANK = {HEALTHY: 0, DEGRADED: 1, DOWN: 2}
+
+class SourceUnavailable(Exception):
+    """Raised when every adapter of a feed failed or is cooling down"""
+
+class SourceHealth:
+    """EWMA latency and error rate of one adapter, plus when it last answered
+
+    After `down_after` failures in a row the source is down: it is skipped for
+    a cool-down that doubles on every failed probe (up to `max_cooldown`), then
+    a single call is let through to see whether it came back. A source that is
+    up but slow or failing often is degraded and tried after the healthy ones.
+    """
+
+    def __init__(self, alpha=0.2, down_after=3, cooldown=30.0, max_cooldown=600.0,
+                 slow_after=3.0, error_threshold=0.5, clock=time.monotonic):
+        self.alpha = alpha
+        self.down_after = down_after
+        self.cooldown = cooldown
+        self.max_cooldown = max_cooldown
+        self.slow_after = slow_after
+        self.error_threshold = error_threshold
+        self.clock = clock
+        self.latency = None
+        self.error_rate = 0.0
+        self.calls = 0
+        self.failures = 0
+        self.skipped = 0
+        self.consecutive = 0
+        self.trips = 0
+        self.retry_at = None
+        self.probing = False
+        self.last_success = None
+        self.last_error = None
+        self.last_error_at = None
+
+    @property
+    def state(self):
+        if self.retry_at is not None:
+            return DOWN
+        if self.error_rate >= self.error_threshold or (self.latency or 0) > self.slow_after:
+            return DEGRADED
+        return HEALTHY
+
+    @property
+    def rank(self):
+        # A down source whose cool-down is over competes on priority again, so
+        # the probe reaches a preferred provider even while a fallback answers
+        if self.retry_at is not None and not self.probing and self.clock() >= self.retry_at:
+            return STATE_RANK[HEALTHY]
+        return STATE_RANK[self.state]
+
+    def allow(self):
+        """True if a call may go out now; a down source lets one probe through per cool-down"""
+        if self.retry_at is None:
+            return True
+        if self.probing or self.clock() < self.retry_at:
+            self.skipped += 1
+            return False
+        self.probing = True
+        return True
+
+    def _observe(self, elapsed, failed):
+        self.calls += 1
+        self.latency = elapsed if self.latency is None else (1 - self.alpha) * self.latency + self.alpha * elapsed
+        self.error_rate = (1 - self.alpha) * self.error_rate + self.alpha * (1.0 if failed else 0.0)
+        self.probing = False
+
+    def record_success(self, elapsed):
+        recovered = self.retry_at is not None
+        self._observe(elapsed, False)
+        self.consecutive = 0
+        self.trips = 0
+        self.retry_at = None
+        self.last_success = time.time()
+        return recovered
+
+    def record_failure(self, elapsed, error):
+        """Returns the cool-down in seconds when this failure takes the source down"""
+        self._observe(elapsed, True)
+        self.failures += 1
+        self.consecutive += 1
+        self.last_error = error
+        self.last_error_at = time.time()
+        if self.retry_at is None and self.consecutive < self.down_after:
+            return None
+        cooldown = min(self.max_cooldown, self.cooldown * (2 ** self.trips))
+        self.trips += 1
+        self.retry_at = self.clock() + cooldown
+        return cooldown
+
+    def describe(self, max_age):
+        now = time.time()
+        age = now - self.last_success if self.last_success is not None else None
+        return {
+            'state': self.state,
+            'latency_ms': round(self.latency * 1000, 1) if self.latency is not None else None,
+            'error_rate': round(self.error_rate, 3),
+            'calls': self.calls,
+            'failures': self.failures,
+            'skipped': self.skipped,
+            'age': round(age, 1) if age is not None else None,
+            'fresh': age is not None and age <= max_age,
+            'last_error': self.last_error,
+            'retry_in': round(max(0.0, self.retry_at - self.clock()), 1) if self.retry_at is not None else None
+        }
+
+class SourceRegistry:
+    """Adapters grouped by feed ('bcv', 'p2p', ...), tried best-first with fallback
+
+    loader(feed) gives a func(timeout) for RateFetcher/SnapshotCache: it walks
+    the feed's adapters from healthiest to least healthy within the timeout,
+    skipping the ones that are down, so a dead host costs nothing instead of
+    a whole timeout; when nothing is left it raises SourceUnavailable right
+    away and the cache can fall back to its last good value.
+    """
+
+    def __init__(self, **health_options):
+        self.health_options = health_options
+        self.adapters = {}
+        self.health = {}
+        self.feeds = {}
+        self.version = 0
+        self.lock = threading.Lock()
+
+    def register(self, adapter):
+        with self.lock:
+            self.adapters[adapter.name] = adapter
+            self.health[adapter.name] = SourceHealth(**self.health_options)
+            self.feeds.setdefault(adapter.feed, []).append(adapter.name)
+        return adapter
+
+    def ranked(self, feed):
+        """The feed's adapters, healthiest first; priority breaks ties within a state"""
+        with self.lock:
+            def key(name):
+                health = self.health[name]
+                return (health.rank, self.adapters[name].priority,
+                        health.error_rate, health.latency or 0.0)
+            return [self.adapters[name] for name in sorted(self.feeds.get(feed, ()), key=key)]
+
+    def _allow(self, name):
+        with self.lock:
+            return self.health[name].allow()
+
+    def record(self, name, elapsed, error=None):
+        FETCH_SECONDS.observe(elapsed, name, "ok" if error is None else "error")
+        with self.lock:
+            health = self.health[name]
+            self.version += 1
+            if error is None:
+                recovered = health.record_success(elapsed)
+                cooldown = None
+            else:
+                recovered = False
+                cooldown = health.record_failure(elapsed, error)
+        if recovered:
+            logger.info(f"Source {name} recovered")
+        if cooldown is not None:
+            logger.warning(f"Source {name} is down ({error}), skipping it for {cooldown:.0f}s")
+
+    def _candidates(self, feed, timeout):
+        deadline = time.monotonic() + timeout
+        for adapter in self.ranked(feed):
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                break
+            if self._allow(adapter.name):
+                yield adapter, min(adapter.timeout, remaining)
+
+    def fetch(self, feed, timeout):
+        """Data for the feed from the best adapter that answers within timeout"""
+        errors = []
+        for adapter, budget in self._candidates(feed, timeout):
+            start = time.monotonic()
+            try:
+                with span(f"adapter:{adapter.name}", budget=round(budget, 3)):
+                    value = adapter.fetch(budget)
+            except Exception as e:
+                error = str(e) or e.__class__.__name__
+                self.record(adapter.name, time.monotonic() - start, error)
+                errors.append(f"{adapter.name}: {error}")
+                continue
+            self.record(adapter.name, time.monotonic() - start)
+            return value
+        raise SourceUnavailable("; ".join(errors) or f"every source of {feed} is down")
+
+    async def fetch_async(self, feed, timeout, get_json):
+        """fetch() for the asyncio bot; JSON adapters go through the get_json coroutine"""
+        errors = []
+        for adapter, budget in self._candidates(feed, timeout):
+            start = time.monotonic()
+            try:
+                with span(f"adapter:{adapter.name}", budget=round(budget, 3)):
+                    value = await asyncio.wait_for(adapter.fetch_async(get_json, budget), budget)
+            except asyncio.CancelledError:
+                # Cancelled from outside (a caller's deadline): still settle the
+                # call, or a probe of a down source would stay open for good
+                self.record(adapter.name, time.monotonic() - start, "cancelled")
+                raise
+            except Exception as e:
+                error = "timeout" if isinstance(e, asyncio.TimeoutError) else str(e) or e.__class__.__name__
+                self.record(adapter.name, time.monotonic() - start, error)
+                errors.append(f"{adapter.name}: {error}")
+                continue
+            self.record(adapter.name, time.monotonic() - start)
+            return value
+        raise SourceUnavailable("; ".join(errors) or f"every source of {feed} is down")
+
+    def loader(self, feed):
+        def load(timeout):
+            return self.fetch(feed, timeout)
+        return load
+
+    def async_loader(self, feed, get_json):
+        async def load(timeout):
+            return await self.fetch_async(feed, timeout, get_json)
+        return load
+
+    def get_status(self):
+        with self.lock:
+            return {
+                name: dict(self.health[name].describe(adapter.max_age), feed=adapter.feed, label=adapter.label)
+                for name, adapter in self.adapters.items()
+            }
@@ -0,0 +1,494 @@
+import os
+import json
+import bisect
+import itertools
+import sqlite3
+import threading
+import logging
+from collections import deque
+
+try:
+    import fcntl
+except ImportError:
+    # Windows: appends are still serialized within the process
+    fcntl = None
+from rate_history import RESOLUTIONS, Candle, rollup_batch, bucket_start
+
+logger = logging.getLogger(__name__)
+
+class SQLiteBackend:
+    """Rate history in SQLite (WAL mode) indexed by source and timestamp"""
+
+    def __init__(self, path="rates.db"):
+        self.path = path
+        self.local = threading.local()
+        self.write_lock = threading.Lock()
+        conn = self._conn()
+        conn.execute("PRAGMA journal_mode=WAL")
+        conn.executescript("""
+            CREATE TABLE IF NOT EXISTS rates (
+                id INTEGER PRIMARY KEY,
+                source TEXT NOT NULL,
+                rate REAL NOT NULL,
+                ts REAL NOT NULL
+            );
+            CREATE INDEX IF NOT EXISTS idx_rates_source_ts ON rates (source, ts);
+            CREATE INDEX IF NOT EXISTS idx_rates_ts ON rates (ts);
+            CREATE TABLE IF NOT EXISTS meta (
+                key TEXT PRIMARY KEY,
+                value TEXT
+            );
+            CREATE TABLE IF NOT EXISTS rollups (
+                source TEXT NOT NULL,
+                resolution TEXT NOT NULL,
+                bucket REAL NOT NULL,
+                open REAL, high REAL, low REAL, close REAL,
+                open_ts REAL, close_ts REAL,
+                count INTEGER, total REAL,
+                PRIMARY KEY (source, resolution, bucket)
+            ) WITHOUT ROWID;
+        """)
+        conn.commit()
+        self._build_rollups(conn)
+
+    def _build_rollups(self, conn):
+        """Backfill the rollups from rows stored before they existed, once"""
+        with self.write_lock:
+            # IMMEDIATE: a dashboard process opening the same file waits instead of building twice
+            conn.execute("BEGIN IMMEDIATE")
+            try:
+                if conn.execute("SELECT value FROM meta WHERE key = 'rollups_built'").fetchone():
+                    conn.rollback()
+                    return
+                conn.execute("DELETE FROM rollups")
+                batch = []
+                for row in conn.execute("SELECT source, rate, ts FROM rates ORDER BY source, ts"):
+                    batch.append(row)
+                    if len(batch) >= 50000:
+                        self._upsert_rollups(conn, batch)
+                        batch = []
+                self._upsert_rollups(conn, batch)
+                conn.execute("INSERT OR REPLACE INTO meta (key, value) VALUES ('rollups_built', '1')")
+                conn.commit()
+            except Exception:
+                conn.rollback()
+                raise
+
+    def _upsert_rollups(self, conn, rows):
+        # SET expressions see the row before the update, so the CASEs compare old timestamps
+        conn.executemany("""
+            INSERT INTO rollups (source, resolution, bucket, open, high, low, close, open_ts, close_ts, count, total)
+            VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
+            ON CONFLICT (source, resolution, bucket) DO UPDATE SET
+                open = CASE WHEN excluded.open_ts < open_ts THEN excluded.open ELSE open END,
+                open_ts = MIN(open_ts, excluded.open_ts),
+                high = MAX(high, excluded.high),
+                low = MIN(low, excluded.low),
+                close = CASE WHEN excluded.close_ts >= close_ts THEN excluded.close ELSE close END,
+                close_ts = MAX(close_ts, excluded.close_ts),
+                count = count + excluded.count,
+                total = total + excluded.total
+        """, [key + candle.row() for key, candle in rollup_batch(rows).items()])
+
+    def _conn(self):
+        # sqlite3 connections can't be shared across threads, keep one per thread
+        conn = getattr(self.local, "conn", None)
+        if conn is None:
+            conn = sqlite3.connect(self.path, timeout=10)
+            conn.execute("PRAGMA synchronous=NORMAL")
+            self.local.conn = conn
+        return conn
+
+    def append_many(self, rows):
+        """Insert (source, rate, ts) rows in one transaction"""
+        with self.write_lock:
+            conn = self._conn()
+            with conn:
+                conn.executemany("INSERT INTO rates (source, rate, ts) VALUES (?, ?, ?)", rows)
+                self._upsert_rollups(conn, rows)
+
+    def append_once(self, key, value, rows):
+        """Insert rows and set meta `key` in one transaction, unless `key` is already set
+
+        Returns False when another process (or an earlier run) got there first.
+        """
+        with self.write_lock:
+            conn = self._conn()
+            # IMMEDIATE: two processes migrating at once can't both pass the check
+            conn.execute("BEGIN IMMEDIATE")
+            try:
+                if conn.execute("SELECT value FROM meta WHERE key = ?", (key,)).fetchone():
+                    conn.rollback()
+                    return False
+                conn.executemany("INSERT INTO rates (source, rate, ts) VALUES (?, ?, ?)", rows)
+                self._upsert_rollups(conn, rows)
+                conn.execute("INSERT OR REPLACE INTO meta (key, value) VALUES (?, ?)", (key, value))
+                conn.commit()
+                return True
+            except Exception:
+                conn.rollback()
+                raise
+
+    def latest(self, source):
+        row = self._conn().execute(
+            "SELECT rate, ts FROM rates WHERE source = ? ORDER BY ts DESC LIMIT 1", (source,)
+        ).fetchone()
+        return row
+
+    def range(self, source, since=None, until=None, limit=None):
+        """(rate, ts) rows for source in [since, until), oldest first"""
+        query = "SELECT rate, ts FROM rates WHERE source = ?"
+        params = [source]
+        if since is not None:
+            query += " AND ts >= ?"
+            params.append(since)
+        if until is not None:
+            query += " AND ts < ?"
+            params.append(until)
+        if limit is not None:
+            # Newest `limit` rows, returned in chronological order
+            query = f"SELECT rate, ts FROM ({query} ORDER BY ts DESC LIMIT ?) ORDER BY ts"
+            params.append(limit)
+        else:
+            query += " ORDER BY ts"
+        return self._conn().execute(query, params).fetchall()
+
+    def iter_range(self, source, since=None, until=None):
+        """Like range() without a limit, but rows come straight off the cursor"""
+        query = "SELECT rate, ts FROM rates WHERE source = ?"
+        params = [source]
+        if since is not None:
+            query += " AND ts >= ?"
+            params.append(since)
+        if until is not None:
+            query += " AND ts < ?"
+            params.append(until)
+        return self._conn().execute(query + " ORDER BY ts", params)
+
+    def rollups(self, source, resolution, since=None, until=None):
+        """(bucket, open, high, low, close, count, total) rows, oldest first"""
+        query = "SELECT bucket, open, high, low, close, count, total FROM rollups WHERE source = ? AND resolution = ?"
+        params = [source, resolution]
+        if since is not None:
+            query += " AND bucket >= ?"
+            params.append(bucket_start(since, resolution))
+        if until is not None:
+            query += " AND bucket < ?"
+            params.append(until)
+        return self._conn().execute(query + " ORDER BY bucket", params)
+
+    def aggregate(self, source, since=None):
+        """(count, min, max, avg, first_ts, last_ts) for source"""
+        query = "SELECT COUNT(*), MIN(rate), MAX(rate), AVG(rate), MIN(ts), MAX(ts) FROM rates WHERE source = ?"
+        params = [source]
+        if since is not None:
+            query += " AND ts >= ?"
+            params.append(since)
+        return self._conn().execute(query, params).fetchone()
+
+    def sources(self):
+        # Hop through the (source, ts) index one source at a time instead of
+        # scanning every row like SELECT DISTINCT would
+        return [row[0] for row in self._conn().execute("""
+            WITH RECURSIVE s(source) AS (
+                SELECT MIN(source) FROM rates
+                UNION ALL
+                SELECT (SELECT MIN(source) FROM rates WHERE source > s.source) FROM s WHERE s.source IS NOT NULL
+            )
+            SELECT source FROM s WHERE source IS NOT NULL
+        """)]
+
+    def count(self):
+        return self._conn().execute("SELECT COUNT(*) FROM rates").fetchone()[0]
+
+    def version(self):
+        """Changes whenever a row is added, also by other processes"""
+        return self._conn().execute("SELECT MAX(id) FROM rates").fetchone()[0] or 0
+
+    def snapshot(self):
+        """(cursor, rows): every stored (source, rate, ts) up to the cursor, by source and time"""
+        cursor = self.version()
+        rows = self._conn().execute(
+            "SELECT source, rate, ts FROM rates WHERE id <= ? ORDER BY source, ts", (cursor,)
+        )
+        return cursor, rows
+
+    def changes(self, cursor, limit=10000):
+        """(cursor, rows) added after `cursor` by any thread or process, in commit order"""
+        rows = self._conn().execute(
+            "SELECT id, source, rate, ts FROM rates WHERE id > ? ORDER BY id LIMIT ?", (cursor, limit)
+        ).fetchall()
+        if not rows:
+            return cursor, []
+        return rows[-1][0], [row[1:] for row in rows]
+
+    def get_meta(self, key, default=None):
+        row = self._conn().execute("SELECT value FROM meta WHERE key = ?", (key,)).fetchone()
+        return row[0] if row else default
+
+    def set_meta(self, key, value):
+        with self.write_lock:
+            conn = self._conn()
+            with conn:
+                conn.execute("INSERT OR REPLACE INTO meta (key, value) VALUES (?, ?)", (key, value))
+
+    # Status exports are rewritten often; a meta row is replaced in place
+    def get_export(self, key, default=None):
+        return self.get_meta(key, default)
+
+    def set_export(self, key, value):
+        self.set_meta(key, value)
+
+class AppendLogBackend:
+    """Rate history as an append-only JSON-lines file with in-memory per-source indexes
+
+    Several processes can share the file: appends hold an exclusive flock,
+    and each process indexes what the others wrote before adding its own.
+    """
+
+    def __init__(self, path="rates.log", recent=10000):
+        self.path = path
+        self.lock = threading.Lock()
+        self.index = {}
+        # (source, resolution) -> (sorted bucket starts, {bucket: Candle})
+        self.rollup_index = {}
+        self.meta = {}
+        # Bytes of the file indexed so far, rows indexed so far, and the last
+        # rows with their sequence numbers for changes()
+        self.offset = 0
+        self.sequence = 0
+        self.recent = deque(maxlen=recent)
+        with self.lock:
+            self._read_new()
+
+    def _read_new(self):
+        """Index the complete lines past self.offset (all of them on the first call)"""
+        try:
+            size = os.path.getsize(self.path)
+        except FileNotFoundError:
+            return
+        if size <= self.offset:
+            return
+        with open(self.path, "rb") as f:
+            f.seek(self.offset)
+            remaining = size - self.offset
+            pending = b""
+            while remaining > 0:
+                chunk = f.read(min(remaining, 1 << 20))
+                if not chunk:
+                    break
+                remaining -= len(chunk)
+                data = pending + chunk
+                # A line without its newline is still being written by another process
+                end = data.rfind(b"\n") + 1
+                pending = data[end:]
+                self.offset += end
+                for line in data[:end].splitlines():
+                    self._apply(line)
+
+    def _apply(self, line):
+        if not line.strip():
+            return
+        try:
+            entry = json.loads(line)
+        except ValueError:
+            # A torn line from a crash mid-write; the rest is still good
+            logger.warning(f"Skipping corrupt line in {self.path}")
+            return
+        if "meta" in entry:
+            self.meta[entry["meta"]] = entry["value"]
+        else:
+            self._index(entry["s"], entry["r"], entry["t"])
+
+    def _index(self, source, rate, ts):
+        for resolution in RESOLUTIONS:
+            buckets, candles = self.rollup_index.setdefault((source, resolution), ([], {}))
+            bucket = bucket_start(ts, resolution)
+            candle = candles.get(bucket)
+            if candle is not None:
+                candle.add(rate, ts)
+                continue
+            candles[bucket] = Candle(rate, ts)
+            if not buckets or bucket > buckets[-1]:
+                buckets.append(bucket)
+            else:
+                bisect.insort(buckets, bucket)
+        self.sequence += 1
+        self.recent.append((self.sequence, source, rate, ts))
+        timestamps, rates = self.index.setdefault(source, ([], []))
+        if not timestamps or ts >= timestamps[-1]:
+            timestamps.append(ts)
+            rates.append(rate)
+        else:
+            pos = bisect.bisect_right(timestamps, ts)
+            timestamps.insert(pos, ts)
+            rates.insert(pos, rate)
+
+    def _write(self, entries, unless=None):
+        """Append entries as one write under the file lock; call with self.lock held
+
+        With `unless`, nothing is written if that meta key is set once the
+        other processes' rows are indexed; returns whether it wrote.
+        """
+        data = "".join(json.dumps(e, ensure_ascii=False) + "\n" for e in entries).encode("utf-8")
+        with open(self.path, "ab") as f:
+            if fcntl:
+                fcntl.flock(f, fcntl.LOCK_EX)
+            try:
+                # Other processes' rows come first, so the sequence matches the file order
+                self._read_new()
+                if unless is not None and unless in self.meta:
+                    return False
+                if f.seek(0, os.SEEK_END) != self.offset:
+                    # Leftover of a torn write: end it so it can't swallow our first line
+                    data = b"\n" + data
+                f.write(data)
+                f.flush()
+                self.offset = f.tell()
+                return True
+            finally:
+                if fcntl:
+                    fcntl.flock(f, fcntl.LOCK_UN)
+
+    def append_many(self, rows):
+        with self.lock:
+            self._write([{"s": source, "r": rate, "t": ts} for source, rate, ts in rows])
+            for source, rate, ts in rows:
+                self._index(source, rate, ts)
+
+    def append_once(self, key, value, rows):
+        """Append rows and meta `key` as one write, unless `key` is already set"""
+        with self.lock:
+            entries = [{"s": source, "r": rate, "t": ts} for source, rate, ts in rows]
+            if not self._write(entries + [{"meta": key, "value": value}], unless=key):
+                return False
+            for source, rate, ts in rows:
+                self._index(source, rate, ts)
+            self.meta[key] = value
+            return True
+
+    # The indexes are modified in place by _index, so readers hold self.lock
+    # while they slice them: a read waits at most for the batch being indexed,
+    # and iteration runs over the copy after the lock is released
+    def latest(self, source):
+        with self.lock:
+            timestamps, rates = self.index.get(source, ([], []))
+            return (rates[-1], timestamps[-1]) if timestamps else None
+
+    def _bounds(self, timestamps, since, until):
+        lo = bisect.bisect_left(timestamps, since) if since is not None else 0
+        hi = bisect.bisect_left(timestamps, until) if until is not None else len(timestamps)
+        return lo, hi
+
+    def _slice(self, source, since, until, limit=None):
+        with self.lock:
+            timestamps, rates = self.index.get(source, ([], []))
+            lo, hi = self._bounds(timestamps, since, until)
+            if limit is not None:
+                lo = max(lo, hi - limit)
+            return timestamps[lo:hi], rates[lo:hi]
+
+    def range(self, source, since=None, until=None, limit=None):
+        timestamps, rates = self._slice(source, since, until, limit)
+        return list(zip(rates, timestamps))
+
+    def iter_range(self, source, since=None, until=None):
+        timestamps, rates = self._slice(source, since, until)
+        yield from zip(rates, timestamps)
+
+    def rollups(self, source, resolution, since=None, until=None):
+        with self.lock:
+            buckets, candles = self.rollup_index.get((source, resolution), ([], {}))
+            lo, hi = self._bounds(buckets, bucket_start(since, resolution) if since is not None else None, until)
+            rows = []
+            for bucket in buckets[lo:hi]:
+                c = candles[bucket]
+                rows.append((bucket, c.open, c.high, c.low, c.close, c.count, c.total))
+        yield from rows
+
+    def aggregate(self, source, since=None):
+        timestamps, rates = self._slice(source, since, None)
+        if not rates:
+            return (0, None, None, None, None, None)
+        return (len(rates), min(rates), max(rates), sum(rates) / len(rates), timestamps[0], timestamps[-1])
+
+    def sources(self):
+        with self.lock:
+            return list(self.index)
+
+    def count(self):
+        with self.lock:
+            return sum(len(timestamps) for timestamps, _ in self.index.values())
+
+    def version(self):
+        with self.lock:
+            self._read_new()
+            return self.sequence
+
+    def snapshot(self):
+        with self.lock:
+            self._read_new()
+            cursor = self.sequence
+            # Copies, so the rows can be read while new ones are indexed
+            data = [(source, list(timestamps), list(rates)) for source, (timestamps, rates) in self.index.items()]
+        rows = ((source, rate, ts) for source, timestamps, rates in data for ts, rate in zip(timestamps, rates))
+        return cursor, rows
+
+    def changes(self, cursor, limit=10000):
+        """Like SQLiteBackend.changes; None when `cursor` is older than the recent rows kept"""
+        with self.lock:
+            self._read_new()
+            if cursor == self.sequence:
+                return cursor, []
+            if not self.recent or cursor < self.recent[0][0] - 1:
+                return None
+            # Sequence numbers are contiguous: the new rows are the last ones
+            count = min(self.sequence - cursor, len(self.recent))
+            newest = list(itertools.islice(reversed(self.recent), count))
+            rows = [(source, rate, ts) for _, source, rate, ts in reversed(newest)][:limit]
+            return cursor + len(rows), rows
+
+    def get_meta(self, key, default=None):
+        with self.lock:
+            self._read_new()
+            return self.meta.get(key, default)
+
+    def set_meta(self, key, value):
+        with self.lock:
+            self._write([{"meta": key, "value": value}])
+            self.meta[key] = value
+
+    def _export_path(self, key):
+        return f"{self.path}.{key}"
+
+    def get_export(self, key, default=None):
+        try:
+            with open(self._export_path(key), "r", encoding="utf-8") as f:
+                return f.read()
+        except FileNotFoundError:
+            return default
+
+    def set_export(self, key, value):
+        """Replace a value that is rewritten often (status exports) in a file of its own
+
+        As a meta line every export would stay in the log for good, growing
+        the file and its replay at startup without bound.
+        """
+        path = self._export_path(key)
+        tmp = f"{path}.{os.getpid()}.{threading.get_ident()}.tmp"
+        with open(tmp, "w", encoding="utf-8") as f:
+            f.write(value)
+        os.replace(tmp, path)
+
+BACKENDS = {
+    "sqlite": (SQLiteBackend, "rates.db"),
+    "log": (AppendLogBackend, "rates.log")
+}
+
+def create_backend(kind=None, path=None):
+    """Build the backend named by `kind` (or the STORAGE_BACKEND env var)"""
+    kind = kind or os.getenv("STORAGE_BACKEND", "sqlite")
+    if kind not in BACKENDS:
+        raise ValueError(f"Unknown storage backend: {kind}")
+    backend_class, default_path = BACKENDS[kind]
+    return backend_class(path or os.getenv("STORAGE_PATH", default_path))
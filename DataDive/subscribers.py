@@ -0,0 +1,163 @@
+import os
+import time
+import uuid
+import sqlite3
+import threading
+import logging
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_TIMEZONE = "America/Caracas"
+
+class SubscriberDB:
+    """SQLite file shared by the subscriber registry and the broadcast journal"""
+
+    def __init__(self, path=None):
+        self.path = path or os.getenv("SUBSCRIBERS_DB", "subscribers.db")
+        self.local = threading.local()
+        self.write_lock = threading.Lock()
+        conn = self.conn()
+        conn.execute("PRAGMA journal_mode=WAL")
+        conn.executescript("""
+            CREATE TABLE IF NOT EXISTS subscribers (
+                chat_id INTEGER PRIMARY KEY,
+                active INTEGER NOT NULL DEFAULT 1,
+                timezone TEXT NOT NULL DEFAULT 'America/Caracas',
+                subscribed_at REAL NOT NULL
+            );
+            CREATE TABLE IF NOT EXISTS broadcasts (
+                id TEXT PRIMARY KEY,
+                text TEXT NOT NULL,
+                parse_mode TEXT,
+                status TEXT NOT NULL,
+                created_at REAL NOT NULL
+            );
+            CREATE TABLE IF NOT EXISTS deliveries (
+                broadcast_id TEXT NOT NULL,
+                chat_id INTEGER NOT NULL,
+                status TEXT NOT NULL,
+                attempts INTEGER NOT NULL DEFAULT 0,
+                PRIMARY KEY (broadcast_id, chat_id)
+            );
+            CREATE INDEX IF NOT EXISTS idx_deliveries_status ON deliveries (broadcast_id, status);
+        """)
+        conn.commit()
+
+    def conn(self):
+        conn = getattr(self.local, "conn", None)
+        if conn is None:
+            conn = sqlite3.connect(self.path, timeout=10)
+            conn.execute("PRAGMA synchronous=NORMAL")
+            self.local.conn = conn
+        return conn
+
+    def write(self, query, params=()):
+        with self.write_lock:
+            conn = self.conn()
+            with conn:
+                conn.execute(query, params)
+
+    def write_many(self, query, rows):
+        with self.write_lock:
+            conn = self.conn()
+            with conn:
+                conn.executemany(query, rows)
+
+class SubscriberRegistry:
+    """Chats that receive the scheduled updates (/start subscribes, /stop unsubscribes)"""
+
+    def __init__(self, db=None):
+        self.db = db or SubscriberDB()
+
+    def subscribe(self, chat_id, timezone=None):
+        self.db.write(
+            "INSERT INTO subscribers (chat_id, active, timezone, subscribed_at) VALUES (?, 1, ?, ?) "
+            "ON CONFLICT(chat_id) DO UPDATE SET active = 1, timezone = COALESCE(?, timezone)",
+            (chat_id, timezone or DEFAULT_TIMEZONE, time.time(), timezone)
+        )
+        logger.info(f"Chat {chat_id} subscribed")
+
+    def unsubscribe(self, chat_id):
+        self.db.write("UPDATE subscribers SET active = 0 WHERE chat_id = ?", (chat_id,))
+        logger.info(f"Chat {chat_id} unsubscribed")
+
+    def is_known(self, chat_id):
+        return self.db.conn().execute("SELECT 1 FROM subscribers WHERE chat_id = ?", (chat_id,)).fetchone() is not None
+
+    def active_chat_ids(self, timezone=None):
+        query = "SELECT chat_id FROM subscribers WHERE active = 1"
+        params = ()
+        if timezone:
+            query += " AND timezone = ?"
+            params = (timezone,)
+        return [row[0] for row in self.db.conn().execute(query, params)]
+
+    def timezones(self):
+        return [row[0] for row in self.db.conn().execute("SELECT DISTINCT timezone FROM subscribers WHERE active = 1")]
+
+    def count(self):
+        return self.db.conn().execute("SELECT COUNT(*) FROM subscribers WHERE active = 1").fetchone()[0]
+
+class BroadcastJournal:
+    """Persistent per-chat delivery state so a crashed broadcast can resume"""
+
+    def __init__(self, db=None):
+        self.db = db or SubscriberDB()
+
+    def create(self, text, parse_mode, chat_ids):
+        broadcast_id = uuid.uuid4().hex
+        with self.db.write_lock:
+            conn = self.db.conn()
+            with conn:
+                conn.execute(
+                    "INSERT INTO broadcasts (id, text, parse_mode, status, created_at) VALUES (?, ?, ?, 'running', ?)",
+                    (broadcast_id, text, parse_mode, time.time())
+                )
+                conn.executemany(
+                    "INSERT INTO deliveries (broadcast_id, chat_id, status) VALUES (?, ?, 'pending')",
+                    [(broadcast_id, chat_id) for chat_id in chat_ids]
+                )
+        return broadcast_id
+
+    def pending(self, broadcast_id):
+        rows = self.db.conn().execute(
+            "SELECT chat_id FROM deliveries WHERE broadcast_id = ? AND status = 'pending'", (broadcast_id,)
+        )
+        return [row[0] for row in rows]
+
+    def get(self, broadcast_id):
+        row = self.db.conn().execute(
+            "SELECT text, parse_mode, status FROM broadcasts WHERE id = ?", (broadcast_id,)
+        ).fetchone()
+        return row
+
+    def unfinished(self):
+        return [row[0] for row in self.db.conn().execute("SELECT id FROM broadcasts WHERE status = 'running'")]
+
+    def in_flight(self, broadcast_id):
+        return self.db.conn().execute(
+            "SELECT COUNT(*) FROM deliveries WHERE broadcast_id = ? AND status = 'sending'", (broadcast_id,)
+        ).fetchone()[0]
+
+    def mark_in_flight(self, broadcast_id, chat_id):
+        """Recorded before the send: on resume the chat counts as sent, never as pending"""
+        self.db.write(
+            "UPDATE deliveries SET status = 'sending' WHERE broadcast_id = ? AND chat_id = ?",
+            (broadcast_id, chat_id)
+        )
+
+    def mark(self, broadcast_id, results):
+        """results: iterable of (chat_id, status, attempts)"""
+        self.db.write_many(
+            "UPDATE deliveries SET status = ?, attempts = ? WHERE broadcast_id = ? AND chat_id = ?",
+            [(status, attempts, broadcast_id, chat_id) for chat_id, status, attempts in results]
+        )
+
+    def finish(self, broadcast_id):
+        self.db.write("UPDATE broadcasts SET status = 'done' WHERE id = ?", (broadcast_id,))
+
+    def summary(self, broadcast_id):
+        rows = self.db.conn().execute(
+            "SELECT status, COUNT(*) FROM deliveries WHERE broadcast_id = ? GROUP BY status", (broadcast_id,)
+        )
+        return dict(rows.fetchall())
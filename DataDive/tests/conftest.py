@@ -0,0 +1,41 @@
+"""
+Shared fixtures: the bench stubs and a main module wired to them
+
+main.py configures itself from the environment when it is imported and
+writes bot.log and its storage to the working directory, so it is imported
+once per session, from a scratch directory, in webhook mode.
+"""
+
+import os
+import sys
+import pytest
+
+DATADIVE = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+if DATADIVE not in sys.path:
+    sys.path.insert(0, DATADIVE)
+
+from bench.env import prepare
+from bench.stubs import PyDolarVeStub, CLPTodayStub, FakeTelegram
+
+@pytest.fixture(scope="session")
+def stubs():
+    servers = {
+        "pydolarve": PyDolarVeStub().start(),
+        "clptoday": CLPTodayStub().start(),
+        "telegram": FakeTelegram().start()
+    }
+    yield servers
+    for server in servers.values():
+        server.stop()
+
+@pytest.fixture(scope="session")
+def bot_main(stubs):
+    cwd = os.getcwd()
+    prepare(PYDOLARVE_URL=stubs["pydolarve"].url, CLPTODAY_URL=stubs["clptoday"].url,
+            RATE_POLLER="0", BOT_MODE="webhook", WEB_SERVER="builtin")
+    from telebot import apihelper
+    apihelper.API_URL = stubs["telegram"].api_url()
+    import main
+    yield main
+    main.storage.close()
+    os.chdir(cwd)
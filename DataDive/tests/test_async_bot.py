@@ -0,0 +1,30 @@
+import asyncio
+from types import SimpleNamespace
+
+def message(chat_id):
+    return SimpleNamespace(chat=SimpleNamespace(id=chat_id))
+
+def test_slow_chat_does_not_take_every_handler_slot(bot_main):
+    import async_bot
+
+    async def scenario():
+        bot = async_bot.AsyncDollarBot(max_concurrent=2)
+        release = asyncio.Event()
+        order = []
+
+        async def slow(index):
+            order.append(index)
+            await release.wait()
+
+        async def fast():
+            order.append("other chat")
+
+        queued = [asyncio.create_task(bot._handle(message(1), lambda i=i: slow(i))) for i in range(4)]
+        await asyncio.sleep(0.05)
+        # Three updates wait behind chat 1's first one; chat 2 still gets a slot
+        await asyncio.wait_for(bot._handle(message(2), fast), 1)
+        release.set()
+        await asyncio.gather(*queued)
+        return order
+
+    assert asyncio.run(scenario()) == [0, "other chat", 1, 2, 3]
@@ -0,0 +1,86 @@
+import threading
+import pytest
+from requests.exceptions import ConnectionError, ReadTimeout
+from urllib3.exceptions import MaxRetryError, NewConnectionError
+from subscribers import SubscriberDB, SubscriberRegistry, BroadcastJournal
+from broadcast import Broadcaster
+
+@pytest.fixture
+def journal(tmp_path):
+    db = SubscriberDB(str(tmp_path / "subscribers.db"))
+    return BroadcastJournal(db)
+
+def make_broadcaster(journal, send):
+    return Broadcaster(send, SubscriberRegistry(journal.db), journal, workers=1,
+                       global_rate=10000, per_chat_rate=10000)
+
+def statuses(journal, broadcast_id):
+    rows = journal.db.conn().execute(
+        "SELECT chat_id, status FROM deliveries WHERE broadcast_id = ?", (broadcast_id,)
+    )
+    return dict(rows.fetchall())
+
+def test_each_delivery_is_journaled_around_its_send(journal):
+    seen = []
+
+    def send(chat_id, text, parse_mode):
+        # Everything sent before is already recorded; this chat is in flight
+        seen.append((chat_id, statuses(journal, broadcast_id)))
+
+    broadcast_id = journal.create("hola", None, [1, 2, 3])
+    make_broadcaster(journal, send).run(broadcast_id)
+
+    assert seen[2] == (3, {1: "sent", 2: "sent", 3: "sending"})
+    assert statuses(journal, broadcast_id) == {1: "sent", 2: "sent", 3: "sent"}
+    assert journal.unfinished() == []
+
+def test_resume_never_sends_twice(journal):
+    broadcast_id = journal.create("hola", None, [1, 2, 3, 4])
+    # Crash after chat 1 was delivered and while chat 2 was being sent
+    journal.mark(broadcast_id, [(1, "sent", 1)])
+    journal.mark_in_flight(broadcast_id, 2)
+    sent = []
+
+    make_broadcaster(journal, lambda chat_id, text, parse_mode: sent.append(chat_id)).resume_unfinished()
+
+    assert sent == [3, 4]
+    assert journal.summary(broadcast_id) == {"sent": 3, "sending": 1}
+    assert journal.unfinished() == []
+
+def test_only_errors_before_the_request_went_out_are_retried(journal, monkeypatch):
+    monkeypatch.setattr("broadcast.time.sleep", lambda seconds: None)
+    calls = []
+    refused = ConnectionError(MaxRetryError(None, "/sendMessage", NewConnectionError(None, "refused")))
+
+    def send(chat_id, text, parse_mode):
+        calls.append(chat_id)
+        if chat_id == 1 and calls.count(1) < 3:
+            raise refused
+        if chat_id == 2:
+            raise ReadTimeout("read timed out")
+        if chat_id == 3:
+            raise ConnectionError("Connection aborted.")
+
+    broadcast_id = journal.create("hola", None, [1, 2, 3])
+    counts = make_broadcaster(journal, send).run(broadcast_id)
+
+    assert calls == [1, 1, 1, 2, 3]
+    assert statuses(journal, broadcast_id) == {1: "sent", 2: "unknown", 3: "unknown"}
+    assert counts["unknown"] == 2
+
+def test_urgent_broadcast_does_not_wait_for_a_running_one(journal):
+    release = threading.Event()
+    sent = []
+
+    def send(chat_id, text, parse_mode):
+        if text == "diaria":
+            release.wait(5)
+        sent.append(text)
+
+    broadcaster = make_broadcaster(journal, send)
+    daily = threading.Thread(target=broadcaster.broadcast, args=("diaria",), kwargs={"chat_ids": [1]})
+    daily.start()
+    broadcaster.broadcast("alerta", chat_ids=[2], urgent=True)
+    release.set()
+    daily.join()
+    assert sent == ["alerta", "diaria"]
@@ -0,0 +1,26 @@
+import os
+import pytest
+from bench.bench_extractor import FIXTURES, load_fixtures
+from clp_extractor import extract_rates, extract_region_text, page_decimal, parse_number
+
+CASES = load_fixtures()
+
+@pytest.mark.parametrize("name, text, expected", CASES, ids=[case[0] for case in CASES])
+def test_fixtures_match_on_both_paths(name, text, expected):
+    assert extract_rates(text) == expected
+    with open(os.path.join(FIXTURES, name + ".html"), encoding="utf-8") as f:
+        assert extract_rates(extract_region_text(f.read())) == expected
+
+def test_three_decimals_after_a_dot_follow_the_page():
+    # No other number says otherwise: the dot is the decimal separator
+    assert parse_number("105.450") == 105.45
+    assert extract_rates("Zelle: 105.450 Bs") == {"usd_zelle": 105.45}
+    # Comma decimals elsewhere on the page make the dot a thousands group
+    assert page_decimal("PayPal: 35,75\nZelle: 36.500") == ","
+    assert extract_rates("PayPal: 35,75 Bs\nZelle: 36.500 Bs") == {"usd_paypal": 35.75, "usd_zelle": 36500.0}
+
+def test_bcv_rate_settles_and_sanity_checks_the_magnitude():
+    assert parse_number("36.500", ",", reference=30.0) == 36.5
+    assert parse_number("36.500", None, reference=36000.0) == 36500.0
+    # 1234.56 is not a plausible price when the BCV rate is 105.45
+    assert extract_rates("Zelle: 1.234,56 Bs\nPayPal: 110,25 Bs", reference=105.45) == {"usd_paypal": 110.25}
@@ -0,0 +1,73 @@
+import time
+import pytest
+import requests
+from bench.stubs import PyDolarVeStub
+from http_client import HttpClient, CircuitOpenError
+
+@pytest.fixture
+def stub():
+    server = PyDolarVeStub().start()
+    yield server
+    server.stop()
+
+@pytest.fixture
+def http():
+    client = HttpClient(retries=3, backoff=0.2, failure_threshold=1, reset_timeout=0.0)
+    yield client
+    client.close()
+
+def url(server):
+    return f"{server.url}/api/v2/tipo-cambio?currency=usd"
+
+def test_unexpected_error_settles_a_half_open_breaker(stub, http, monkeypatch):
+    stub.failure_rate = 1.0
+    http.retries = 0
+    http.get(url(stub), timeout=1)
+    breaker = http.breakers[f"127.0.0.1:{stub.server.server_port}"]
+    assert breaker.state == "half_open"
+
+    def broken(*args, **kwargs):
+        raise ValueError("not an HTTP error")
+    monkeypatch.setattr(http.session, "get", broken)
+    with pytest.raises(ValueError):
+        http.get(url(stub), timeout=1)
+    assert not breaker.probing
+
+    # The next probe goes out and closes the breaker
+    monkeypatch.undo()
+    stub.failure_rate = 0.0
+    assert http.get_json(url(stub), timeout=1) == {"price": 105.45}
+    assert breaker.state == "closed"
+
+def test_broken_body_is_retried(stub, http, monkeypatch):
+    real_get = http.session.get
+    calls = []
+
+    def flaky(*args, **kwargs):
+        calls.append(1)
+        if len(calls) == 1:
+            raise requests.exceptions.ChunkedEncodingError("connection broken")
+        return real_get(*args, **kwargs)
+    monkeypatch.setattr(http.session, "get", flaky)
+    assert http.get_json(url(stub), timeout=2) == {"price": 105.45}
+    assert len(calls) == 2
+
+def test_retries_fit_in_the_timeout_on_errors(stub, http):
+    stub.failure_rate = 1.0
+    stub.latency = 0.3
+    http.failure_threshold = 100
+    start = time.monotonic()
+    response = http.get(url(stub), timeout=1.0)
+    assert response.status_code == 500
+    assert time.monotonic() - start < 1.2
+
+def test_retries_fit_in_the_timeout_on_timeouts(stub, http):
+    stub.latency = 2.0
+    start = time.monotonic()
+    with pytest.raises(requests.Timeout):
+        http.get(url(stub), timeout=0.5)
+    # Three retries of 0.5 s each would take over 2 s
+    assert time.monotonic() - start < 0.8
+    with pytest.raises(CircuitOpenError):
+        http.breakers[f"127.0.0.1:{stub.server.server_port}"].reset_timeout = 60
+        http.get(url(stub), timeout=0.5)
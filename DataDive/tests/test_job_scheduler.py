@@ -0,0 +1,171 @@
+import time
+import datetime
+import threading
+from zoneinfo import ZoneInfo
+import pytest
+from job_scheduler import CronExpr, Job, JobScheduler, ManualClock
+
+CARACAS = ZoneInfo("America/Caracas")
+WEEKDAYS_9AM = "0 9 * * 1-5"
+
+def at(year, month, day, hour=0, minute=0, tz=CARACAS):
+    return datetime.datetime(year, month, day, hour, minute, tzinfo=tz)
+
+@pytest.fixture
+def make_scheduler(tmp_path):
+    schedulers = []
+
+    def make(start, workers=2):
+        clock = ManualClock(start.timestamp())
+        scheduler = JobScheduler(state_file=str(tmp_path / "scheduler_state.json"), clock=clock, workers=workers)
+        schedulers.append(scheduler)
+        return scheduler, clock
+
+    yield make
+    for scheduler in schedulers:
+        scheduler.stop()
+
+def wait_until(predicate, timeout=5):
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        if predicate():
+            return True
+        time.sleep(0.01)
+    return False
+
+def recorder():
+    runs = []
+    ran = threading.Event()
+
+    def func():
+        runs.append(datetime.datetime.now())
+        ran.set()
+    return runs, ran, func
+
+# 2026-03-06 is a Friday
+def test_weekday_cron_skips_the_weekend():
+    cron = CronExpr(WEEKDAYS_9AM)
+    assert cron.next_after(at(2026, 3, 5, 8, 59)) == at(2026, 3, 5, 9, 0)
+    assert cron.next_after(at(2026, 3, 6, 9, 0)) == at(2026, 3, 9, 9, 0)
+    assert cron.next_after(at(2026, 3, 7, 12, 0)) == at(2026, 3, 9, 9, 0)
+
+def test_sunday_is_both_0_and_7():
+    saturday = at(2026, 3, 7, 10, 0)
+    assert CronExpr("30 8 * * 0").next_after(saturday) == at(2026, 3, 8, 8, 30)
+    assert CronExpr("30 8 * * 7").next_after(saturday) == at(2026, 3, 8, 8, 30)
+
+def test_restricted_day_fields_match_either():
+    # 1st of the month or any Monday
+    cron = CronExpr("0 9 1 * 1")
+    assert cron.next_after(at(2026, 3, 6, 10)) == at(2026, 3, 9, 9)
+    assert cron.next_after(at(2026, 3, 30, 10)) == at(2026, 4, 1, 9)
+
+def test_jobs_follow_their_time_zone():
+    utc = datetime.timezone.utc
+    # Thursday 05:00 UTC: midnight in Bogota (UTC-5), 06:00 in Madrid (UTC+1)
+    moment = datetime.datetime(2026, 3, 5, 5, 0, tzinfo=utc).timestamp()
+    bogota = Job("bogota", WEEKDAYS_9AM, None, timezone="America/Bogota")
+    madrid = Job("madrid", WEEKDAYS_9AM, None, timezone="Europe/Madrid")
+    assert datetime.datetime.fromtimestamp(bogota.next_after(moment), utc) == datetime.datetime(2026, 3, 5, 14, 0, tzinfo=utc)
+    assert datetime.datetime.fromtimestamp(madrid.next_after(moment), utc) == datetime.datetime(2026, 3, 5, 8, 0, tzinfo=utc)
+
+def test_daylight_saving_keeps_the_local_hour():
+    new_york = Job("ny", WEEKDAYS_9AM, None, timezone="America/New_York")
+    utc = datetime.timezone.utc
+    # DST starts on Sunday 2026-03-08: 9:00 is 14:00 UTC on Friday, 13:00 UTC on Monday
+    friday = new_york.next_after(datetime.datetime(2026, 3, 6, 12, 0, tzinfo=utc).timestamp())
+    monday = new_york.next_after(friday)
+    assert datetime.datetime.fromtimestamp(friday, utc).hour == 14
+    assert datetime.datetime.fromtimestamp(monday, utc) == datetime.datetime(2026, 3, 9, 13, 0, tzinfo=utc)
+
+def test_runs_when_the_clock_reaches_the_due_time(make_scheduler):
+    scheduler, clock = make_scheduler(at(2026, 3, 5, 8, 0))
+    runs, ran, func = recorder()
+    job = scheduler.add_job(Job("daily", WEEKDAYS_9AM, func))
+    scheduler.start()
+
+    clock.advance(59 * 60)
+    assert not ran.wait(0.2)
+    clock.advance(60)
+    assert ran.wait(5)
+    assert len(runs) == 1
+    assert job.next_run == at(2026, 3, 6, 9, 0).timestamp()
+
+def test_missed_run_is_caught_up(make_scheduler):
+    scheduler, clock = make_scheduler(at(2026, 3, 4, 9, 0))
+    scheduler.state["daily"] = at(2026, 3, 4, 9, 0).timestamp()
+    # Down through Thursday's 9:00, back at 11:30
+    clock.current = at(2026, 3, 5, 11, 30).timestamp()
+    runs, ran, func = recorder()
+    job = scheduler.add_job(Job("daily", WEEKDAYS_9AM, func))
+    assert job.next_run == clock.now()
+    scheduler.start()
+    assert ran.wait(5)
+    assert job.next_run == at(2026, 3, 6, 9, 0).timestamp()
+
+def test_run_missed_too_long_ago_is_not_caught_up(make_scheduler):
+    scheduler, clock = make_scheduler(at(2026, 3, 5, 18, 0))
+    scheduler.state["daily"] = at(2026, 3, 4, 9, 0).timestamp()
+    job = scheduler.add_job(Job("daily", WEEKDAYS_9AM, lambda: None))
+    assert job.next_run == at(2026, 3, 6, 9, 0).timestamp()
+
+def test_no_resend_after_restart(make_scheduler):
+    first, clock = make_scheduler(at(2026, 3, 5, 8, 59))
+    runs, ran, func = recorder()
+    first.add_job(Job("daily", WEEKDAYS_9AM, func))
+    first.start()
+    clock.advance(60)
+    assert ran.wait(5)
+    first.stop()
+
+    # Restart a few minutes later with the persisted markers
+    second, clock = make_scheduler(at(2026, 3, 5, 9, 5))
+    runs_again, ran_again, func_again = recorder()
+    job = second.add_job(Job("daily", WEEKDAYS_9AM, func_again))
+    second.start()
+    assert job.next_run == at(2026, 3, 6, 9, 0).timestamp()
+    assert not ran_again.wait(0.2)
+    assert len(runs) == 1
+
+def test_slow_job_does_not_hold_back_the_others(make_scheduler):
+    scheduler, clock = make_scheduler(at(2026, 3, 5, 8, 59))
+    release = threading.Event()
+    started = threading.Event()
+
+    def broadcast():
+        started.set()
+        release.wait(5)
+
+    runs, ran, func = recorder()
+    scheduler.add_job(Job("daily:caracas", WEEKDAYS_9AM, broadcast))
+    scheduler.start()
+    clock.advance(60)
+    assert started.wait(5)
+    try:
+        scheduler.call_at("status-export", clock.now() + 30, func)
+        clock.advance(30)
+        assert ran.wait(5)
+    finally:
+        release.set()
+
+def test_cron_job_still_running_skips_its_next_run(make_scheduler):
+    scheduler, clock = make_scheduler(at(2026, 3, 5, 8, 59))
+    release = threading.Event()
+    started = threading.Event()
+    calls = []
+
+    def slow():
+        calls.append(clock.now())
+        started.set()
+        release.wait(5)
+
+    job = scheduler.add_job(Job("every-minute", "* * * * *", slow))
+    scheduler.start()
+    clock.advance(60)
+    assert started.wait(5)
+    clock.advance(60)
+    # The 9:01 run came due while 9:00 was still running: skipped, next one at 9:02
+    assert wait_until(lambda: job.next_run == at(2026, 3, 5, 9, 2).timestamp())
+    release.set()
+    assert wait_until(lambda: not scheduler.active)
+    assert calls == [at(2026, 3, 5, 9, 0).timestamp()]
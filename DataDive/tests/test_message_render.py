@@ -0,0 +1,24 @@
+import datetime
+from message_render import MessageCache, RateSnapshot, render
+
+def snapshot(minute, usd=(("🔸 Binance", 128.4),)):
+    return RateSnapshot(bcv=105.45, usd=usd, average=120.0, euro=(("bcv", 120.1),), change=None,
+                        failed=(), taken_at=datetime.datetime(2026, 10, 17, 9, minute))
+
+def test_a_new_minute_restamps_without_rendering_again():
+    cache = MessageCache()
+    first = cache.get(snapshot(0), "es", "Markdown")
+    later = cache.get(snapshot(1), "en", "HTML")
+    assert cache.get_stats()["renders"] == 1
+    assert "(17/10/2026)" in first and "Actualizado: 09:00" in first
+    assert "(2026-10-17)" in later and "Updated: 09:01" in later
+    assert later == render(snapshot(1), "en", "HTML")
+    # New rates do render again
+    cache.get(snapshot(1, usd=(("🔸 Binance", 129.0),)))
+    assert cache.get_stats()["renders"] == 2
+
+def test_platform_titles_from_the_api_are_escaped():
+    titled = snapshot(0, usd=(("El_Dorado *P2P* [beta]", 130.0),))
+    assert "El\\_Dorado \\*P2P\\* \\[beta]: 130.00" in render(titled, "es", "Markdown")
+    assert "El_Dorado *P2P* [beta]: 130.00" in render(titled, "es", "plain")
+    assert "&lt;b&gt;x&lt;/b&gt;: 1.00" in render(snapshot(0, usd=(("<b>x</b>", 1.0),)), "es", "HTML")
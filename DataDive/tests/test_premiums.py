@@ -0,0 +1,19 @@
+import pytest
+from rate_fetcher import FetchReport
+
+def test_fresh_install_estimates_with_the_old_multipliers(bot_main, monkeypatch):
+    monkeypatch.setattr(bot_main.storage, "get_previous_rate", lambda source="bcv": None)
+    bot = bot_main.dollar_bot
+    monkeypatch.setattr(bot, "premiums", bot._load_premiums())
+    report = FetchReport()
+    report.results["bcv"] = 100.0
+    book = bot.build_book(report)
+    assert book.kinds[book.sources.index("zelle")] == bot_main.ESTIMATE
+    assert book.price("zelle") == pytest.approx(108.0)
+    assert book.price("paypal") == pytest.approx(115.0)
+    assert book.price("eur_bcv") == pytest.approx(110.0)
+
+def test_malformed_rate_weights_are_skipped(bot_main, caplog):
+    weights = bot_main.parse_weights("p2p_binance=3, bcv=uno,zelle,=2,paypal=-1,okx=0.5,")
+    assert weights == {"p2p_binance": 3.0, "okx": 0.5}
+    assert len([r for r in caplog.records if "RATE_WEIGHTS" in r.getMessage()]) == 4
@@ -0,0 +1,74 @@
+import pytest
+from bench.stubs import PyDolarVeStub
+from http_client import HttpClient
+from rate_fetcher import RateFetcher
+
+@pytest.fixture
+def upstreams():
+    servers = {}
+
+    def start(name, latency):
+        servers[name] = PyDolarVeStub(latency=latency).start()
+        return servers[name]
+
+    yield start
+    for server in servers.values():
+        server.stop()
+
+@pytest.fixture
+def http():
+    client = HttpClient(retries=0)
+    yield client
+    client.close()
+
+def register(fetcher, http, name, server, timeout):
+    url = f"{server.url}/api/v2/tipo-cambio?currency=usd"
+    fetcher.register(name, lambda t: http.get_json(url, timeout=t)["price"], timeout=timeout)
+
+def test_latency_is_the_slowest_source_not_the_sum(upstreams, http):
+    fetcher = RateFetcher(deadline=5.0)
+    delays = {"bcv": 0.2, "p2p": 0.3, "eur": 0.4, "clp": 0.5}
+    for name, delay in delays.items():
+        register(fetcher, http, name, upstreams(name, delay), timeout=3.0)
+
+    report = fetcher.fetch_all()
+
+    assert set(report.results) == set(delays)
+    assert not report.failed
+    slowest = max(delays.values())
+    assert slowest <= report.elapsed < slowest + 0.3
+    assert report.elapsed < sum(delays.values())
+    fetcher.shutdown()
+
+def test_sources_past_the_deadline_are_marked_failed(upstreams, http):
+    fetcher = RateFetcher(deadline=0.8)
+    register(fetcher, http, "bcv", upstreams("bcv", 0.1), timeout=3.0)
+    register(fetcher, http, "p2p", upstreams("p2p", 0.2), timeout=3.0)
+    # Past its own timeout, and past the overall deadline
+    register(fetcher, http, "eur", upstreams("eur", 2.0), timeout=0.4)
+    register(fetcher, http, "clp", upstreams("clp", 2.0), timeout=3.0)
+
+    report = fetcher.fetch_all()
+
+    assert report.results == {"bcv": 105.45, "p2p": 105.45}
+    assert report.failed["clp"] == "timeout"
+    # eur's HTTP read timeout and the fetcher's wait expire together; either can report it
+    assert report.failed["eur"] == "timeout" or "timed out" in report.failed["eur"]
+    assert set(report.failed) == {"eur", "clp"}
+    # The caller is released at the deadline, not when the slow upstreams answer
+    assert report.elapsed < 1.1
+    fetcher.shutdown()
+
+def test_failing_source_does_not_hold_back_the_others(upstreams, http):
+    fetcher = RateFetcher(deadline=2.0)
+    register(fetcher, http, "bcv", upstreams("bcv", 0.1), timeout=1.0)
+    broken = upstreams("p2p", 0.0)
+    broken.failure_rate = 1.0
+    register(fetcher, http, "p2p", broken, timeout=1.0)
+
+    report = fetcher.fetch_all()
+
+    assert report.ok("bcv") and not report.ok("p2p")
+    assert "500" in report.failed["p2p"]
+    assert report.elapsed < 1.0
+    fetcher.shutdown()
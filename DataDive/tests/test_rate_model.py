@@ -0,0 +1,23 @@
+import pytest
+from rate_model import RateBook, CrossRates, USD, EUR, COP, OFFICIAL, P2P, TRANSFER, ESTIMATE
+
+def test_cross_rates_blend_every_currency_in_the_book():
+    book = RateBook()
+    book.add("bcv", "BCV", USD, OFFICIAL, 100.0)
+    book.add("p2p_binance", "Binance", USD, P2P, 120.0)
+    book.add("eur_clp", "Euro (CLP)", EUR, P2P, 132.0)
+    book.add("cop_bcv", "Peso COP", COP, OFFICIAL, 0.025)
+    cross = CrossRates.from_book(book)
+    assert cross.codes == (USD, EUR, COP)
+    assert cross.rate(EUR, USD) == pytest.approx(132.0 / 110.0)
+    assert cross.rate(USD, COP) == pytest.approx(110.0 / 0.025)
+    assert len(cross.to_dict()) == 6
+
+def test_cross_rates_without_an_official_euro_row():
+    book = RateBook()
+    book.add("bcv", "BCV", USD, OFFICIAL, 100.0)
+    book.add("zelle", "Zelle", USD, TRANSFER, 108.0)
+    book.add("eur_bcv", "Euro BCV", EUR, ESTIMATE, 115.0)
+    cross = CrossRates.from_book(book).to_dict()
+    assert cross["EUR/USD"] == pytest.approx(115.0 / 104.0)
+    assert cross["USD/EUR"] == pytest.approx(104.0 / 115.0)
@@ -0,0 +1,93 @@
+import asyncio
+import pytest
+from rate_sources import SourceAdapter
+from rate_fetcher import AsyncRateFetcher
+from source_registry import SourceRegistry, SourceUnavailable, DOWN, HEALTHY
+
+class FakeClock:
+    def __init__(self):
+        self.now = 0.0
+
+    def __call__(self):
+        return self.now
+
+class ScriptedAdapter(SourceAdapter):
+    """Answers from a list of outcomes: a value, an exception, or 'hang'"""
+
+    def __init__(self, name, outcomes, **options):
+        super().__init__(name, "bcv", **options)
+        self.outcomes = list(outcomes)
+        self.calls = 0
+
+    def _next(self):
+        self.calls += 1
+        return self.outcomes.pop(0) if self.outcomes else 1.0
+
+    def fetch(self, timeout):
+        outcome = self._next()
+        if isinstance(outcome, Exception):
+            raise outcome
+        return outcome
+
+    async def fetch_async(self, get_json, timeout):
+        outcome = self._next()
+        if outcome == "hang":
+            await asyncio.sleep(3600)
+        if isinstance(outcome, Exception):
+            raise outcome
+        return outcome
+
+def down_registry(adapter, clock):
+    registry = SourceRegistry(down_after=1, cooldown=10, clock=clock)
+    registry.register(adapter)
+    with pytest.raises(SourceUnavailable):
+        registry.fetch("bcv", 1.0)
+    assert registry.health[adapter.name].state == DOWN
+    clock.now += 10
+    return registry
+
+def test_down_source_is_probed_after_its_cooldown():
+    clock = FakeClock()
+    adapter = ScriptedAdapter("primary", [ValueError("boom"), 105.0])
+    registry = down_registry(adapter, clock)
+    assert registry.fetch("bcv", 1.0) == 105.0
+    assert registry.health["primary"].state == HEALTHY
+
+def test_cancelled_probe_does_not_leave_the_source_stuck():
+    clock = FakeClock()
+    adapter = ScriptedAdapter("primary", [ValueError("boom"), "hang", 105.0])
+    registry = down_registry(adapter, clock)
+
+    async def probe():
+        # A caller's deadline cancels the probe before the adapter's own budget runs out
+        with pytest.raises(asyncio.TimeoutError):
+            await asyncio.wait_for(registry.fetch_async("bcv", 5.0, None), 0.05)
+
+    asyncio.run(probe())
+    health = registry.health["primary"]
+    assert not health.probing
+    assert health.last_error == "cancelled"
+
+    # The next cool-down ends and the source gets probed again
+    clock.now += 3600
+    assert registry.fetch("bcv", 1.0) == 105.0
+    assert adapter.calls == 3
+
+def test_async_fetcher_lets_the_source_time_out_first():
+    clock = FakeClock()
+    adapter = ScriptedAdapter("primary", ["hang"], timeout=0.1)
+    registry = SourceRegistry(clock=clock)
+    registry.register(adapter)
+
+    async def fetch():
+        fetcher = AsyncRateFetcher(deadline=1.0)
+        fetcher.register("bcv", registry.async_loader("bcv", None), timeout=0.1)
+        report = await fetcher.fetch_all()
+        # The load is shielded from the waiter and settles right after it
+        await asyncio.sleep(0.1)
+        return report
+
+    report = asyncio.run(fetch())
+    assert report.failed == {"bcv": "timeout"}
+    # The adapter's own timeout fired, not the outer guard's cancellation
+    assert registry.health["primary"].last_error == "timeout"
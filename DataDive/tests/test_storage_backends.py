@@ -0,0 +1,96 @@
+import os
+import json
+import threading
+import time
+from storage_backends import AppendLogBackend, SQLiteBackend
+from rate_storage import RateStorage
+from rolling_stats import RollingStats
+
+def test_log_exports_do_not_grow_the_log(tmp_path):
+    path = str(tmp_path / "rates.log")
+    backend = AppendLogBackend(path)
+    backend.append_many([("bcv", 105.45, 1000.0)])
+    size = os.path.getsize(path)
+    for index in range(200):
+        backend.set_export("bot_status", json.dumps({"n": index}))
+    assert os.path.getsize(path) == size
+    # Another process sees the latest export
+    assert json.loads(AppendLogBackend(path).get_export("bot_status")) == {"n": 199}
+    assert backend.get_export("bot_metrics") is None
+
+def test_shared_status_round_trip_on_both_backends(tmp_path):
+    for backend in (AppendLogBackend(str(tmp_path / "rates.log")), SQLiteBackend(str(tmp_path / "rates.db"))):
+        storage = RateStorage(str(tmp_path / "missing.json"), backend=backend, write_behind=False)
+        storage.save_status({"scheduler_running": True})
+        storage.save_metrics("dollarbot_up 1\n")
+        storage.save_traces([{"id": 1}])
+        assert storage.load_status()["scheduler_running"] is True
+        assert storage.status_exported_at() is not None
+        assert storage.load_metrics() == "dollarbot_up 1\n"
+        assert storage.load_traces() == [{"id": 1}]
+
+def test_log_reads_stay_consistent_while_rows_are_indexed(tmp_path):
+    backend = AppendLogBackend(str(tmp_path / "rates.log"))
+    done = threading.Event()
+    errors = []
+
+    def write():
+        # Every other batch lands before the newest row, so the index shifts
+        for index in range(300):
+            ts = 1000.0 + index * 10 - (15 if index % 2 else 0)
+            backend.append_many([("bcv", ts / 10, ts)])
+        done.set()
+
+    def read():
+        while not done.is_set():
+            rows = backend.range("bcv")
+            if any(rate != ts / 10 for rate, ts in rows) or [ts for _, ts in rows] != sorted(ts for _, ts in rows):
+                errors.append(rows)
+            count, low, high, _, first, last = backend.aggregate("bcv")
+            if count and (low != first / 10 or high != last / 10):
+                errors.append((count, low, high, first, last))
+
+    writer = threading.Thread(target=write)
+    readers = [threading.Thread(target=read) for _ in range(3)]
+    for thread in readers + [writer]:
+        thread.start()
+    for thread in readers + [writer]:
+        thread.join()
+    assert not errors
+    assert backend.count() == 300
+
+def test_rolling_stats_publish_a_new_map_per_batch():
+    rolling = RollingStats({"1d": 86400})
+    rolling.add_many([("bcv", 100.0, 1000.0), ("bcv", 110.0, 2000.0)], now=2000.0)
+    before = rolling.sources["bcv"]
+    summary = rolling.summary("bcv", 2000.0)
+    rolling.add_many([("bcv", 90.0, 3000.0)], now=3000.0)
+    # The published stats are replaced, not changed under a reader
+    assert rolling.sources["bcv"] is not before
+    assert before.summary(2000.0) == summary
+    assert rolling.summary("bcv", 3000.0)["min"] == 90.0
+    # Reading after the window has passed skips expired points without evicting them
+    assert rolling.summary("bcv", 1000.0 + 86400 + 1)["windows"]["1d"]["count"] == 2
+    assert rolling.summary("bcv", 3000.0)["windows"]["1d"]["count"] == 3
+
+def test_legacy_history_is_imported_once_on_both_backends(tmp_path):
+    legacy = tmp_path / "rates_data.json"
+    legacy.write_text(json.dumps({"history": [
+        {"rate": 36.5, "timestamp": "2024-01-02T09:00:00"},
+        {"rate": 36.7, "timestamp": "2024-01-03T09:00:00"}
+    ]}))
+    for make in (lambda: AppendLogBackend(str(tmp_path / "rates.log")),
+                 lambda: SQLiteBackend(str(tmp_path / "rates.db"))):
+        RateStorage(str(legacy), backend=make(), write_behind=False)
+        # A second process starting on the same file finds the marker with the rows
+        storage = RateStorage(str(legacy), backend=make(), write_behind=False)
+        assert [entry["rate"] for entry in storage.get_history(days=100000)] == [36.5, 36.7]
+        assert storage.backend.append_once("legacy_migrated", str(legacy), [("bcv", 1.0, 1.0)]) is False
+
+def test_history_reads_see_other_processes_rows(tmp_path, monkeypatch):
+    monkeypatch.setattr("rate_storage.STORAGE_SYNC_INTERVAL", 0)
+    path = str(tmp_path / "rates.log")
+    storage = RateStorage(str(tmp_path / "missing.json"), backend=AppendLogBackend(path), write_behind=False)
+    AppendLogBackend(path).append_many([("bcv", 105.45, time.time() - 3600)])
+    assert [entry["rate"] for entry in storage.get_history()] == [105.45]
+    assert storage.get_baseline("bcv", time.time()) == 105.45
@@ -0,0 +1,64 @@
+import time
+import threading
+from webhook import WebhookIngest, ACCEPTED, DUPLICATE, FULL
+
+def message_update(update_id, chat_id, text):
+    return {
+        "update_id": update_id,
+        "message": {
+            "message_id": update_id,
+            "date": int(time.time()),
+            "chat": {"id": chat_id, "type": "private"},
+            "from": {"id": chat_id, "is_bot": False, "first_name": "test"},
+            "text": text
+        }
+    }
+
+def wait_until(predicate, timeout=10):
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        if predicate():
+            return True
+        time.sleep(0.01)
+    return False
+
+def test_duplicates_and_backpressure():
+    release = threading.Event()
+    ingest = WebhookIngest(lambda update: release.wait(5), workers=1, queue_size=1).start()
+    try:
+        assert ingest.submit(message_update(1, 10, "a")) == ACCEPTED
+        assert wait_until(lambda: ingest.get_stats()["queue_depth"] == 0)
+        assert ingest.submit(message_update(1, 10, "a")) == DUPLICATE
+        assert ingest.submit(message_update(2, 10, "b")) == ACCEPTED
+        assert ingest.submit(message_update(3, 10, "c")) == FULL
+        # A rejected update is not remembered, so Telegram's redelivery gets in
+        release.set()
+        assert wait_until(lambda: ingest.get_stats()["processed"] == 2)
+        assert ingest.submit(message_update(3, 10, "c")) == ACCEPTED
+    finally:
+        release.set()
+        ingest.stop()
+
+def test_same_chat_runs_in_arrival_order(bot_main, stubs):
+    telegram = stubs["telegram"]
+    # Slow upstreams make the first reply take a while; the second must still wait for it
+    stubs["pydolarve"].latency = 0.3
+    stubs["clptoday"].latency = 0.3
+    bot_main.dollar_bot.cache.entries.clear()
+    ingest = bot_main.create_webhook_ingest()
+    try:
+        chat_id = 4242
+        before = len(telegram.sent)
+        assert ingest.submit(message_update(1001, chat_id, "/tasas")) == ACCEPTED
+        assert ingest.submit(message_update(1002, chat_id, "/help")) == ACCEPTED
+        assert telegram.wait_for_sent(before + 2, timeout=20)
+        replies = [sent["text"] for sent in telegram.sent[before:] if sent["chat_id"] == chat_id]
+        assert len(replies) == 2
+        assert "Bot del Dólar Venezolano" not in replies[0]
+        assert "Bot del Dólar Venezolano" in replies[1]
+        # Handlers ran on the ingest worker, so both are counted only once sent
+        assert wait_until(lambda: ingest.get_stats()["processed"] == 2)
+    finally:
+        stubs["pydolarve"].latency = 0.0
+        stubs["clptoday"].latency = 0.0
+        ingest.stop()
@@ -0,0 +1,44 @@
+from write_buffer import WriteBehindBuffer
+
+class FlakyWriter:
+    def __init__(self, failures):
+        self.failures = failures
+        self.rows = []
+
+    def __call__(self, rows):
+        if self.failures:
+            self.failures -= 1
+            raise OSError("disk full")
+        self.rows.extend(rows)
+
+def make(writer):
+    return WriteBehindBuffer(writer, flush_interval=3600, close_attempts=3, retry_delay=0.01)
+
+def test_close_retries_a_failed_batch():
+    writer = FlakyWriter(failures=2)
+    buffer = make(writer)
+    buffer.add([("bcv", 105.45, 1000.0), ("eur_bcv", 120.1, 1000.0)])
+    assert buffer.close() == 2
+    assert writer.rows == [("bcv", 105.45, 1000.0), ("eur_bcv", 120.1, 1000.0)]
+    assert buffer.get_stats()["pending"] == 0
+
+def test_close_drops_what_still_cannot_be_written():
+    writer = FlakyWriter(failures=10)
+    buffer = make(writer)
+    buffer.add([("bcv", 105.45, 1000.0)])
+    assert buffer.close() == 0
+    stats = buffer.get_stats()
+    assert stats["pending"] == 0
+    assert stats["dropped"] == 1
+    # The flusher may take one more try as it wakes up to stop
+    assert stats["errors"] >= 3
+
+def test_adds_after_close_are_written_or_dropped_right_away():
+    writer = FlakyWriter(failures=1)
+    buffer = make(writer)
+    buffer.close()
+    buffer.add([("bcv", 105.45, 1000.0)])
+    buffer.add([("bcv", 106.0, 1001.0)])
+    assert writer.rows == [("bcv", 106.0, 1001.0)]
+    assert buffer.get_stats()["dropped"] == 1
+    assert buffer.get_stats()["pending"] == 0
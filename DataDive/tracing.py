@@ -0,0 +1,264 @@
+"""
+Request tracing for slow /tasas replies
+
+trace() opens a root span for one request and span() nests timed stages
+under whatever span is current (a contextvar, so it follows asyncio tasks
+and, through copy_context(), the fetcher's worker threads). When the root
+span takes longer than TRACE_SLOW_MS, the whole span tree is kept in a
+ring buffer of recent slow traces; with TRACE_PROFILE=1 a sampling profiler
+also records the call stacks of the threads working on the request.
+Outside a trace span() returns a shared no-op, so the stages cost a
+contextvar lookup when nobody is tracing.
+"""
+
+import os
+import sys
+import time
+import itertools
+import threading
+import contextvars
+import logging
+from collections import deque, Counter
+from datetime import datetime
+
+logger = logging.getLogger(__name__)
+
+TRACING = os.getenv("TRACING", "1") == "1"
+TRACE_SLOW_MS = float(os.getenv("TRACE_SLOW_MS", "2000"))
+TRACE_BUFFER = int(os.getenv("TRACE_BUFFER", "50"))
+TRACE_PROFILE = os.getenv("TRACE_PROFILE", "0") == "1"
+TRACE_PROFILE_INTERVAL = float(os.getenv("TRACE_PROFILE_INTERVAL", "0.01"))
+
+_current = contextvars.ContextVar("span", default=None)
+
+class NullSpan:
+    """What span() returns outside a trace; falsy so callers can skip extra work"""
+
+    __slots__ = ()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        return False
+
+    def __bool__(self):
+        return False
+
+    def set(self, **attrs):
+        pass
+
+NULL_SPAN = NullSpan()
+
+class Span:
+    __slots__ = ("trace", "name", "attrs", "parent", "children", "start", "end", "thread", "token")
+
+    def __init__(self, trace, name, attrs, parent):
+        self.trace = trace
+        self.name = name
+        self.attrs = attrs
+        self.parent = parent
+        self.children = []
+        self.start = None
+        self.end = None
+        self.thread = None
+        self.token = None
+
+    def set(self, **attrs):
+        self.attrs.update(attrs)
+
+    def __enter__(self):
+        if self.trace.sampled:
+            self.thread = threading.get_ident()
+            self.trace.enter_thread(self.thread)
+        if self.parent is not None:
+            # list.append is atomic; spans of parallel sources share a parent
+            self.parent.children.append(self)
+        self.token = _current.set(self)
+        self.start = time.perf_counter()
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        self.end = time.perf_counter()
+        if exc_type is not None:
+            self.attrs["error"] = f"{exc_type.__name__}: {exc}"
+        _current.reset(self.token)
+        if self.thread is not None:
+            self.trace.exit_thread(self.thread)
+        if self.parent is None:
+            self.trace.tracer.finish(self.trace)
+        return False
+
+    def to_dict(self, origin, closed_at):
+        end = self.end if self.end is not None else closed_at
+        node = {
+            "name": self.name,
+            "start_ms": round((self.start - origin) * 1000, 3),
+            "duration_ms": round((end - self.start) * 1000, 3),
+            "attrs": dict(self.attrs),
+            "children": [child.to_dict(origin, closed_at) for child in list(self.children) if child.start is not None]
+        }
+        if self.end is None:
+            # Still running when the request finished (a source past its timeout)
+            node["unfinished"] = True
+        return node
+
+class Trace:
+    """One request: its root span, the threads working on it and profiler samples"""
+
+    def __init__(self, tracer, trace_id, name, attrs):
+        self.tracer = tracer
+        self.sampled = tracer.sampler is not None
+        self.id = trace_id
+        self.started_at = time.time()
+        self.lock = threading.Lock()
+        self.threads = Counter()
+        self.samples = Counter()
+        self.root = Span(self, name, attrs, None)
+
+    def enter_thread(self, ident):
+        with self.lock:
+            self.threads[ident] += 1
+
+    def exit_thread(self, ident):
+        with self.lock:
+            self.threads[ident] -= 1
+            if self.threads[ident] <= 0:
+                del self.threads[ident]
+
+    def active_threads(self):
+        with self.lock:
+            return list(self.threads)
+
+    def to_dict(self):
+        root = self.root
+        with self.lock:
+            spans = root.to_dict(root.start, root.end)
+            samples = self.samples.most_common(20)
+        return {
+            "id": self.id,
+            "name": root.name,
+            "started_at": datetime.fromtimestamp(self.started_at).isoformat(),
+            "duration_ms": spans["duration_ms"],
+            "attrs": spans["attrs"],
+            "spans": spans,
+            "profile": [{"stack": stack, "samples": count} for stack, count in samples] or None
+        }
+
+def _collapse(frame, limit=40):
+    """Frame chain as 'module.function;...' from the outermost call to the innermost"""
+    names = []
+    while frame is not None and len(names) < limit:
+        code = frame.f_code
+        module = os.path.splitext(os.path.basename(code.co_filename))[0]
+        names.append(f"{module}.{code.co_name}:{frame.f_lineno}")
+        frame = frame.f_back
+    return ";".join(reversed(names))
+
+class StackSampler:
+    """Sample the stacks of threads working on active traces every `interval` seconds"""
+
+    def __init__(self, interval=0.01):
+        self.interval = interval
+        self.traces = set()
+        self.cond = threading.Condition()
+        self.thread = None
+        self.samples = 0
+
+    def watch(self, trace):
+        with self.cond:
+            self.traces.add(trace)
+            if self.thread is None:
+                self.thread = threading.Thread(target=self._run, name="trace-sampler", daemon=True)
+                self.thread.start()
+            self.cond.notify()
+
+    def unwatch(self, trace):
+        with self.cond:
+            self.traces.discard(trace)
+
+    def _run(self):
+        own = threading.get_ident()
+        while True:
+            with self.cond:
+                while not self.traces:
+                    self.cond.wait()
+                traces = list(self.traces)
+            frames = sys._current_frames()
+            for trace in traces:
+                for ident in trace.active_threads():
+                    frame = frames.get(ident)
+                    if frame is not None and ident != own:
+                        stack = _collapse(frame)
+                        with trace.lock:
+                            trace.samples[stack] += 1
+            self.samples += 1
+            del frames
+            time.sleep(self.interval)
+
+class Tracer:
+    """Root spans, the slow-trace threshold and the ring buffer of slow traces"""
+
+    def __init__(self, slow_ms=TRACE_SLOW_MS, size=TRACE_BUFFER, profile=TRACE_PROFILE,
+                 interval=TRACE_PROFILE_INTERVAL, enabled=TRACING):
+        self.slow_ms = slow_ms
+        self.enabled = enabled
+        self.slow = deque(maxlen=size)
+        self.sampler = StackSampler(interval) if profile else None
+        self.ids = itertools.count(1)
+        self.lock = threading.Lock()
+        self.version = 0
+        self.stats = {"traces": 0, "slow": 0}
+
+    def trace(self, name, **attrs):
+        """Root span for one request; inside another trace it is just a nested span"""
+        if not self.enabled:
+            return NULL_SPAN
+        parent = _current.get()
+        if parent is not None:
+            return Span(parent.trace, name, attrs, parent)
+        trace = Trace(self, next(self.ids), name, attrs)
+        if self.sampler is not None:
+            self.sampler.watch(trace)
+        return trace.root
+
+    def finish(self, trace):
+        if self.sampler is not None:
+            self.sampler.unwatch(trace)
+        root = trace.root
+        elapsed_ms = (root.end - root.start) * 1000
+        with self.lock:
+            self.stats["traces"] += 1
+            if elapsed_ms < self.slow_ms:
+                return
+            self.stats["slow"] += 1
+        record = trace.to_dict()
+        with self.lock:
+            self.slow.append(record)
+            self.version += 1
+        logger.warning(f"Slow {root.name}: {elapsed_ms:.0f} ms (trace {trace.id})")
+
+    def recent(self):
+        """Slow traces, newest first"""
+        with self.lock:
+            return list(reversed(self.slow))
+
+    def get_stats(self):
+        with self.lock:
+            return dict(self.stats, kept=len(self.slow), slow_ms=self.slow_ms,
+                        profile=self.sampler is not None)
+
+tracer = Tracer()
+
+def trace(name, **attrs):
+    return tracer.trace(name, **attrs)
+
+def span(name, **attrs):
+    """Timed stage under the current span; a no-op outside a trace"""
+    parent = _current.get()
+    if parent is None:
+        return NULL_SPAN
+    return Span(parent.trace, name, attrs, parent)
+
+def current_span():
+    return _current.get() or NULL_SPAN
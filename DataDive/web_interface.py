@@ -1,54 +1,152 @@
-from flask import Flask, render_template, jsonify
+from flask import Flask, render_template, jsonify, request, Response
 import logging
 import os
+import io
+import csv
 import json
+import time
+import threading
+from operator import itemgetter
 from datetime import datetime
-from rate_storage import RateStorage
+from rate_storage import shared_storage
+from response_cache import ResponseCache
+from event_hub import hub, encode, CLOSED
+from rate_history import RESOLUTIONS, choose_resolution, lttb
+from log_access import LOG_FILE, LogFollower, ring_handler, query_file, parse_level, parse_time
+from webhook import DUPLICATE, FULL
+from tracing import tracer
+from metrics import METRICS_ENABLED, registry as metrics_registry, merge_exposition, ratio
 
 # Configure logging
 logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
 
 app = Flask(__name__)
-storage = RateStorage()
+storage = shared_storage()
+responses = ResponseCache()
+
+# Counters in the status (cache, HTTP, queues) move on every request; without
+# a data change the status is rebuilt at most once per this many seconds
+STATUS_MAX_AGE = int(os.getenv("STATUS_MAX_AGE", "60"))
+STREAM_HEARTBEAT = float(os.getenv("STREAM_HEARTBEAT", "15"))
+# Rows per source a JSON history response may hold; larger ranges need a
+# coarser resolution, ?points= or a streamed format
+HISTORY_JSON_LIMIT = int(os.getenv("HISTORY_JSON_LIMIT", "10000"))
+HISTORY_FIELDS = ('source', 'ts', 'timestamp', 'date', 'rate', 'open', 'high', 'low', 'close', 'average', 'count')
+
+class QuietPollingFilter(logging.Filter):
+    """Drop werkzeug access lines for successful dashboard polls
+
+    Otherwise every poll appends to bot.log, which changes the log's version
+    and defeats the /api/logs cache.
+    """
+
+    # werkzeug may wrap the request line in color codes, so match inside it
+    PATHS = ('GET /api/status', 'GET /api/logs', 'GET /api/stream', 'GET /api/traces', 'GET /metrics')
+
+    def filter(self, record):
+        message = record.getMessage()
+        if message.find('" 200 ') == -1 and message.find('" 304 ') == -1:
+            return True
+        return not any(path in message for path in self.PATHS)
+
+logging.getLogger('werkzeug').addFilter(QuietPollingFilter())
 
 # Global variable to store bot instance (will be set from main)
 bot_instance = None
+webhook_ingest = None
+# Set when the dashboard runs in its own process (web_server.py): status then
+# comes from what the bot exports to the shared storage
+shared_status = False
+SHARED_POLL_INTERVAL = float(os.getenv("SHARED_POLL_INTERVAL", "2"))
 
 def set_bot_instance(bot):
     """Set the bot instance for web interface"""
     global bot_instance
     bot_instance = bot
 
+def use_shared_status():
+    """Read the bot status from shared storage and relay changes to /api/stream"""
+    global shared_status
+    if shared_status:
+        return
+    shared_status = True
+    threading.Thread(target=relay_shared_status, name="status-relay", daemon=True).start()
+
+def relay_shared_status():
+    """Publish the bot's exported status and new bot.log lines to the local hub"""
+    follower = LogFollower(LOG_FILE)
+    last_export = storage.status_exported_at()
+    while True:
+        time.sleep(SHARED_POLL_INTERVAL)
+        try:
+            exported_at = storage.status_exported_at()
+            if exported_at != last_export:
+                last_export = exported_at
+                status = storage.load_status()
+                if status:
+                    hub.publish('status', status)
+            for line in follower.read_new():
+                hub.publish('log', line)
+        except Exception as e:
+            logger.error(f"Error relaying bot status: {e}")
+
+def set_webhook_ingest(ingest):
+    """Enable the Telegram webhook route with the given WebhookIngest"""
+    global webhook_ingest
+    webhook_ingest = ingest
+
 @app.route('/')
 def index():
     """Main dashboard page"""
     return render_template('index.html')
 
+def cached_json(key, version, build):
+    """Serve a cached JSON payload with ETag/304 and gzip or brotli"""
+    status, body, headers = responses.respond(
+        key, version, build,
+        if_none_match=request.headers.get('If-None-Match'),
+        accept_encoding=request.headers.get('Accept-Encoding')
+    )
+    return Response(body, status=status, headers=headers, mimetype='application/json')
+
+def build_status():
+    status = None
+    if bot_instance:
+        status = bot_instance.get_status()
+    elif shared_status:
+        status = storage.load_status()
+    if not status:
+        status = {
+            'last_update': None,
+            'last_rates': None,
+            'scheduler_running': False,
+            'chat_id': os.getenv('CHAT_ID', 'Not set')
+        }
+
+    # Add storage stats (the bot's exported status already has fresh ones)
+    if 'stats' not in status:
+        stats = storage.get_stats()
+        if stats:
+            status['stats'] = stats
+    status['responses'] = responses.get_stats()
+
+    return {
+        'success': True,
+        'data': status,
+        'timestamp': datetime.now().isoformat()
+    }
+
 @app.route('/api/status')
 def api_status():
     """API endpoint for bot status"""
     try:
-        if bot_instance:
-            status = bot_instance.get_status()
-        else:
-            status = {
-                'last_update': None,
-                'last_rates': None,
-                'scheduler_running': False,
-                'chat_id': os.getenv('CHAT_ID', 'Not set')
-            }
-        
-        # Add storage stats
-        stats = storage.get_stats()
-        if stats:
-            status['stats'] = stats
-        
-        return jsonify({
-            'success': True,
-            'data': status,
-            'timestamp': datetime.now().isoformat()
-        })
+        version = (
+            bot_instance.status_version() if bot_instance else storage.status_exported_at() if shared_status else None,
+            storage.version(),
+            int(time.time() // STATUS_MAX_AGE)
+        )
+        return cached_json('status', version, build_status)
     except Exception as e:
         logger.error(f"Error getting status: {e}")
         return jsonify({
@@ -57,18 +155,107 @@ def api_status():
             'timestamp': datetime.now().isoformat()
         }), 500
 
+class HistoryQuery:
+    """Parsed /api/history parameters"""
+
+    def __init__(self, args):
+        now = time.time()
+        self.until = parse_time(args.get('to')) or now
+        self.since = parse_time(args.get('from'))
+        if self.since is None:
+            self.since = self.until - float(args.get('days', 7)) * 86400
+        if self.since >= self.until:
+            raise ValueError("'from' must be before 'to'")
+
+        sources = args.get('source', 'bcv')
+        self.sources = storage.get_sources() if sources == 'all' else [s for s in sources.split(',') if s]
+        self.points = int(args['points']) if args.get('points') else None
+        self.resolution = args.get('resolution', 'auto')
+        if self.resolution == 'auto':
+            self.resolution = choose_resolution(self.since, self.until, self.points or 1000)
+        if self.resolution != 'raw' and self.resolution not in RESOLUTIONS:
+            raise ValueError(f"Unknown resolution '{self.resolution}'")
+        self.format = args.get('format', 'json')
+        if self.format not in ('json', 'ndjson', 'csv'):
+            raise ValueError(f"Unknown format '{self.format}'")
+
+    def rows(self, source, limit=None):
+        """One source's rows; with ?points= (or a limit) they are materialized, at most `limit` of them"""
+        rows = storage.iter_history(source, self.since, self.until, self.resolution)
+        if self.points is None and limit is None:
+            return rows
+        kept = []
+        for row in rows:
+            kept.append(row)
+            if limit is not None and len(kept) > limit:
+                raise OverflowError(
+                    f"More than {limit} rows for '{source}': use a coarser resolution, points or format=ndjson/csv"
+                )
+        if self.points is not None:
+            kept = lttb(kept, self.points, x=itemgetter('ts'), y=itemgetter('rate'))
+        return kept
+
+    def series(self):
+        """Rows of every source, one iterable per source
+
+        Lazy cursors unless downsampling, which needs the (bounded) rows up
+        front; that also raises OverflowError before a streamed response starts.
+        """
+        if self.points is None:
+            return (self.rows(source) for source in self.sources)
+        return [self.rows(source, HISTORY_JSON_LIMIT) for source in self.sources]
+
+def stream_ndjson(series):
+    for rows in series:
+        chunk = []
+        for row in rows:
+            chunk.append(json.dumps(row, ensure_ascii=False))
+            if len(chunk) >= 500:
+                yield "\n".join(chunk) + "\n"
+                chunk = []
+        if chunk:
+            yield "\n".join(chunk) + "\n"
+
+def stream_csv(series):
+    buffer = io.StringIO()
+    writer = csv.DictWriter(buffer, HISTORY_FIELDS, extrasaction='ignore', lineterminator='\n')
+    writer.writeheader()
+    for rows in series:
+        for i, row in enumerate(rows):
+            writer.writerow(row)
+            if i % 500 == 499:
+                yield buffer.getvalue()
+                buffer.seek(0)
+                buffer.truncate()
+    yield buffer.getvalue()
+
 @app.route('/api/history')
 def api_history():
-    """API endpoint for rate history"""
+    """API endpoint for rate history (?source=&from=&to=&days=&resolution=&points=&format=)"""
     try:
-        days = int(request.args.get('days', 7))
-        history = storage.get_history(days)
-        
+        query = HistoryQuery(request.args)
+        if query.format == 'ndjson':
+            return Response(stream_ndjson(query.series()), mimetype='application/x-ndjson')
+        if query.format == 'csv':
+            return Response(stream_csv(query.series()), mimetype='text/csv', headers={
+                'Content-Disposition': 'attachment; filename=history.csv'
+            })
+
+        history = []
+        for source in query.sources:
+            history.extend(query.rows(source, HISTORY_JSON_LIMIT))
         return jsonify({
             'success': True,
+            'resolution': query.resolution,
             'data': history,
             'timestamp': datetime.now().isoformat()
         })
+    except (ValueError, OverflowError) as e:
+        return jsonify({
+            'success': False,
+            'error': str(e),
+            'timestamp': datetime.now().isoformat()
+        }), 400
     except Exception as e:
         logger.error(f"Error getting history: {e}")
         return jsonify({
@@ -77,24 +264,51 @@ def api_history():
             'timestamp': datetime.now().isoformat()
         }), 500
 
+LOG_FILTERS = ('level', 'logger', 'since', 'until')
+
+def read_logs(limit=50, level=None, logger_name=None, since=None, until=None):
+    """Recent log lines: from the in-memory ring when this process logs to it, else the file"""
+    if ring_handler.records and not shared_status:
+        return ring_handler.query(limit, level, logger_name, since, until)
+    return query_file(LOG_FILE, limit, level, logger_name, since, until)
+
+def build_logs(limit=50, **filters):
+    return {
+        'success': True,
+        'data': [line.strip() for line in read_logs(limit, **filters)],
+        'timestamp': datetime.now().isoformat()
+    }
+
+def logs_version():
+    if ring_handler.records and not shared_status:
+        return ('ring', ring_handler.version)
+    try:
+        info = os.stat(LOG_FILE)
+        return (info.st_size, info.st_mtime_ns)
+    except FileNotFoundError:
+        return None
+
 @app.route('/api/logs')
 def api_logs():
-    """API endpoint for recent logs"""
+    """API endpoint for recent logs (?level=&logger=&since=&until=&limit=)"""
     try:
-        log_file = 'bot.log'
-        logs = []
-        
-        if os.path.exists(log_file):
-            with open(log_file, 'r', encoding='utf-8') as f:
-                # Get last 50 lines
-                lines = f.readlines()
-                logs = lines[-50:] if len(lines) > 50 else lines
-        
+        limit = min(int(request.args.get('limit', 50)), 1000)
+        if not any(request.args.get(name) for name in LOG_FILTERS) and limit == 50:
+            return cached_json('logs', logs_version(), build_logs)
+        # Filtered queries are cheap and too varied to be worth caching
+        return jsonify(build_logs(
+            limit,
+            level=parse_level(request.args.get('level')),
+            logger_name=request.args.get('logger'),
+            since=parse_time(request.args.get('since')),
+            until=parse_time(request.args.get('until'))
+        ))
+    except ValueError as e:
         return jsonify({
-            'success': True,
-            'data': [line.strip() for line in logs],
+            'success': False,
+            'error': f"Invalid parameter: {e}",
             'timestamp': datetime.now().isoformat()
-        })
+        }), 400
     except Exception as e:
         logger.error(f"Error getting logs: {e}")
         return jsonify({
@@ -103,6 +317,111 @@ def api_logs():
             'timestamp': datetime.now().isoformat()
         }), 500
 
+@app.route('/api/stream')
+def api_stream():
+    """Server-Sent Events: rate snapshots, bot status and new log lines as they happen"""
+    subscription = hub.subscribe(request.headers.get('Last-Event-ID') or request.args.get('lastEventId'))
+
+    def stream():
+        try:
+            yield "retry: 5000\n\n"
+            if not subscription.resumed:
+                # New client (or one too far behind): start from the current state
+                yield encode('status', build_status()['data'], subscription.last_id)
+                yield encode('logs', build_logs()['data'])
+            while True:
+                event = subscription.get(STREAM_HEARTBEAT)
+                if event is None:
+                    yield ": heartbeat\n\n"
+                elif event is CLOSED:
+                    break
+                else:
+                    yield event.encoded
+        finally:
+            hub.unsubscribe(subscription)
+
+    return Response(stream(), mimetype='text/event-stream', headers={
+        'Cache-Control': 'no-cache',
+        'X-Accel-Buffering': 'no'
+    })
+
+@app.route('/telegram/webhook', methods=['POST'])
+def telegram_webhook():
+    """Receive Telegram updates and hand them to the worker pool"""
+    if webhook_ingest is None:
+        return jsonify({'ok': False, 'error': 'webhook disabled'}), 404
+
+    if not webhook_ingest.check_secret(request.headers.get('X-Telegram-Bot-Api-Secret-Token')):
+        logger.warning("Rejected webhook call with an invalid secret token")
+        return jsonify({'ok': False, 'error': 'forbidden'}), 403
+
+    update = request.get_json(silent=True)
+    if not isinstance(update, dict):
+        return jsonify({'ok': False, 'error': 'invalid update'}), 400
+
+    result = webhook_ingest.submit(update)
+    if result == FULL:
+        # Backpressure: Telegram keeps the update and retries later
+        response = jsonify({'ok': False, 'error': 'queue full'})
+        response.headers['Retry-After'] = '5'
+        return response, 503
+    return jsonify({'ok': True, 'duplicate': result == DUPLICATE})
+
+def build_traces():
+    remote = shared_status and not bot_instance
+    return {
+        'success': True,
+        'data': storage.load_traces() if remote else tracer.recent(),
+        'slow_ms': tracer.slow_ms,
+        'timestamp': datetime.now().isoformat()
+    }
+
+@app.route('/api/traces')
+def api_traces():
+    """Recent /tasas requests slower than TRACE_SLOW_MS, with their span trees"""
+    try:
+        version = storage.status_exported_at() if shared_status and not bot_instance else tracer.version
+        return cached_json('traces', version, build_traces)
+    except Exception as e:
+        logger.error(f"Error getting traces: {e}")
+        return jsonify({
+            'success': False,
+            'error': str(e),
+            'timestamp': datetime.now().isoformat()
+        }), 500
+
+def collect_metrics():
+    """Dashboard response cache, webhook queue and stream clients of this process"""
+    stats = responses.get_stats()
+    requests_served = stats['served'] + stats['not_modified']
+    families = [
+        ("dollarbot_response_cache_hit_ratio", "gauge", "Share of dashboard JSON responses served without a rebuild", [
+            ({}, ratio(requests_served - stats['builds'], requests_served))
+        ]),
+        ("dollarbot_stream_clients", "gauge", "Dashboards connected to /api/stream", [
+            ({}, hub.get_stats()['clients'])
+        ])
+    ]
+    if webhook_ingest is not None:
+        ingest = webhook_ingest.get_stats()
+        families.append(("dollarbot_queue_depth", "gauge", "Items waiting in internal queues", [
+            ({'queue': 'webhook'}, ingest['queue_depth'])
+        ]))
+    return families
+
+metrics_registry.add_collector(collect_metrics)
+
+@app.route('/metrics')
+def metrics():
+    """Prometheus scrape endpoint"""
+    if not METRICS_ENABLED:
+        return Response("metrics disabled\n", status=404, mimetype='text/plain')
+    text = metrics_registry.render(skip_empty=shared_status)
+    if shared_status:
+        # The bot's own timings, as of its last status export
+        text = merge_exposition(text, storage.load_metrics() or "")
+    return Response(text, content_type='text/plain; version=0.0.4; charset=utf-8')
+
 @app.route('/api/health')
 def health_check():
     """Health check endpoint"""
@@ -115,8 +434,9 @@ def health_check():
 def start_web_interface():
     """Start the web interface"""
     try:
-        logger.info("Starting web interface on port 5000...")
-        app.run(host='0.0.0.0', port=5000, debug=False, use_reloader=False)
+        port = int(os.getenv('PORT', '5000'))
+        logger.info(f"Starting web interface on port {port}...")
+        app.run(host='0.0.0.0', port=port, debug=False, use_reloader=False)
     except Exception as e:
         logger.error(f"Failed to start web interface: {e}")
         raise
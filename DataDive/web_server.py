@@ -0,0 +1,124 @@
+"""
+Production server for the web dashboard
+
+Runs web_interface.app in its own process so dashboard traffic never competes
+with the Telegram handlers for the GIL. The dashboard reads the status the bot
+exports to the shared storage instead of the in-process bot instance.
+
+- WEB_SERVER=waitress: threaded waitress (`python web_server.py`)
+- WEB_SERVER=gunicorn: pre-fork gunicorn workers (`gunicorn web_server:app`)
+
+run.py starts the chosen server through WebSupervisor and restarts it if it
+dies.
+"""
+
+import os
+import sys
+import time
+import signal
+import logging
+import threading
+import subprocess
+from log_access import LOG_FORMAT
+
+logger = logging.getLogger(__name__)
+
+PORT = int(os.getenv("PORT", "5000"))
+WEB_WORKERS = int(os.getenv("WEB_WORKERS", "2"))
+WEB_THREADS = int(os.getenv("WEB_THREADS", "8"))
+
+def _configure():
+    # bot.log belongs to the bot process (it rotates it); log to the console here
+    logging.basicConfig(level=logging.INFO, format=LOG_FORMAT)
+    import web_interface
+    web_interface.use_shared_status()
+    return web_interface.app
+
+def __getattr__(name):
+    # `gunicorn web_server:app` imports this module in every worker
+    if name == "app":
+        return _configure()
+    raise AttributeError(name)
+
+def serve_waitress():
+    from waitress import serve
+    app = _configure()
+    logger.info(f"Serving the dashboard with waitress on port {PORT} ({WEB_THREADS} threads)")
+    serve(app, host="0.0.0.0", port=PORT, threads=WEB_THREADS)
+
+def server_command(kind):
+    """Command line for a dashboard process of the given kind"""
+    here = os.path.dirname(os.path.abspath(__file__))
+    if kind == "gunicorn":
+        return [
+            sys.executable, "-m", "gunicorn",
+            "--workers", str(WEB_WORKERS),
+            "--worker-class", "gthread",
+            "--threads", str(WEB_THREADS),
+            # Dashboard streams never finish on their own; don't wait long for them
+            "--graceful-timeout", "5",
+            "--bind", f"0.0.0.0:{PORT}",
+            "--pythonpath", here,
+            "web_server:app"
+        ]
+    if kind == "waitress":
+        return [sys.executable, os.path.join(here, "web_server.py")]
+    raise ValueError(f"Unknown WEB_SERVER '{kind}'")
+
+class WebSupervisor:
+    """Keep the dashboard process running; restart it with backoff when it exits"""
+
+    def __init__(self, kind, max_backoff=30.0):
+        self.command = server_command(kind)
+        self.kind = kind
+        self.max_backoff = max_backoff
+        self.process = None
+        self.running = False
+        self.restarts = 0
+        self.stopped = threading.Event()
+
+    def start(self):
+        self.running = True
+        threading.Thread(target=self._watch, name="web-supervisor", daemon=True).start()
+        return self
+
+    def _watch(self):
+        backoff = 1.0
+        while self.running:
+            started = time.monotonic()
+            logger.info(f"Starting dashboard process ({self.kind})")
+            # Own process group, so stop() also reaches gunicorn's workers
+            self.process = subprocess.Popen(self.command, start_new_session=True)
+            code = self.process.wait()
+            if not self.running:
+                break
+            # A process that stayed up for a while gets a fresh backoff
+            if time.monotonic() - started > 60:
+                backoff = 1.0
+            self.restarts += 1
+            logger.error(f"Dashboard process exited with code {code}, restarting in {backoff:.0f}s")
+            if self.stopped.wait(backoff):
+                break
+            backoff = min(self.max_backoff, backoff * 2)
+
+    def stop(self, timeout=10):
+        self.running = False
+        self.stopped.set()
+        if self.process and self.process.poll() is None:
+            self.process.send_signal(signal.SIGTERM)
+            try:
+                self.process.wait(timeout)
+            except subprocess.TimeoutExpired:
+                os.killpg(self.process.pid, signal.SIGKILL)
+                self.process.wait()
+
+    def get_status(self):
+        return {
+            'kind': self.kind,
+            'pid': self.process.pid if self.process else None,
+            'alive': self.process is not None and self.process.poll() is None,
+            'restarts': self.restarts
+        }
+
+if __name__ == "__main__":
+    serve_waitress()
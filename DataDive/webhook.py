@@ -0,0 +1,119 @@
+import hmac
+import queue
+import threading
+import logging
+from collections import OrderedDict
+
+logger = logging.getLogger(__name__)
+
+ACCEPTED = "accepted"
+DUPLICATE = "duplicate"
+FULL = "full"
+
+def _chat_id(update):
+    for key in ("message", "edited_message", "callback_query", "channel_post"):
+        part = update.get(key)
+        if isinstance(part, dict):
+            if key == "callback_query":
+                part = part.get("message") or {}
+            chat = part.get("chat") or {}
+            if "id" in chat:
+                return chat["id"]
+    return None
+
+class WebhookIngest:
+    """Bounded work queues and a worker pool for Telegram webhook updates
+
+    Updates for the same chat always land on the same worker, so they are
+    processed in the order Telegram delivered them.
+    """
+
+    def __init__(self, process, workers=4, queue_size=1000, secret=None, dedupe_size=10000):
+        self.process = process
+        self.secret = secret
+        self.dedupe_size = dedupe_size
+        self.seen = OrderedDict()
+        self.lock = threading.Lock()
+        per_worker = max(1, queue_size // workers)
+        self.queues = [queue.Queue(maxsize=per_worker) for _ in range(workers)]
+        self.running = False
+        self.stats = {"accepted": 0, "duplicates": 0, "rejected": 0, "processed": 0, "errors": 0}
+
+    def start(self):
+        if self.running:
+            return self
+        self.running = True
+        for index, work_queue in enumerate(self.queues):
+            threading.Thread(target=self._worker, args=(work_queue,), name=f"webhook-worker-{index}", daemon=True).start()
+        logger.info(f"Webhook ingest started with {len(self.queues)} workers")
+        return self
+
+    def stop(self):
+        self.running = False
+        for work_queue in self.queues:
+            try:
+                work_queue.put_nowait(None)
+            except queue.Full:
+                pass
+
+    def check_secret(self, token):
+        """Validate the X-Telegram-Bot-Api-Secret-Token header"""
+        if not self.secret:
+            return True
+        return hmac.compare_digest((token or "").encode(), self.secret.encode())
+
+    def _mark_seen(self, update_id):
+        with self.lock:
+            if update_id in self.seen:
+                return False
+            self.seen[update_id] = True
+            if len(self.seen) > self.dedupe_size:
+                self.seen.popitem(last=False)
+            return True
+
+    def _forget(self, update_id):
+        with self.lock:
+            self.seen.pop(update_id, None)
+
+    def submit(self, update):
+        """Queue one update dict; returns ACCEPTED, DUPLICATE or FULL"""
+        update_id = update.get("update_id")
+        if update_id is not None and not self._mark_seen(update_id):
+            self._count("duplicates")
+            return DUPLICATE
+
+        chat_id = _chat_id(update)
+        index = hash(chat_id if chat_id is not None else update_id) % len(self.queues)
+        try:
+            self.queues[index].put_nowait(update)
+        except queue.Full:
+            # Telegram redelivers on non-2xx, so let the retry through the dedupe set
+            if update_id is not None:
+                self._forget(update_id)
+            self._count("rejected")
+            return FULL
+        self._count("accepted")
+        return ACCEPTED
+
+    def _count(self, key):
+        with self.lock:
+            self.stats[key] += 1
+
+    def _worker(self, work_queue):
+        while self.running:
+            update = work_queue.get()
+            if update is None:
+                break
+            try:
+                self.process(update)
+                self._count("processed")
+            except Exception as e:
+                self._count("errors")
+                logger.error(f"Error processing update {update.get('update_id')}: {e}")
+
+    def get_stats(self):
+        with self.lock:
+            stats = dict(self.stats)
+        stats["queue_depth"] = sum(q.qsize() for q in self.queues)
+        stats["queue_capacity"] = sum(q.maxsize for q in self.queues)
+        return stats
@@ -0,0 +1,118 @@
+import time
+import threading
+import logging
+
+logger = logging.getLogger(__name__)
+
+class WriteBehindBuffer:
+    """Coalesce rate saves before they reach the backend
+
+    A value equal to the last one accepted for its source within
+    `dedup_window` seconds is dropped; everything else is queued and written
+    in one batch every `flush_interval` seconds, when `max_batch` rows are
+    waiting, or on flush()/close(). Writes then follow how often the rates
+    change rather than how often they are requested.
+    """
+
+    def __init__(self, write, dedup_window=3600, flush_interval=5.0, max_batch=500, latest=None,
+                 close_attempts=3, retry_delay=0.5):
+        self.write = write
+        self.dedup_window = dedup_window
+        self.flush_interval = flush_interval
+        self.max_batch = max_batch
+        self.close_attempts = close_attempts
+        self.retry_delay = retry_delay
+        # source -> (rate, ts) of the last value accepted, written or not yet
+        self.last = dict(latest or {})
+        self.pending = []
+        self.lock = threading.Lock()
+        self.flush_lock = threading.Lock()
+        self.wake = threading.Event()
+        self.thread = None
+        self.closed = False
+        self.stats = {"accepted": 0, "deduplicated": 0, "flushes": 0, "errors": 0, "dropped": 0}
+
+    def add(self, rows):
+        """Queue (source, rate, ts) rows; returns how many were not duplicates"""
+        accepted = 0
+        with self.lock:
+            for source, rate, ts in rows:
+                last = self.last.get(source)
+                if last is not None and last[0] == rate and ts - last[1] < self.dedup_window:
+                    self.stats["deduplicated"] += 1
+                    continue
+                self.last[source] = (rate, ts)
+                self.pending.append((source, rate, ts))
+                accepted += 1
+            self.stats["accepted"] += accepted
+            full = len(self.pending) >= self.max_batch
+            if self.pending and self.thread is None and not self.closed:
+                self.thread = threading.Thread(target=self._run, name="write-behind", daemon=True)
+                self.thread.start()
+        if accepted and self.closed:
+            # No flusher any more: write now, and don't leave a failed batch queued
+            self._drain(1)
+        elif full:
+            self.flush()
+        return accepted
+
+    def latest(self, source):
+        with self.lock:
+            return self.last.get(source)
+
+    def flush(self):
+        """Write everything queued so far in one batch"""
+        # One flush at a time, so batches reach the backend in order
+        with self.flush_lock:
+            with self.lock:
+                rows, self.pending = self.pending, []
+            if not rows:
+                return 0
+            try:
+                self.write(rows)
+            except Exception as e:
+                # Keep them for the next flush rather than losing them
+                logger.error(f"Error writing {len(rows)} buffered rates: {e}")
+                with self.lock:
+                    self.pending[:0] = rows
+                    self.stats["errors"] += 1
+                return 0
+            with self.lock:
+                self.stats["flushes"] += 1
+            return len(rows)
+
+    def _run(self):
+        while not self.closed:
+            self.wake.wait(self.flush_interval)
+            self.wake.clear()
+            self.flush()
+
+    def _drain(self, attempts):
+        """Flush until nothing is queued, up to `attempts` tries; then drop what is left"""
+        written = 0
+        for attempt in range(attempts):
+            if attempt:
+                time.sleep(self.retry_delay)
+            written += self.flush()
+            with self.lock:
+                if not self.pending:
+                    return written
+        with self.lock:
+            dropped, self.pending = self.pending, []
+            self.stats["dropped"] += len(dropped)
+        logger.error(f"Dropping {len(dropped)} buffered rates after {attempts} failed writes")
+        return written
+
+    def close(self):
+        """Flush and stop the timer; later adds are written right away
+
+        The timer won't retry a failed batch any more, so it is retried here
+        up to `close_attempts` times and then dropped, with an error logged.
+        """
+        self.closed = True
+        self.wake.set()
+        return self._drain(self.close_attempts)
+
+    def get_stats(self):
+        with self.lock:
+            return dict(self.stats, pending=len(self.pending))